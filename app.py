@@ -1,16 +1,159 @@
-from flask import Flask, render_template
-from typing import List, Dict, Any
-from lib.heathub.utils import FlagManager, LogManager
+import math
+import queue
+import time
+from flask import Flask, Response, abort, jsonify, render_template, request
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+from lib.heathub.config import DEFAULT_SITE, get_config_store
+from lib.heathub.logstore import SegmentedLogStore
+from lib.heathub.logtail import LogTailer
+from lib.heathub.metrics import get_metrics
+from lib.heathub.timeseries import TimeSeriesStore
+from lib.heathub.utils import FlagManager, LogManager, METRICS_PATH, TIMESERIES_DIR
 
 app = Flask(__name__)
 
+config_store = get_config_store()
 flag_manager = FlagManager()
 log_manager = LogManager()
+log_tailer = LogTailer(log_manager.store, flag_manager.get_flags)
+timeseries_store = TimeSeriesStore(TIMESERIES_DIR)
+metrics = get_metrics(METRICS_PATH)
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+# A comment line keeps idle streams open through proxies
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Flags the cycle keeps per site, prefixed with the site name when sites are configured
+SITE_FLAGS = [
+    ("last_date_heat_on", "Heat last date on"),
+    ("last_date_button_bathroom_on", "Bathroom button last date on"),
+]
+
+
+def get_log_filters() -> Dict[str, Optional[str]]:
+    # Read the log filters from the query string; a bare date covers the whole day.
+    date_from = request.args.get("from") or None
+    date_to = request.args.get("to") or None
+    if date_from and len(date_from) == 10:
+        date_from = f"{date_from} 00:00:00"
+    if date_to and len(date_to) == 10:
+        date_to = f"{date_to} 23:59:59"
+    return {
+        "start": date_from,
+        "end": date_to,
+        "device": request.args.get("device") or None,
+        "log_type": request.args.get("type") or None,
+    }
+
+
+def get_flag_rows() -> List[Tuple[str, str]]:
+    # Flag keys and labels shown on the dashboard, the site flags once per site.
+    config_store.reload_if_changed()
+    rows = [("last_date_app_run", "App last date run")]
+    for site in config_store.get().get_sites():
+        prefix = "" if site.name == DEFAULT_SITE else f"{site.name}: "
+        rows += [(site.scoped(key), prefix + label) for key, label in SITE_FLAGS]
+    return rows
+
+
+def get_logs_page() -> Tuple[List[Dict[str, Any]], Optional[str], int]:
+    # Load the requested page of logs, newest first.
+    limit = min(max(request.args.get("limit", PAGE_SIZE_DEFAULT, type=int), 1), PAGE_SIZE_MAX)
+    cursor = request.args.get("cursor") or None
+    try:
+        logs, next_cursor = log_manager.get_logs_page(limit, cursor, **get_log_filters())
+    except ValueError:
+        abort(400, description="Invalid cursor")
+    return logs, next_cursor, limit
 
 
 @app.route("/")
 def index() -> str:
-    logs: List[Dict[str, Any]] = log_manager.get_logs()
-    logs = sorted(logs, key=lambda log: log["date"], reverse=True)
+    logs, next_cursor, limit = get_logs_page()
     flags: Dict[str, Any] = flag_manager.get_flags()
-    return render_template("index.html", logs=logs, flags=flags)
+    return render_template(
+        "index.html",
+        logs=logs,
+        flags=flags,
+        flag_rows=get_flag_rows(),
+        next_cursor=next_cursor,
+        limit=limit,
+        args=request.args,
+    )
+
+
+@app.route("/api/logs")
+def api_logs() -> Any:
+    logs, next_cursor, limit = get_logs_page()
+    return jsonify({"logs": logs, "next_cursor": next_cursor, "limit": limit})
+
+
+@app.route("/logs/stream")
+def logs_stream() -> Response:
+    # Same filters as the paged view, so the tail only adds entries it would show
+    filters = get_log_filters()
+
+    def stream() -> Iterator[str]:
+        subscriber = log_tailer.subscribe()
+        try:
+            # Sent right away so the browser knows the stream is open
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                name, data = event
+                if name == "log" and not SegmentedLogStore.matches_record(data, **filters):
+                    continue
+                yield LogTailer.format_event(event)
+        finally:
+            log_tailer.unsubscribe(subscriber)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/timeseries")
+def api_timeseries_devices() -> Any:
+    return jsonify({"devices": timeseries_store.devices()})
+
+
+@app.route("/api/timeseries/<device>")
+def api_timeseries(device: str) -> Any:
+    # Readings of one device; from/to are unix timestamps, default the last day.
+    now = int(time.time())
+    end = request.args.get("to", now, type=int)
+    start = request.args.get("from", end - 24 * 60 * 60, type=int)
+    resolution = request.args.get("resolution", None, type=int)
+    if device not in timeseries_store.devices():
+        abort(404)
+    try:
+        resolution, samples = timeseries_store.query(device, start, end, resolution)
+    except KeyError:
+        abort(400, description="Unknown resolution")
+
+    def value(number: float) -> Optional[float]:
+        return None if math.isnan(number) else round(number, 2)
+
+    return jsonify(
+        {
+            "device": device,
+            "resolution": resolution,
+            "samples": [
+                [sample.timestamp, value(sample.current), value(sample.target), value(sample.active)]
+                for sample in samples
+            ],
+        }
+    )
+
+
+@app.route("/metrics")
+def prometheus_metrics() -> Response:
+    # Stage latencies and counters persisted by the control cycle.
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
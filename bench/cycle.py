@@ -0,0 +1,240 @@
+"""End-to-end benchmark of the control cycle against local fakes.
+
+Runs cron.main() repeatedly with the real gateway, Wave and smart button
+clients pointed at local stand-ins (bench/fakes.py) and reports latency
+percentiles per stage and for the whole cycle. Stores are written to a
+temporary directory, the real etc/tinyDb is not touched.
+
+Run from the repository root:
+    poetry run python -m bench.cycle --cycles 200
+    poetry run python -m bench.cycle --wave-latency 0.3 --wave-failure-rate 0.05 --json
+    poetry run python -m bench.cycle --sites 20
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+STAGES = ["salus", "button", "wave", "reconcile", "cycle", "total"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sites", type=int, default=1,
+                        help="sites driven by one process, each with its own gateway and Wave")
+    parser.add_argument("--zones", type=int, default=4, help="thermostats on the fake gateway")
+    parser.add_argument("--heating-rate", type=float, default=0.3,
+                        help="probability that a zone calls for heat on a poll")
+    parser.add_argument("--cold-credentials", action="store_true",
+                        help="drop cached Cognito tokens before every cycle")
+    parser.add_argument("--no-button", action="store_true", help="leave the smart button out")
+    parser.add_argument("--wave-timeout", type=float, default=2.0,
+                        help="WaveSession request timeout in seconds")
+    parser.add_argument("--deadline", type=float, default=5.0,
+                        help="per-source acquisition deadline in seconds")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    for name, latency in (("gateway", 0.05), ("wave", 0.15), ("cloud", 0.08)):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency,
+                            help=f"mean {name} latency per request in seconds")
+        parser.add_argument(f"--{name}-jitter", type=float, default=0.5,
+                            help="relative spread around the mean latency")
+        parser.add_argument(f"--{name}-failure-rate", type=float, default=0.0)
+    return parser.parse_args()
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    from bench.fakes import percentile
+
+    summary = {}
+    for stage in STAGES:
+        values = samples.get(stage)
+        if not values:
+            continue
+        summary[stage] = {
+            "n": len(values),
+            "mean": sum(values) / len(values) * 1000,
+            "p50": percentile(values, 0.50) * 1000,
+            "p90": percentile(values, 0.90) * 1000,
+            "p99": percentile(values, 0.99) * 1000,
+            "max": max(values) * 1000,
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, Dict[str, float]], failures: Dict[str, int]) -> None:
+    print("%-10s %6s %9s %9s %9s %9s %9s %8s" % (
+        "stage", "n", "mean ms", "p50 ms", "p90 ms", "p99 ms", "max ms", "failed"))
+    for stage, row in summary.items():
+        print("%-10s %6d %9.1f %9.1f %9.1f %9.1f %9.1f %8d" % (
+            stage, row["n"], row["mean"], row["p50"], row["p90"], row["p99"], row["max"],
+            failures.get(stage, 0)))
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # Imported here so HEATHUB_DB_DIR is set before the stores are created
+    import cron
+    from bench.fakes import Behaviour, FakeCloud, FakeGateway, FakeWaveEndpoint
+    from lib.heathub.config import AppConfig, Config, SalusConfig, SiteConfig, WaveConfig
+    from lib.heathub.resources import SitePool
+
+    # Injected gateway failures would flood stderr with pyit600 tracebacks
+    logging.getLogger("pyit600").setLevel(logging.CRITICAL)
+    rng = random.Random(args.seed)
+
+    def behaviour(name: str) -> Behaviour:
+        return Behaviour(
+            getattr(args, f"{name}_latency"),
+            getattr(args, f"{name}_jitter"),
+            getattr(args, f"{name}_failure_rate"),
+        )
+
+    euid = "0123456789abcdef"
+    gateways = [
+        FakeGateway(euid, behaviour("gateway"), rng, args.zones, args.heating_rate)
+        for _ in range(args.sites)
+    ]
+    cloud = FakeCloud(behaviour("cloud"), rng)
+    wave_endpoints = [FakeWaveEndpoint(behaviour("wave"), rng) for _ in range(args.sites)]
+    for gateway in gateways:
+        await gateway.start()
+    await cloud.start()
+    # botocore sends both Cognito services to the fake
+    os.environ["AWS_ENDPOINT_URL"] = cloud.url
+
+    # Every site logs in with the same account, as the top-level salus section allows
+    account = SalusConfig(
+        account_client_id="client",
+        account_identity_id="eu-central-1:identity",
+        account_iot_endpoint=cloud.url,
+        account_password="bench",
+        account_region="eu-central-1",
+        account_user_pool_id="eu-central-1_pool",
+        account_username="bench",
+        device_button_bathroom_boiler_working_time=20,
+    )
+    wave_config = WaveConfig(serial_number="123456789", access_code="abcdefghijklmnop", password="bench")
+    sites = tuple(
+        SiteConfig(
+            name=f"site-{index}",
+            salus=account._replace(
+                gateway_host="127.0.0.1",
+                gateway_port=gateway.port,
+                gateway_euid=euid,
+                account_device_button_bathroom_id=f"button-{index}",
+            ),
+            wave=wave_config,
+            enabled_device_button_bathroom=not args.no_button,
+        )
+        for index, gateway in enumerate(gateways)
+    )
+    config = Config(
+        app=AppConfig(
+            enabled_device_button_bathroom=not args.no_button,
+            max_concurrent_sites=args.sites,
+            source_deadlines={"salus": args.deadline, "button": args.deadline, "wave": args.deadline},
+        ),
+        salus=sites[0].salus,
+        wave=wave_config,
+        # A single site runs as the default site of a flat config
+        sites=sites if args.sites > 1 else (),
+    )
+    cron.config_store.replace(config)
+    pool = SitePool(cron.config_store.get)
+    for site, wave_endpoint in zip(config.get_sites(), wave_endpoints):
+        wave = pool.get(site.name).get_wave()
+        wave.session.request_timeout = args.wave_timeout
+        wave_endpoint.attach(wave.session)
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    failures: Dict[str, int] = defaultdict(int)
+
+    def timed(stage: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                failures[stage] += 1
+                raise
+            finally:
+                samples[stage].append(time.perf_counter() - started)
+        return wrapper
+
+    cron.fetch_salus = timed("salus", cron.fetch_salus)
+    cron.fetch_button = timed("button", cron.fetch_button)
+    cron.fetch_wave = timed("wave", cron.fetch_wave)
+    cron.run_cycle = timed("cycle", cron.run_cycle)
+
+    class TimedReconciler(cron.WaveReconciler):
+        reconcile = timed("reconcile", cron.WaveReconciler.reconcile)
+
+    cron.WaveReconciler = TimedReconciler
+
+    try:
+        cpu_started = time.process_time()
+        for _ in range(args.cycles):
+            if args.cold_credentials and not args.no_button:
+                for resources in pool.sites.values():
+                    resources.get_smart_button().credential_cache.invalidate(
+                        keep_refresh_token=False
+                    )
+            started = time.perf_counter()
+            await cron.main(pool)
+            samples["total"].append(time.perf_counter() - started)
+        cpu = time.process_time() - cpu_started
+    finally:
+        for wave_endpoint in wave_endpoints:
+            wave_endpoint.detach()
+        await pool.close()
+        for gateway in gateways:
+            await gateway.stop()
+        await cloud.stop()
+
+    return {
+        "summary": summarize(samples),
+        "failures": dict(failures),
+        "cloud_calls": cloud.calls,
+        "sites": args.sites,
+        # Includes the fakes, which run in the same process
+        "cpu_ms_per_cycle": cpu / args.cycles * 1000,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    data_dir = tempfile.mkdtemp(prefix="heathub-bench-")
+    os.environ["HEATHUB_DB_DIR"] = data_dir
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        print_summary(result["summary"], result["failures"])
+        print("cloud calls: %s" % ", ".join(
+            "%s=%d" % item for item in sorted(result["cloud_calls"].items())))
+        print("sites: %d, cpu per cycle: %.1f ms, max rss: %.1f MB" % (
+            result["sites"], result["cpu_ms_per_cycle"], result["max_rss_mb"]))
+
+
+if __name__ == "__main__":
+    main()
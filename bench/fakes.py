@@ -0,0 +1,427 @@
+"""Local stand-ins for the external services used by one control cycle.
+
+The fakes of polled services take a Behaviour with a latency (mean and
+jitter) and a failure rate, drawn from a seeded random generator so runs
+are repeatable.
+"""
+import asyncio
+import datetime
+import json
+import random
+import struct
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+from aiohttp import web
+from pyit600.encryptor import IT600Encryptor
+
+from lib.heathub.bathroom import mqtt
+from lib.wave.codec import STATUS_PATH
+
+
+@dataclass
+class Behaviour:
+    latency: float = 0.0
+    jitter: float = 0.0
+    failure_rate: float = 0.0
+
+    def delay(self, rng: random.Random) -> float:
+        # Latency of one request, uniform within +-jitter of the mean.
+        spread = self.latency * self.jitter
+        return max(0.0, rng.uniform(self.latency - spread, self.latency + spread))
+
+    def fails(self, rng: random.Random) -> bool:
+        return rng.random() < self.failure_rate
+
+
+class LocalServer:
+    """aiohttp application served on a free port of 127.0.0.1."""
+
+    def __init__(self, app: web.Application):
+        self.app = app
+        self.runner: Optional[web.AppRunner] = None
+        self.port = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self) -> None:
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+class FakeGateway(LocalServer):
+    """Salus iT600 gateway speaking the encrypted local JSON API of pyit600.
+
+    Serves one gateway device and a number of sIT600TH thermostats; each
+    poll a zone calls for heat with probability heating_rate. A failing
+    request is answered with a rejected status.
+    """
+
+    def __init__(
+        self,
+        euid: str,
+        behaviour: Behaviour,
+        rng: random.Random,
+        zones: int = 4,
+        heating_rate: float = 0.3,
+    ):
+        app = web.Application()
+        app.router.add_post("/deviceid/{command}", self.handle)
+        app.router.add_get("/", lambda request: web.Response(text="ok"))
+        super().__init__(app)
+        self.encryptor = IT600Encryptor(euid)
+        self.behaviour = behaviour
+        self.rng = rng
+        self.zones = zones
+        self.heating_rate = heating_rate
+
+    def gateway_device(self) -> Dict[str, Any]:
+        return {
+            "data": {"UniID": "gateway"},
+            "sGateway": {"NetworkLANMAC": "00:11:22:33:44:55", "ModelIdentifier": "SG888ZB"},
+        }
+
+    def zone_device(self, index: int) -> Dict[str, Any]:
+        heating = self.rng.random() < self.heating_rate
+        return {
+            "data": {"UniID": f"zone-{index}"},
+            "sZDO": {"DeviceName": json.dumps({"deviceName": f"Zone {index}"})},
+            "DeviceL": {"ModelIdentifier_i": "SQ610RF"},
+            "sIT600TH": {
+                "LocalTemperature_x100": 2000 + index * 10,
+                "HeatingSetpoint_x100": 2100,
+                "HoldType": 2,
+                "RunningState": 1 if heating else 0,
+            },
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.behaviour.delay(self.rng))
+        body = json.loads(self.encryptor.decrypt(await request.read()))
+        if self.behaviour.fails(self.rng):
+            response: Dict[str, Any] = {"status": "failed"}
+        else:
+            devices = [self.gateway_device()] + [
+                self.zone_device(index) for index in range(self.zones)
+            ]
+            if body.get("requestAttr") == "deviceid":
+                wanted = {item["data"]["UniID"] for item in body.get("id", [])}
+                devices = [device for device in devices if device["data"]["UniID"] in wanted]
+            response = {"status": "success", "id": devices}
+        return web.Response(
+            body=self.encryptor.encrypt(json.dumps(response)),
+            content_type="application/json",
+        )
+
+
+class FakeWaveEndpoint:
+    """Wave thermostat behind the XMPP server, attached to a WaveSession.
+
+    Replaces the session's stream transport: sent messages are decrypted
+    with the session's codec and answered with encrypted uiStatus or
+    resource replies, "Not Found" for unknown resources, or "No Content"
+    acknowledgements after the configured latency. Replies arrive in request
+    order, as the gateway handles one request at a time. A failed request
+    gets no reply at all, as when a message is lost.
+    """
+
+    def __init__(self, behaviour: Behaviour, rng: random.Random):
+        self.behaviour = behaviour
+        self.rng = rng
+        self.set_point = 20.0
+        self.current_temp = 20.5
+        # Resources besides uiStatus, as (value, unit, type)
+        self.resources: Dict[str, Tuple[Any, Optional[str], str]] = {
+            "/system/sensors/temperatures/outdoor_t1": (8.5, "C", "floatValue"),
+            "/heatingCircuits/hc1/actualSupplyTemperature": (46.0, "C", "floatValue"),
+            "/system/appliance/systemPressure": (1.6, "bar", "floatValue"),
+            "/ecus/rrc/userprogram/activeprogram": (1, None, "floatValue"),
+        }
+        # Daily gas usage recordings, oldest first, as {"d", "ch", "hw", "T"}
+        self.gas_usage: List[Dict[str, Any]] = []
+        # GET requests per resource path without the query
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.session = None
+        self._delivered_at = 0.0
+
+    def attach(self, session) -> None:
+        self.session = session
+        session.send_message = self.send_message
+        # The stream counts as logged in, no XMPP handshake takes place
+        session._ready.set()
+
+    def detach(self) -> None:
+        if self.session is not None:
+            self.session._ready.clear()
+            self.session = None
+
+    def status_document(self) -> Dict[str, Any]:
+        return {
+            "id": STATUS_PATH,
+            "value": {
+                "TSP": str(self.set_point), "IHT": str(self.current_temp),
+                "DHW": "on", "UMD": "clock", "TOD": "0", "CSP": str(self.set_point),
+                "TOR": "off", "HMD": "off", "DAS": "off", "TAS": "off",
+                "BAI": "CH" if self.current_temp < self.set_point else "No",
+            },
+        }
+
+    def add_gas_usage_day(self, day: datetime.date, ch: float, hw: float, outdoor: float) -> None:
+        self.gas_usage.append({
+            "d": day.strftime("%d-%m-%Y"), "ch": ch, "hw": hw, "T": int(outdoor * 10),
+        })
+
+    def gas_usage_document(self, path: str) -> Optional[Dict[str, Any]]:
+        base, _, query = path.partition("?")
+        if base == "/ecus/rrc/recordings/gasusagePointer":
+            return {"id": base, "type": "floatValue", "value": len(self.gas_usage) + 1}
+        if base != "/ecus/rrc/recordings/gasusage" or not query.startswith("page="):
+            return None
+        start = (int(query[len("page="):]) - 1) * 32
+        entries = self.gas_usage[start:start + 32]
+        entries += [{"d": "255-256-65535", "ch": 0, "hw": 0, "T": 0}] * (32 - len(entries))
+        # Pages answer with the resource id without the query
+        return {"id": base, "type": "recordings", "value": entries}
+
+    def reply(self, mbody: str) -> str:
+        codec = self.session.codec
+        method, path = codec.parse_request_line(mbody)
+        if method == "PUT":
+            document = json.loads(codec.decrypt(mbody.rstrip("\n").rsplit("\n", 1)[1]))
+            if path == "/heatingCircuits/hc1/temperatureRoomManual":
+                self.set_point = float(document["value"])
+            return "HTTP/1.0 204 No Content\n\n"
+        self.requests[path.split("?")[0]] += 1
+        if path == STATUS_PATH:
+            document = self.status_document()
+        elif path in self.resources:
+            value, unit, kind = self.resources[path]
+            document = {"id": path, "type": kind, "value": value}
+            if unit is not None:
+                document["unitOfMeasure"] = unit
+        else:
+            document = self.gas_usage_document(path)
+            if document is None:
+                return "HTTP/1.0 404 Not Found\n\n"
+        payload = codec.encrypt(json.dumps(document).encode()).decode("ascii")
+        return "HTTP/1.0 200 OK\nContent-Type: application/json\n\n%s" % payload
+
+    def send_message(self, mto: str, mbody: str, mtype: str) -> None:
+        if self.behaviour.fails(self.rng):
+            return
+        session = self.session
+        body = self.reply(mbody)
+        # Timers due at the same time may run in any order, keep them apart
+        self._delivered_at = max(self._delivered_at + 1e-4,
+                                 session.loop.time() + self.behaviour.delay(self.rng))
+        session.loop.call_at(self._delivered_at, session.message, {"body": body})
+
+
+class FakeCloud(LocalServer):
+    """Cognito user pool, Cognito identity and AWS IoT shadow endpoints.
+
+    Cognito calls arrive as JSON RPC selected by X-Amz-Target, shadows as
+    GET /things/<name>/shadow. The shadow reports the smart button as last
+    pressed up press_age seconds ago.
+    """
+
+    def __init__(self, behaviour: Behaviour, rng: random.Random, press_age: float = 300):
+        app = web.Application()
+        app.router.add_post("/", self.handle_cognito)
+        app.router.add_get("/things/{thing}/shadow", self.handle_shadow)
+        super().__init__(app)
+        self.behaviour = behaviour
+        self.rng = rng
+        self.press_age = press_age
+        self.calls: Dict[str, int] = {}
+
+    def count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def error(self) -> web.Response:
+        return web.json_response(
+            {"__type": "InternalErrorException", "message": "injected failure"},
+            status=500,
+            content_type="application/x-amz-json-1.1",
+        )
+
+    async def handle_cognito(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.behaviour.delay(self.rng))
+        target = request.headers.get("X-Amz-Target", "").split(".")[-1]
+        self.count(target)
+        if self.behaviour.fails(self.rng):
+            return self.error()
+        if target == "InitiateAuth":
+            result: Dict[str, Any] = {
+                "AuthenticationResult": {
+                    "IdToken": "id-token", "AccessToken": "access-token",
+                    "RefreshToken": "refresh-token", "ExpiresIn": 3600, "TokenType": "Bearer",
+                }
+            }
+        elif target == "GetCredentialsForIdentity":
+            result = {
+                "IdentityId": "identity",
+                "Credentials": {
+                    "AccessKeyId": "AKIDFAKE", "SecretKey": "secret",
+                    "SessionToken": "session-token", "Expiration": time.time() + 3600,
+                },
+            }
+        else:
+            return self.error()
+        return web.json_response(result, content_type="application/x-amz-json-1.1")
+
+    def shadow_document(self) -> Dict[str, Any]:
+        now = int(time.time())
+        return {
+            "state": {"reported": {"11": {"properties": {}}}},
+            "metadata": {"reported": {"11": {"properties": {
+                "ep2:sButtonS:ButtonPressed": {"timestamp": now - int(self.press_age)},
+                "ep3:sButtonS:ButtonPressed": {"timestamp": now - 24 * 3600},
+            }}}},
+        }
+
+    async def handle_shadow(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.behaviour.delay(self.rng))
+        self.count("GetThingShadow")
+        if self.behaviour.fails(self.rng):
+            return web.json_response({"message": "injected failure"}, status=503)
+        return web.json_response(self.shadow_document())
+
+
+class FakeMqttBroker(LocalServer):
+    """MQTT 3.1.1 broker with a WebSocket listener on /mqtt.
+
+    Speaks the subset MqttWebSocketClient uses: CONNECT, SUBSCRIBE (topics
+    in refused_topics get a failure code), PINGREQ, PUBACK and DISCONNECT.
+    publish() delivers to every subscriber of a topic, drop() closes all
+    connections as a broker restart would, and with silent set incoming
+    packets go unanswered, as over a half-open connection. Packets are split over several
+    WebSocket frames, as brokers are free to do.
+    """
+
+    def __init__(self) -> None:
+        app = web.Application()
+        app.router.add_get("/mqtt", self.handle)
+        super().__init__(app)
+        self.refused_topics: Set[str] = set()
+        self.subscriptions: Dict[str, List[web.WebSocketResponse]] = defaultdict(list)
+        self.connections: Set[web.WebSocketResponse] = set()
+        self.client_ids: List[str] = []
+        self.pings = 0
+        self.acked: List[int] = []
+        self.subscribed = asyncio.Event()
+        self.silent = False
+        self._packet_id = 0
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/mqtt"
+
+    @staticmethod
+    def read_packets(buffer: bytearray) -> List[Tuple[int, bytes]]:
+        # Take every complete packet off the buffer as (type, body).
+        packets = []
+        while len(buffer) >= 2:
+            length, multiplier, index = 0, 1, 1
+            while index < len(buffer):
+                byte = buffer[index]
+                length += (byte & 0x7F) * multiplier
+                multiplier *= 128
+                index += 1
+                if not byte & 0x80:
+                    break
+            else:
+                return packets
+            if len(buffer) < index + length:
+                return packets
+            packets.append((buffer[0] >> 4, bytes(buffer[index:index + length])))
+            del buffer[:index + length]
+        return packets
+
+    @staticmethod
+    async def send(ws: web.WebSocketResponse, packet: bytes) -> None:
+        middle = len(packet) // 2
+        await ws.send_bytes(packet[:middle])
+        await ws.send_bytes(packet[middle:])
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(protocols=("mqtt",))
+        await ws.prepare(request)
+        self.connections.add(ws)
+        buffer = bytearray()
+        async for message in ws:
+            if message.type != aiohttp.WSMsgType.BINARY:
+                break
+            buffer.extend(message.data)
+            if self.silent:
+                buffer.clear()
+                continue
+            for packet_type, body in self.read_packets(buffer):
+                if packet_type == mqtt.CONNECT:
+                    # Protocol name, level, flags and keepalive precede the client id
+                    offset = 2 + struct.unpack("!H", body[:2])[0] + 4
+                    id_length = struct.unpack("!H", body[offset:offset + 2])[0]
+                    self.client_ids.append(body[offset + 2:offset + 2 + id_length].decode())
+                    await self.send(ws, mqtt.build_packet(mqtt.CONNACK, 0, bytes([0, 0])))
+                elif packet_type == mqtt.SUBSCRIBE:
+                    topic_length = struct.unpack("!H", body[2:4])[0]
+                    topic = body[4:4 + topic_length].decode()
+                    refused = topic in self.refused_topics
+                    if not refused:
+                        self.subscriptions[topic].append(ws)
+                    granted = 0x80 if refused else body[4 + topic_length]
+                    await self.send(ws, mqtt.build_packet(mqtt.SUBACK, 0, body[:2] + bytes([granted])))
+                    self.subscribed.set()
+                elif packet_type == mqtt.PINGREQ:
+                    self.pings += 1
+                    await self.send(ws, mqtt.build_packet(mqtt.PINGRESP, 0, b""))
+                elif packet_type == mqtt.PUBACK:
+                    self.acked.append(struct.unpack("!H", body[:2])[0])
+                elif packet_type == mqtt.DISCONNECT:
+                    await ws.close()
+        self.connections.discard(ws)
+        for subscribers in self.subscriptions.values():
+            if ws in subscribers:
+                subscribers.remove(ws)
+        return ws
+
+    async def publish(self, topic: str, payload: bytes, qos: int = 1) -> int:
+        # Deliver a message to the topic's subscribers, returns their number.
+        body = mqtt.encode_string(topic)
+        if qos:
+            self._packet_id += 1
+            body += struct.pack("!H", self._packet_id)
+        packet = mqtt.build_packet(mqtt.PUBLISH, qos << 1, body + payload)
+        subscribers = [ws for ws in self.subscriptions[topic] if not ws.closed]
+        for ws in subscribers:
+            await self.send(ws, packet)
+        return len(subscribers)
+
+    async def drop(self) -> None:
+        # Close every connection, clients have to connect and subscribe again.
+        self.subscribed.clear()
+        for ws in list(self.connections):
+            await ws.close()
+
+    async def stop(self) -> None:
+        await self.drop()
+        await super().stop()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    # Nearest-rank percentile of a non-empty list.
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
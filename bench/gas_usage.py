@@ -0,0 +1,101 @@
+"""Backfill and daily sync of the Wave gas usage recordings against a fake.
+
+Fills the fake thermostat with a history of daily recordings, syncs it
+into an empty store, then adds days one at a time and syncs again. Checks
+that the store ends up equal to the thermostat's recordings and reports
+requests and wall time of the backfill and of the daily syncs.
+
+Run from the repository root:
+    poetry run python -m bench.gas_usage --days 1500 --window 8
+    poetry run python -m bench.gas_usage --wave-failure-rate 0.05
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from bench.fakes import Behaviour, FakeWaveEndpoint
+from lib.heathub.gasusage import GasUsageStore, sync_gas_usage
+from lib.wave.WaveThermo import WaveThermo
+
+
+async def run(args, path):
+    rng = random.Random(args.seed)
+    wave = WaveThermo(serial_number="123456789", access_code="abcdefghijklmnop", password="bench")
+    wave.session.request_timeout = args.wave_timeout
+    endpoint = FakeWaveEndpoint(
+        Behaviour(args.wave_latency, args.wave_jitter, args.wave_failure_rate), rng)
+    endpoint.attach(wave.session)
+    first_day = datetime.date(2020, 1, 1)
+
+    def add_day():
+        endpoint.add_gas_usage_day(first_day + datetime.timedelta(days=len(endpoint.gas_usage)),
+                                   round(rng.uniform(0, 60), 1), round(rng.uniform(0, 8), 1),
+                                   round(rng.uniform(-10, 25), 1))
+
+    store = GasUsageStore(path)
+    rows = []
+
+    async def sync(name):
+        requests = sum(endpoint.requests.values())
+        started = time.perf_counter()
+        # A lost pointer reply fails the sync, failed pages are picked up by the next one
+        for _ in range(20):
+            try:
+                if not (await sync_gas_usage(wave.reader, store, args.window)).failed:
+                    break
+            except ConnectionError:
+                pass
+        rows.append((name, sum(endpoint.requests.values()) - requests,
+                     time.perf_counter() - started))
+
+    try:
+        for _ in range(args.days):
+            add_day()
+        await sync("backfill")
+        for day in range(args.daily):
+            # Today's entry grows during the day, a new one starts at midnight
+            endpoint.gas_usage[-1]["ch"] += 1.5
+            add_day()
+            await sync("daily %d" % (day + 1))
+        # Every entry of the thermostat, as the parsing stores it
+        expected = [(entry["d"], entry["ch"], entry["hw"], entry["T"] / 10)
+                    for entry in endpoint.gas_usage]
+        stored = [(day.day.strftime("%d-%m-%Y"), day.central_heating, day.hot_water,
+                   day.outdoor_temp) for day in store.days()]
+        assert len(stored) == len(expected), (len(stored), len(expected))
+        for (d1, ch1, hw1, t1), (d2, ch2, hw2, t2) in zip(stored, expected):
+            assert d1 == d2 and abs(ch1 - ch2) < 1e-3 and abs(hw1 - hw2) < 1e-3 and abs(t1 - t2) < 1e-3
+    finally:
+        store.close()
+        endpoint.detach()
+        await wave.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=1000, help="recordings before the backfill")
+    parser.add_argument("--daily", type=int, default=5, help="daily syncs after the backfill")
+    parser.add_argument("--window", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--wave-latency", type=float, default=0.15)
+    parser.add_argument("--wave-jitter", type=float, default=0.5)
+    parser.add_argument("--wave-failure-rate", type=float, default=0.0)
+    parser.add_argument("--wave-timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="heathub-gas-usage-") as directory:
+        path = os.path.join(directory, "wave.bin")
+        rows = asyncio.run(run(args, path))
+        size = os.path.getsize(path)
+    print("store matches the thermostat, %d bytes for %d days" % (size, args.days + args.daily))
+    for name, requests, seconds in rows:
+        print("%-10s %5d requests %9.1f ms" % (name, requests, seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Import-time report for the timer-driven cron run.
+
+Runs `python -X importtime -c "import cron"` in a fresh interpreter and
+prints the slowest imports, to find what to make lazy. The budget itself
+is enforced by tests/test_startup.py.
+
+Run from the repository root:
+    poetry run python -m bench.startup
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from typing import List, Tuple
+
+# Only needed by the smart button, loaded on first use
+LAZY_MODULES = ("aioboto3", "boto3", "aiobotocore")
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str) -> List[Tuple[int, int, int, str]]:
+    # (self us, cumulative us, depth, name) for every import of a cold start.
+    with tempfile.TemporaryDirectory(prefix="heathub-startup-") as data_dir:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            env=dict(os.environ, HEATHUB_DB_DIR=data_dir),
+            cwd=REPO_DIR,
+        )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr)
+    imports = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            imports.append((
+                int(match.group(1)),
+                int(match.group(2)),
+                len(match.group(3)) // 2,
+                match.group(4),
+            ))
+    return imports
+
+
+def cron_import_time(imports: List[Tuple[int, int, int, str]], module: str) -> float:
+    # Cumulative import time of module in seconds.
+    return next(cumulative for _, cumulative, _, name in imports if name == module) / 1e6
+
+
+def fastest(module: str, runs: int) -> List[Tuple[int, int, int, str]]:
+    # Imports of the fastest of several cold starts, the least disturbed one.
+    return min(
+        (measure(module) for _ in range(runs)),
+        key=lambda imports: cron_import_time(imports, module),
+    )
+
+
+def lazy_modules_loaded(imports: List[Tuple[int, int, int, str]]) -> List[str]:
+    # Modules of LAZY_MODULES imported by the cold start.
+    return sorted({name for _, _, _, name in imports if name.split(".")[0] in LAZY_MODULES})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="cron")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="cold starts measured, the fastest one is shown")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    imports = fastest(args.module, args.runs)
+    print("%-50s %10s %10s" % ("module", "self ms", "cumul. ms"))
+    for self_us, cumulative_us, depth, name in sorted(imports, key=lambda item: -item[1])[:args.top]:
+        print("%-50s %10.1f %10.1f" % ("  " * depth + name, self_us / 1000, cumulative_us / 1000))
+    print("import %s: %.3fs" % (args.module, cron_import_time(imports, args.module)))
+    loaded = lazy_modules_loaded(imports)
+    if loaded:
+        print("loaded although lazy: %s" % ", ".join(loaded))
+
+
+if __name__ == "__main__":
+    main()
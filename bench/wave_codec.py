@@ -0,0 +1,64 @@
+"""Micro-benchmark of the Wave protocol codec against the former per-message code.
+
+Run from the repository root:
+    poetry run python -m bench.wave_codec
+
+Correctness is covered by tests/test_wave_codec.py.
+"""
+import argparse
+import base64
+import json
+import timeit
+
+from Crypto.Cipher import AES
+
+from lib.wave.codec import WaveCodec
+
+ACCESS_CODE = "abcdefghijklmnop"
+PASSWORD = "secretpassword"
+
+STATUS_VALUE = {
+    "TSP": "21.0", "IHT": "20.5", "DHW": "on", "UMD": "clock", "TOD": "0",
+    "CSP": "21.0", "TOR": "off", "HMD": "off", "DAS": "off", "TAS": "off",
+    "BAI": "CH",
+}
+
+
+def reply(codec, document):
+    # Frame a reply the way the thermostat does.
+    payload = codec.encrypt(json.dumps(document).encode()).decode("ascii")
+    return "HTTP/1.0 200 OK\nContent-Type: application/json\n\n%s\n\n" % payload
+
+
+def legacy_decode(key, body):
+    # Reply parsing as the bots did it before the codec.
+    data = AES.new(key, AES.MODE_ECB).decrypt(base64.b64decode(body.split("\n\n")[1].strip()))
+    return json.loads(data.replace(b"\x00", b"").decode("utf-8"))
+
+
+def legacy_encode(key, value):
+    j = '{"value":%s}' % value
+    j = j + "\x00" * (16 - len(j) % 16)
+    return base64.b64encode(AES.new(key, AES.MODE_ECB).encrypt(j.encode()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    codec = WaveCodec(ACCESS_CODE, PASSWORD)
+    body = reply(codec, {"id": "/ecus/rrc/uiStatus", "value": STATUS_VALUE})
+    cases = [
+        ("decode status (legacy)", lambda: legacy_decode(codec.key, body)),
+        ("decode status (codec)", lambda: codec.parse_reply(body)),
+        ("encode put (legacy)", lambda: legacy_encode(codec.key, 21.5)),
+        ("encode put (codec)", lambda: codec.build_put("/heatingCircuits/hc1/temperatureRoomManual", 21.5)),
+    ]
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=args.number, repeat=5))
+        print("%-24s %8.2f us/op" % (name, seconds / args.number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
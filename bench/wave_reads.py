@@ -0,0 +1,76 @@
+"""Batched against one-by-one Wave resource reads over a fake thermostat.
+
+Reads uiStatus and the diagnostics resources once per request and once as
+a single batch, checks that both give the same snapshot and reports the
+wall time of each.
+
+Run from the repository root:
+    poetry run python -m bench.wave_reads --wave-latency 0.3 --rounds 20
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from bench.fakes import Behaviour, FakeWaveEndpoint, percentile
+from lib.wave.ReadBot import (
+    ACTIVE_PROGRAM_PATH,
+    OUTDOOR_TEMP_PATH,
+    SUPPLY_TEMP_PATH,
+    SYSTEM_PRESSURE_PATH,
+)
+from lib.wave.WaveThermo import WaveThermo
+
+PATHS = [OUTDOOR_TEMP_PATH, SUPPLY_TEMP_PATH, SYSTEM_PRESSURE_PATH, ACTIVE_PROGRAM_PATH]
+
+
+async def run(args):
+    wave = WaveThermo(serial_number="123456789", access_code="abcdefghijklmnop", password="bench")
+    endpoint = FakeWaveEndpoint(Behaviour(args.wave_latency, args.wave_jitter, 0.0),
+                                random.Random(args.seed))
+    endpoint.attach(wave.session)
+
+    sequential, batched = [], []
+    try:
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            await wave.status.update()
+            one_by_one = {}
+            for path in PATHS:
+                one_by_one.update(await wave.read([path]))
+            sequential.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            snapshot = await wave.diagnostics()
+            batched.append(time.perf_counter() - started)
+
+            assert snapshot.current_temp == wave.status.current_temp
+            assert snapshot.outdoor_temp == one_by_one[OUTDOOR_TEMP_PATH].value
+            assert snapshot.system_pressure == one_by_one[SYSTEM_PRESSURE_PATH].value
+            assert snapshot.active_program == int(one_by_one[ACTIVE_PROGRAM_PATH].value)
+
+        missing = await wave.read(["/does/not/exist", SUPPLY_TEMP_PATH])
+        assert not missing["/does/not/exist"].ok and missing[SUPPLY_TEMP_PATH].ok
+    finally:
+        endpoint.detach()
+        await wave.close()
+    return sequential, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--wave-latency", type=float, default=0.15)
+    parser.add_argument("--wave-jitter", type=float, default=0.5)
+    args = parser.parse_args()
+
+    sequential, batched = asyncio.run(run(args))
+    print("snapshots match")
+    for name, values in (("one by one", sequential), ("batched", batched)):
+        print("%-12s p50 %7.1f ms  p90 %7.1f ms" % (
+            name, percentile(values, 0.5) * 1000, percentile(values, 0.9) * 1000))
+
+
+if __name__ == "__main__":
+    main()
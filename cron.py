@@ -1,142 +1,544 @@
-import sys
+import argparse
 import asyncio
+import time
+import aiohttp
 import nest_asyncio
-from lib.wave.WaveThermo import WaveThermo
+from typing import Any, Dict, Optional, Tuple, Type
 from pyit600.exceptions import IT600AuthenticationError, IT600ConnectionError
-from pyit600.gateway_singleton import IT600GatewaySingleton
-from lib.heathub.bathroom.salus import SmartButton
+from lib.heathub.acquisition import (
+    DEFAULT_SOURCE_DEADLINES,
+    Source,
+    SourceResult,
+    acquire,
+    format_timings,
+)
+from lib.heathub.config import Config, ConfigError, SiteConfig, get_config_store
+from lib.heathub.daemon import Daemon
+from lib.heathub.gasusage import GasUsageStores, sync_gas_usage
+from lib.heathub.metrics import get_metrics
+from lib.heathub.reconciler import WaveReconciler
+from lib.heathub.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, TransientError
+from lib.heathub.resources import CycleResources, SitePool
+from lib.heathub.timeseries import TimeSeriesStore
+from lib.wave.WaveThermo import WaveThermo
 from lib.heathub.utils import (
-    ConfigManager,
     FlagManager,
     LogManager,
     Helper,
+    DEVICE_APP,
     DEVICE_SALUS,
+    DEVICE_SALUS_BUTTON_BATHROOM,
     DEVICE_WAVE,
+    GAS_USAGE_DIR,
     LOG_TYPE_ERROR,
+    METRICS_PATH,
+    TIMESERIES_DIR,
 )
 
 # Apply nest_asyncio to fix event loop issues
 nest_asyncio.apply()
 
-# Load configurations
-config_manager = ConfigManager()
-config = config_manager.get_config()
-config_salus = config.get("salus", {})
-config_wave = config.get("wave", {})
-config_app = config.get("app", {})
+# Errors worth another attempt within the source's deadline; anything else,
+# e.g. a wrong EUID or password, fails the read right away
+SALUS_RETRY_ON: Tuple[Type[BaseException], ...] = (IT600ConnectionError, aiohttp.ClientError, OSError)
+BUTTON_RETRY_ON: Tuple[Type[BaseException], ...] = (TransientError, aiohttp.ClientError, OSError)
+# Dropped sessions, lost replies and an empty status
+WAVE_RETRY_ON: Tuple[Type[BaseException], ...] = (OSError, ValueError)
+# A rejected write (ValueError) is final, a lost acknowledgement is not
+WAVE_WRITE_RETRY_ON: Tuple[Type[BaseException], ...] = (OSError,)
+# Sources whose last known state may stand in for a failed read
+FALLBACK_SOURCES = (DEVICE_SALUS, DEVICE_SALUS_BUTTON_BATHROOM)
+
+# Parsed once, a running daemon picks up edits between cycles
+config_store = get_config_store()
 
 # Initialize flag and log managers
 flag_manager = FlagManager()
 log_manager = LogManager()
+timeseries_store = TimeSeriesStore(TIMESERIES_DIR)
+metrics = get_metrics(METRICS_PATH)
 
 
 # Asynchronous main function
-async def main():
-    # Update flags with the last run date
-    flag_manager.set_flag_namespace(
-        {"last_date_app_run": Helper.get_current_formatted_date()}
-    )
+async def main(pool: Optional[SitePool] = None):
+    # One-shot runs own their clients, the daemon passes long-lived ones
+    owns_pool = pool is None
+    if owns_pool:
+        pool = SitePool(config_store.get)
+    # Flags changed during the cycle, committed in a single write at the end
+    flags: Dict[str, Any] = {"last_date_app_run": Helper.get_current_formatted_date()}
+    try:
+        config = config_store.get()
+        await pool.apply_config()
+        sites = []
+        for site in config.get_sites():
+            missing = site.missing()
+            if missing:
+                log_manager.set_log(
+                    f"Config incomplete, missing: {', '.join(missing)}",
+                    device=DEVICE_APP,
+                    log_type=LOG_TYPE_ERROR,
+                )
+            else:
+                sites.append(site)
+        if not sites:
+            raise ConfigError("no site has a complete config")
+        # Sites run side by side, a slow or failing site does not delay the others' writes
+        limit = asyncio.Semaphore(config.app.max_concurrent_sites)
+        with metrics.span("cycle"):
+            await asyncio.gather(
+                *[run_site(pool.get(site.name), config, flags, limit) for site in sites]
+            )
+    finally:
+        if owns_pool:
+            await pool.close()
+        with metrics.span("persist_flags"):
+            flag_manager.set_flag_namespace(flags)
+        # Write the cycle's log entries in one batch; waiting for the writer
+        # thread must not stall the watchdog and the watchers
+        with metrics.span("persist_logs"):
+            await asyncio.to_thread(log_manager.flush)
+        with metrics.span("persist_timeseries"):
+            timeseries_store.flush()
+        metrics.set("heathub_last_cycle_timestamp_seconds", time.time())
+        metrics.flush()
 
-    # Log the gateway run
-    log_manager.set_log("Gateway run", device=DEVICE_SALUS)
 
-    # Salus logic to get data from thermostats
-    try:
-        async with IT600GatewaySingleton.get_instance(
-            host=config_salus.get("gateway_host"),
-            euid=config_salus.get("gateway_euid"),
-            debug=1,
-        ) as gateway:
-            await gateway.connect()
+async def fetch_salus(resources: CycleResources) -> str:
+    # Poll the thermostats and return "on" when any zone asks for heat.
+    site = resources.site
+    # The zone watcher polls the same gateway object between cycles
+    async with resources.gateway_lock:
+        gateway = await resources.get_gateway()
+        with metrics.span("gateway_poll"):
             await gateway.poll_status(send_callback=False)
-            climate_devices = gateway.get_climate_devices()
-
-            wave_status_thermostat = "off"
-            for climate_device_id, thermostat in climate_devices.items():
-                if thermostat.hvac_action == "heating":
-                    wave_status_thermostat = "on"
-                    log_message = (
-                        f"Heat mode ON - trigger: {thermostat.name} - "
-                        f"current temperature: {thermostat.current_temperature} - "
-                        f"target temperature: {thermostat.target_temperature}"
-                    )
-                    log_manager.set_log(log_message, device=DEVICE_SALUS)
-                    break
-    except IT600ConnectionError:
-        log_manager.set_log(
-            "Connection error: check if you have specified gateway's IP address correctly.",
-            device=DEVICE_SALUS,
-            log_type=LOG_TYPE_ERROR,
+        climate_devices = dict(gateway.get_climate_devices())
+    readings_time = time.time()
+    for climate_device_id, thermostat in climate_devices.items():
+        timeseries_store.record(
+            site.scoped(f"{DEVICE_SALUS}-{climate_device_id}"),
+            readings_time,
+            thermostat.current_temperature,
+            thermostat.target_temperature,
+            thermostat.hvac_action == "heating",
         )
-        sys.exit()
-    except IT600AuthenticationError:
-        log_manager.set_log(
-            "Authentication error: check if you have specified gateway's EUID correctly.",
-            device=DEVICE_SALUS,
-            log_type=LOG_TYPE_ERROR,
+
+    for climate_device_id, thermostat in climate_devices.items():
+        if thermostat.hvac_action == "heating":
+            log_message = (
+                f"Heat mode ON - trigger: {thermostat.name} - "
+                f"current temperature: {thermostat.current_temperature} - "
+                f"target temperature: {thermostat.target_temperature}"
+            )
+            log_manager.set_log(log_message, device=site.scoped(DEVICE_SALUS))
+            return "on"
+    return "off"
+
+
+async def fetch_button(resources: CycleResources) -> Optional[str]:
+    # Read the bathroom smart button status, None when it is unknown.
+    site = resources.site
+    log_manager.set_log("Smart button run", device=site.scoped(DEVICE_SALUS))
+    return await resources.get_smart_button().read_heat_status()
+
+
+async def fetch_wave(resources: CycleResources, attempt_budget: float) -> WaveThermo:
+    # Refresh the Wave status and record it.
+    site = resources.site
+    log_manager.set_log("App run", device=site.scoped(DEVICE_WAVE))
+    wave = resources.get_wave()
+    # The session times out on its own before the retry loop cancels the attempt
+    wave.session.attempt_budget = attempt_budget
+    with metrics.span("wave_status"):
+        await wave.status.update()
+    if wave.status.current_temp is None or wave.status.set_point is None:
+        raise ValueError("Wave returned no status")
+    timeseries_store.record(
+        site.scoped(DEVICE_WAVE),
+        time.time(),
+        wave.status.current_temp,
+        wave.status.set_point,
+        wave.status.boiler_on,
+    )
+    return wave
+
+
+def log_salus_failure(resources: CycleResources, result: SourceResult) -> None:
+    # Force a fresh gateway connect next cycle and log why the poll failed.
+    site = resources.site
+    if result.skipped:
+        return
+    resources.reset_gateway()
+    if result.timed_out:
+        message = f"Gateway did not answer within {result.elapsed:.0f}s"
+    elif isinstance(result.error, IT600ConnectionError):
+        metrics.inc("heathub_errors_total", kind="it600_connection")
+        message = "Connection error: check if you have specified gateway's IP address correctly."
+    elif isinstance(result.error, IT600AuthenticationError):
+        metrics.inc("heathub_errors_total", kind="it600_authentication")
+        message = "Authentication error: check if you have specified gateway's EUID correctly."
+    else:
+        metrics.inc("heathub_errors_total", kind="it600_other")
+        message = f"An unexpected error occurred: {result.error}"
+    log_manager.set_log(message, device=site.scoped(DEVICE_SALUS), log_type=LOG_TYPE_ERROR)
+
+
+def get_source_deadline(config: Config, name: str) -> float:
+    # Per-source deadline from app.source_deadlines, in seconds.
+    return config.app.source_deadlines.get(name, DEFAULT_SOURCE_DEADLINES[name])
+
+
+def get_retry_policy(config: Config, retry_on: Tuple[Type[BaseException], ...]) -> RetryPolicy:
+    return RetryPolicy(attempts=config.app.retry_attempts, retry_on=retry_on)
+
+
+async def read_sources(
+    site: SiteConfig,
+    config: Config,
+    sources: Dict[str, Source],
+    stored: Dict[str, Any],
+    flags: Dict[str, Any],
+) -> Dict[str, SourceResult]:
+    """Read the sources whose circuit breaker lets them through.
+
+    A source that failed breaker_threshold cycles in a row is skipped
+    without waiting for its deadline until the breaker lets a probe through.
+    Breaker states are kept in the site's flags.
+    """
+    breakers = {
+        name: CircuitBreaker(
+            stored.get(f"breaker_{name}"),
+            config.app.breaker_threshold,
+            config.app.breaker_reset_timeout,
         )
-        sys.exit()
-    except Exception as e:
-        log_manager.set_log(
-            f"An unexpected error occurred: {e}",
-            device=DEVICE_SALUS,
-            log_type=LOG_TYPE_ERROR,
+        for name in sources
+    }
+    results = await acquire(
+        {name: source for name, source in sources.items() if breakers[name].allow()}
+    )
+    for name, breaker in breakers.items():
+        result = results.get(name)
+        if result is None:
+            results[name] = SourceResult(
+                name, error=CircuitOpenError(f"{name} failed repeatedly"), skipped=True
+            )
+            continue
+        if result.attempts > 1:
+            metrics.inc("heathub_retries_total", result.attempts - 1, source=name)
+        if result.ok:
+            breaker.record_success()
+        elif breaker.record_failure():
+            metrics.inc("heathub_breaker_opened_total", site=site.name, source=name)
+            log_manager.set_log(
+                f"{name} failed {breaker.failures} times in a row, "
+                f"skipped for {breaker.reset_timeout:.0f}s",
+                device=site.scoped(DEVICE_APP),
+                log_type=LOG_TYPE_ERROR,
+            )
+        flags[f"breaker_{name}"] = breaker.state
+    return results
+
+
+def get_fallbacks(
+    site: SiteConfig,
+    config: Config,
+    results: Dict[str, SourceResult],
+    stored: Dict[str, Any],
+    flags: Dict[str, Any],
+) -> Dict[str, Any]:
+    # Remember fresh readings and return recent ones for sources that failed.
+    now = time.time()
+    fallbacks = {}
+    for name in FALLBACK_SOURCES:
+        result = results.get(name)
+        if result is None:
+            continue
+        if result.ok:
+            flags[f"last_value_{name}"] = {"value": result.value, "at": now}
+            continue
+        last = stored.get(f"last_value_{name}")
+        if last and now - last["at"] <= config.app.fallback_max_age:
+            fallbacks[name] = last["value"]
+            log_manager.set_log(
+                f"Using the last known {name} state {last['value']!r} "
+                f"from {now - last['at']:.0f}s ago",
+                device=site.scoped(DEVICE_APP),
+            )
+    return fallbacks
+
+
+def get_site_flags(site: SiteConfig) -> Dict[str, Any]:
+    # Stored flags of one site, keyed without the site prefix.
+    prefix = site.scoped("")
+    return {
+        key[len(prefix):]: value
+        for key, value in flag_manager.get_flags().items()
+        if key.startswith(prefix)
+    }
+
+
+async def run_site(
+    resources: CycleResources,
+    config: Config,
+    flags: Dict[str, Any],
+    limit: asyncio.Semaphore,
+) -> None:
+    # Run one site's cycle; its failures are logged and stay within the site.
+    site = resources.site
+    site_flags: Dict[str, Any] = {}
+    async with limit:
+        started = time.perf_counter()
+        try:
+            await run_cycle(resources, config, site_flags)
+        except Exception as e:
+            # A single site fails the whole cycle, as before sites existed
+            if len(config.get_sites()) == 1:
+                raise
+            metrics.inc("heathub_errors_total", kind="site", site=site.name)
+            log_manager.set_log(
+                f"Site {site.name} cycle failed: {e}",
+                device=site.scoped(DEVICE_APP),
+                log_type=LOG_TYPE_ERROR,
+            )
+        finally:
+            metrics.observe(
+                "heathub_site_cycle_seconds", time.perf_counter() - started, site=site.name
+            )
+            flags.update({site.scoped(key): value for key, value in site_flags.items()})
+
+
+async def run_cycle(resources: CycleResources, config: Config, flags: Dict[str, Any]):
+    site = resources.site
+
+    # Log the gateway run
+    log_manager.set_log("Gateway run", device=site.scoped(DEVICE_SALUS))
+
+    # Read the thermostats, the bathroom button and the Wave concurrently,
+    # each with retries inside its own deadline
+    wave_retry = get_retry_policy(config, WAVE_RETRY_ON)
+    wave_deadline = get_source_deadline(config, "wave")
+    sources = {
+        DEVICE_SALUS: Source(
+            lambda: fetch_salus(resources),
+            get_source_deadline(config, "salus"),
+            get_retry_policy(config, SALUS_RETRY_ON),
+        ),
+        DEVICE_WAVE: Source(
+            lambda: fetch_wave(resources, wave_retry.attempt_budget(wave_deadline)),
+            wave_deadline,
+            wave_retry,
+        ),
+    }
+    if site.enabled_device_button_bathroom:
+        sources[DEVICE_SALUS_BUTTON_BATHROOM] = Source(
+            lambda: fetch_button(resources),
+            get_source_deadline(config, "button"),
+            get_retry_policy(config, BUTTON_RETRY_ON),
         )
-        sys.exit()
+    stored = get_site_flags(site)
+    results = await read_sources(site, config, sources, stored, flags)
+    log_manager.set_log(f"Acquisition: {format_timings(results)}", device=site.scoped(DEVICE_APP))
+    for result in results.values():
+        if not result.ok:
+            metrics.inc(
+                "heathub_source_failures_total",
+                site=site.name,
+                source=result.name,
+                reason="skipped" if result.skipped else "timeout" if result.timed_out else "error",
+            )
+    fallbacks = get_fallbacks(site, config, results, stored, flags)
+
+    # Salus logic to get data from thermostats
+    salus = results[DEVICE_SALUS]
+    wave_status_thermostat = salus.value if salus.ok else fallbacks.get(DEVICE_SALUS, "off")
+    if not salus.ok:
+        log_salus_failure(resources, salus)
 
     # Salus logic to get data from bathroom smart button
     wave_status_button_bathroom = "off"
-    if config_app.get("enabled_device_button_bathroom"):
-        log_manager.set_log("Smart button run", device=DEVICE_SALUS)
-        smart_button_bathroom = SmartButton()
-        wave_status_button_bathroom = await smart_button_bathroom.get_heat_status()
+    button = results.get(DEVICE_SALUS_BUTTON_BATHROOM)
+    if button is not None:
+        wave_status_button_bathroom = (
+            button.value if button.ok else fallbacks.get(DEVICE_SALUS_BUTTON_BATHROOM)
+        )
+        if button.timed_out:
+            log_manager.set_log(
+                f"Smart button did not answer within {button.elapsed:.0f}s",
+                device=site.scoped(DEVICE_SALUS),
+                log_type=LOG_TYPE_ERROR,
+            )
+        elif button.error is not None and not button.skipped:
+            log_manager.set_log(
+                f"Smart button read failed: {button.error}",
+                device=site.scoped(DEVICE_SALUS),
+                log_type=LOG_TYPE_ERROR,
+            )
         if wave_status_button_bathroom:
             log_manager.set_log(
                 f"Smart button status: {wave_status_button_bathroom}",
-                device=DEVICE_SALUS,
+                device=site.scoped(DEVICE_SALUS),
             )
         if wave_status_button_bathroom == "on":
-            flag_manager.set_flag_namespace(
-                {"last_date_button_bathroom_on": Helper.get_current_formatted_date()}
-            )
+            flags["last_date_button_bathroom_on"] = Helper.get_current_formatted_date()
 
-    # Wave logic to run boiler
-    log_manager.set_log("App run", device=DEVICE_WAVE)
-    wave = WaveThermo(
-        serial_number=config_wave.get("serial_number"),
-        access_code=config_wave.get("access_code"),
-        password=config_wave.get("password"),
-    )
-    await wave.status.update()
-    temperature_set = None
+    # Wave logic to run boiler, nothing can be decided without its status
+    if not results[DEVICE_WAVE].ok:
+        wave_result = results[DEVICE_WAVE]
+        reason = "timeout" if wave_result.timed_out else wave_result.error
+        log_manager.set_log(
+            f"Wave status unavailable ({reason}), boiler left unchanged",
+            device=site.scoped(DEVICE_WAVE),
+            log_type=LOG_TYPE_ERROR,
+        )
+        return
+    wave = results[DEVICE_WAVE].value
+    # Writes only go out when the Wave is not at the desired set point yet
+    reconciler = WaveReconciler(wave, get_site_flags(site))
 
-    # Determine if heating should be turned on or off
+    # Determine if heating should be turned on or off. Any source reporting
+    # "on" turns heating on; heating is only turned off when every source
+    # answered or has a recent known state, a late or failed source never
+    # switches the boiler off.
+    missing = [
+        name for name, result in results.items() if not result.ok and name not in fallbacks
+    ]
+    decision = "none"
     if wave_status_thermostat == "on" or wave_status_button_bathroom == "on":
-        log_manager.set_log("Heat mode ON", device=DEVICE_WAVE)
+        decision = "on"
+        log_manager.set_log("Heat mode ON", device=site.scoped(DEVICE_WAVE))
         if wave.status.current_temp >= wave.status.set_point:
-            temperature_set = wave.status.current_temp + 2
+            reconciler.request(wave.status.current_temp + 2)
             log_manager.set_log(
                 f"Heat mode ENABLE; Wave current: {wave.status.current_temp}; "
                 f"setpoint: {wave.status.set_point}",
-                device=DEVICE_WAVE,
-            )
-            flag_manager.set_flag_namespace(
-                {"last_date_heat_on": Helper.get_current_formatted_date()}
+                device=site.scoped(DEVICE_WAVE),
             )
+            flags["last_date_heat_on"] = Helper.get_current_formatted_date()
+    elif missing:
+        decision = "hold"
+        log_manager.set_log(
+            f"Heat mode unchanged, no data from: {', '.join(missing)}",
+            device=site.scoped(DEVICE_WAVE),
+        )
     elif wave.status.current_temp < wave.status.set_point:
-        temperature_set = 17
-        log_manager.set_log("Heat mode DISABLE", device=DEVICE_WAVE)
+        decision = "off"
+        reconciler.request(17)
+        log_manager.set_log("Heat mode DISABLE", device=site.scoped(DEVICE_WAVE))
 
-    log_manager.set_log("App run end", device=DEVICE_WAVE)
+    metrics.inc("heathub_decisions_total", site=site.name, decision=decision)
+    log_manager.set_log("App run end", device=site.scoped(DEVICE_WAVE))
 
     # Set the new temperature if necessary
+    write_retry = get_retry_policy(config, WAVE_WRITE_RETRY_ON)
+    write_deadline = get_source_deadline(config, "write")
+    wave.session.attempt_budget = write_retry.attempt_budget(write_deadline)
+    try:
+        temperature_set = await reconciler.reconcile(write_deadline, write_retry)
+    except ValueError as e:
+        # The Wave rejected the write, retrying next cycle is all there is to do
+        log_manager.set_log(
+            f"Wave rejected the set point: {e}",
+            device=site.scoped(DEVICE_WAVE),
+            log_type=LOG_TYPE_ERROR,
+        )
+        return
+    finally:
+        flags.update(reconciler.state)
     if temperature_set is not None:
-        await wave.set_temperature(temperature_set)
-        await wave.status.update()
         log_manager.set_log(
             f"Temperature set to: {temperature_set}; Wave set temp: {wave.status.set_point}",
-            device=DEVICE_WAVE,
+            device=site.scoped(DEVICE_WAVE),
+        )
+    elif reconciler.desired is not None:
+        log_manager.set_log(
+            f"Temperature {reconciler.desired} already in place, nothing sent",
+            device=site.scoped(DEVICE_WAVE),
         )
 
-# Run the main function
-asyncio.run(main())
+
+async def run_gas_usage_sync(pool: Optional[SitePool] = None) -> None:
+    # Copy new gas usage recordings of every site's Wave to GAS_USAGE_DIR.
+    owns_pool = pool is None
+    if owns_pool:
+        pool = SitePool(config_store.get)
+    config = config_store.get()
+    stores = GasUsageStores(GAS_USAGE_DIR)
+    try:
+        await pool.apply_config()
+        for site in config.get_sites():
+            device = site.scoped(DEVICE_WAVE)
+            if not (site.wave.serial_number and site.wave.access_code and site.wave.password):
+                continue
+            try:
+                result = await sync_gas_usage(
+                    pool.get(site.name).get_wave().reader,
+                    stores.get(device),
+                    config.app.gas_usage_sync_window,
+                )
+            except Exception as e:
+                metrics.inc("heathub_errors_total", kind="gas_usage_sync", site=site.name)
+                log_manager.set_log(
+                    f"Gas usage sync failed: {e}", device=device, log_type=LOG_TYPE_ERROR
+                )
+                continue
+            message = (
+                f"Gas usage synced up to entry {result.pointer - 1}, "
+                f"pages read: {len(result.pages)}, requests: {result.requests}"
+            )
+            if result.failed:
+                message += f", pages {result.failed} failed"
+            log_manager.set_log(
+                message, device=device, log_type=LOG_TYPE_ERROR if result.failed else "info"
+            )
+    finally:
+        stores.close()
+        if owns_pool:
+            await pool.close()
+        await asyncio.to_thread(log_manager.flush)
+
+
+async def run_daemon():
+    # Keep the process resident and run the cycle on an internal schedule.
+    config = config_store.get()
+    pool = SitePool(config_store.get)
+    watch_task = asyncio.create_task(config_store.watch())
+
+    async def shutdown() -> None:
+        watch_task.cancel()
+        await pool.close()
+
+    daemon = Daemon(
+        cycle=lambda: main(pool),
+        interval=config.app.cycle_interval,
+        on_shutdown=shutdown,
+    )
+    # Clients are rebuilt by the next cycle, the schedule changes right away
+    config_store.on_change(
+        lambda previous, current: setattr(daemon, "interval", current.app.cycle_interval)
+    )
+    # Button presses and zone changes of any site wake the daemon
+    pool.start_watchers(on_change=daemon.trigger)
+    await daemon.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Salus-Wave control cycle")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="stay resident and run the cycle every app.cycle_interval seconds",
+    )
+    parser.add_argument(
+        "--sync-gas-usage",
+        action="store_true",
+        help="copy new gas usage recordings of the Wave thermostats instead of running the cycle",
+    )
+    args = parser.parse_args()
+
+    # Run the main function
+    if args.sync_gas_usage:
+        asyncio.run(run_gas_usage_sync())
+    elif args.daemon:
+        asyncio.run(run_daemon())
+    else:
+        asyncio.run(main())
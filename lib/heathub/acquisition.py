@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+from lib.heathub.resilience import RetryPolicy, call_with_retries
+
+# Seconds each source may take before the cycle decides without it; the
+# slowest read plus the Wave write stay below salus.cron.service's
+# TimeoutStartSec=40
+DEFAULT_SOURCE_DEADLINES: Dict[str, float] = {
+    "salus": 15.0,
+    "button": 15.0,
+    "wave": 20.0,
+    "write": 10.0,
+}
+
+
+class Source(NamedTuple):
+    """How to read one source: the call, its deadline and its retries."""
+
+    fetch: Callable[[], Awaitable[Any]]
+    deadline: float
+    retry: RetryPolicy = RetryPolicy(attempts=1)
+
+
+class SourceResult(NamedTuple):
+    """Outcome of reading one source within its deadline."""
+
+    name: str
+    value: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+    timed_out: bool = False
+    attempts: int = 1
+    # Not called at all, its circuit breaker is open
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.timed_out
+
+
+async def acquire_source(name: str, source: Source) -> SourceResult:
+    # Run one fetch with its retries, giving up once the deadline has passed.
+    started = time.monotonic()
+    retries = []
+    try:
+        value, attempts = await call_with_retries(
+            source.fetch,
+            source.deadline,
+            source.retry,
+            on_retry=lambda attempt, error: retries.append(error),
+        )
+    except asyncio.TimeoutError:
+        return SourceResult(
+            name, elapsed=time.monotonic() - started, timed_out=True, attempts=len(retries) + 1
+        )
+    except Exception as e:
+        return SourceResult(
+            name, error=e, elapsed=time.monotonic() - started, attempts=len(retries) + 1
+        )
+    return SourceResult(name, value=value, elapsed=time.monotonic() - started, attempts=attempts)
+
+
+async def acquire(sources: Dict[str, Source]) -> Dict[str, SourceResult]:
+    """Fetch all sources concurrently, each bounded by its own deadline.
+
+    A slow or failing source never delays or breaks the others; its result
+    carries the error or the timeout instead of a value, so the total time
+    is that of the slowest source capped by the largest deadline. Retries
+    happen within that deadline.
+    """
+    results = await asyncio.gather(
+        *[acquire_source(name, source) for name, source in sources.items()]
+    )
+    return {result.name: result for result in results}
+
+
+def format_timings(results: Dict[str, SourceResult]) -> str:
+    # One log line with the time each source took and how it ended.
+    parts = []
+    for result in results.values():
+        if result.skipped:
+            parts.append(f"{result.name} skipped")
+            continue
+        state = "ok" if result.ok else "timeout" if result.timed_out else "error"
+        attempts = f" x{result.attempts}" if result.attempts > 1 else ""
+        parts.append(f"{result.name} {result.elapsed:.2f}s {state}{attempts}")
+    return "; ".join(parts)
@@ -0,0 +1,129 @@
+import asyncio
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from lib.heathub.utils import DB_DIR
+
+# Tokens and credentials are renewed this many seconds before they expire
+EXPIRY_MARGIN_SECONDS = 300
+CREDENTIALS_PATH = os.path.join(DB_DIR, "credentials.json")
+
+
+class CredentialCache:
+    """Caches Cognito tokens and temporary AWS credentials on disk.
+
+    Entries are keyed by account, written atomically (temp file + rename)
+    under an exclusive flock and readable by the owner only, so a restart
+    reuses them instead of signing in again and processes sharing the file
+    (cron, daemon, sync) keep each other's entries. Clients sharing an account share one instance and hold
+    renew_lock while renewing, so only one of them signs in.
+    """
+
+    def __init__(self, account: str, path: str = CREDENTIALS_PATH):
+        self.account = account
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.lock = threading.Lock()
+        self._entry: Optional[Dict[str, Any]] = None
+        self.renew_lock = asyncio.Lock()
+
+    def _load_all(self) -> Dict[str, Any]:
+        # Read every cached account from disk.
+        try:
+            with open(self.path, "r") as stream:
+                return json.load(stream)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _get_entry(self) -> Dict[str, Any]:
+        # Return this account's entry, reading the file only once.
+        if self._entry is None:
+            self._entry = self._load_all().get(self.account, {})
+        return self._entry
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Serialize writers within this process and across processes.
+        with self.lock:
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self) -> None:
+        # Persist this account's entry next to the others.
+        with self._locked():
+            data = self._load_all()
+            data[self.account] = self._entry
+            # Created with mode 0600 under a unique name
+            with tempfile.NamedTemporaryFile(
+                "w", dir=os.path.dirname(self.path), prefix=".credentials.", delete=False
+            ) as stream:
+                try:
+                    json.dump(data, stream)
+                except BaseException:
+                    os.unlink(stream.name)
+                    raise
+            os.replace(stream.name, self.path)
+
+    @staticmethod
+    def _is_fresh(expires_at: Optional[float]) -> bool:
+        # Check whether a value stays valid for longer than the margin.
+        return expires_at is not None and expires_at - EXPIRY_MARGIN_SECONDS > time.time()
+
+    def get_id_token(self) -> Optional[str]:
+        # Return the cached IdToken if it is still fresh.
+        entry = self._get_entry()
+        if self._is_fresh(entry.get("id_token_expires_at")):
+            return entry.get("id_token")
+        return None
+
+    def get_refresh_token(self) -> Optional[str]:
+        # Return the refresh token used to renew the IdToken without a password.
+        return self._get_entry().get("refresh_token")
+
+    def set_tokens(
+        self, id_token: str, expires_in: int, refresh_token: Optional[str] = None
+    ) -> None:
+        # Store a new IdToken; Cognito only returns a refresh token on sign in.
+        entry = self._get_entry()
+        entry["id_token"] = id_token
+        entry["id_token_expires_at"] = time.time() + expires_in
+        if refresh_token:
+            entry["refresh_token"] = refresh_token
+        self._save()
+
+    def get_aws_credentials(self) -> Optional[Dict[str, Any]]:
+        # Return the cached AWS credentials if they are still fresh.
+        entry = self._get_entry()
+        if self._is_fresh(entry.get("aws_credentials_expires_at")):
+            return entry.get("aws_credentials")
+        return None
+
+    def set_aws_credentials(self, credentials: Dict[str, Any]) -> None:
+        # Store temporary AWS credentials along with their expiry time.
+        entry = self._get_entry()
+        entry["aws_credentials"] = {
+            "AccessKeyId": credentials["AccessKeyId"],
+            "SecretKey": credentials["SecretKey"],
+            "SessionToken": credentials["SessionToken"],
+        }
+        entry["aws_credentials_expires_at"] = credentials["Expiration"].timestamp()
+        self._save()
+
+    def invalidate(self, keep_refresh_token: bool = True) -> None:
+        # Drop cached values, e.g. after the endpoint rejected them.
+        entry = self._get_entry()
+        refresh_token = entry.get("refresh_token")
+        entry.clear()
+        if keep_refresh_token and refresh_token:
+            entry["refresh_token"] = refresh_token
+        self._save()
@@ -0,0 +1,232 @@
+import asyncio
+import struct
+import aiohttp
+from collections import deque
+from typing import AsyncIterator, Deque, Optional, Tuple
+
+# MQTT 3.1.1 control packet types
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+DEFAULT_KEEPALIVE = 60
+# Time the broker gets to answer CONNECT and SUBSCRIBE
+RESPONSE_TIMEOUT = 10
+
+
+class MqttError(Exception):
+    """Raised when the broker refuses or breaks the MQTT session."""
+
+
+def encode_length(length: int) -> bytes:
+    # Encode an MQTT remaining length as a variable byte integer.
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value: str) -> bytes:
+    # Encode a length-prefixed UTF-8 string.
+    data = value.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+def build_packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    # Prefix a packet body with its fixed header.
+    return bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body
+
+
+class MqttWebSocketClient:
+    """Minimal MQTT 3.1.1 subscriber over a WebSocket connection.
+
+    Only what a shadow subscription needs is implemented: connect, subscribe,
+    QoS 0/1 incoming publishes and keepalive pings. Works against AWS IoT
+    (with a presigned URL) as well as any local broker with a WebSocket
+    listener, e.g. mosquitto on ws://localhost:9001/mqtt.
+
+    A half-open connection delivers nothing and raises nothing, so the
+    client watches the PINGRESPs, which messages() reads along with the
+    publishes: once the broker misses a keepalive period, is_alive() turns
+    False and the connection is closed, which ends messages() with
+    ConnectionError.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        client_id: str,
+        keepalive: int = DEFAULT_KEEPALIVE,
+        session: Optional[aiohttp.ClientSession] = None,
+        response_timeout: float = RESPONSE_TIMEOUT,
+    ):
+        self.url = url
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.response_timeout = response_timeout
+        # Loop time of the last PINGRESP, or of the CONNACK before the first one
+        self.answered_at: Optional[float] = None
+        self._session = session
+        self._close_session = session is None
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._buffer = bytearray()
+        self._packet_id = 0
+        # Packets read while waiting for a SUBACK, handed out by messages()
+        self._backlog: Deque[Tuple[int, int, bytes]] = deque()
+        self._ping_task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        # Open the WebSocket and perform the MQTT handshake.
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        try:
+            await asyncio.wait_for(self._handshake(), self.response_timeout)
+        except asyncio.TimeoutError:
+            raise MqttError("No CONNACK from broker") from None
+        self.answered_at = asyncio.get_running_loop().time()
+        self._ping_task = asyncio.create_task(self._ping())
+
+    async def _handshake(self) -> None:
+        self._ws = await self._session.ws_connect(self.url, protocols=("mqtt",))
+        body = (
+            encode_string("MQTT")
+            + bytes([4, 0x02])  # protocol level 3.1.1, clean session
+            + struct.pack("!H", self.keepalive)
+            + encode_string(self.client_id)
+        )
+        await self._send(build_packet(CONNECT, 0, body))
+        packet_type, _, payload = await self._read_packet()
+        if packet_type != CONNACK or len(payload) < 2 or payload[1] != 0:
+            raise MqttError(f"Connection refused by broker: {payload!r}")
+
+    async def subscribe(self, topic: str, qos: int = 1) -> None:
+        # Subscribe to a topic and wait until the broker acknowledges it.
+        packet_id = struct.pack("!H", self._next_packet_id())
+        body = packet_id + encode_string(topic)
+        await self._send(build_packet(SUBSCRIBE, 0x02, body + bytes([qos])))
+        try:
+            await asyncio.wait_for(self._wait_suback(topic, packet_id), self.response_timeout)
+        except asyncio.TimeoutError:
+            raise MqttError(f"No SUBACK for {topic} from broker") from None
+
+    async def _wait_suback(self, topic: str, packet_id: bytes) -> None:
+        while True:
+            packet = await self._read_packet()
+            packet_type, _, payload = packet
+            if packet_type == SUBACK and payload[:2] == packet_id:
+                if 0x80 in payload[2:]:
+                    raise MqttError(f"Subscription to {topic} refused by broker")
+                return
+            self._backlog.append(packet)
+
+    def is_alive(self) -> bool:
+        # True while connected and the broker answered within a keepalive period.
+        if self._ws is None or self._ws.closed or self.answered_at is None:
+            return False
+        return asyncio.get_running_loop().time() - self.answered_at <= self.keepalive
+
+    async def messages(self) -> AsyncIterator[Tuple[str, bytes]]:
+        # Yield (topic, payload) for every PUBLISH until the connection ends.
+        while True:
+            if self._backlog:
+                packet_type, flags, payload = self._backlog.popleft()
+            else:
+                packet_type, flags, payload = await self._read_packet()
+            if packet_type == PUBLISH:
+                topic_length = struct.unpack("!H", payload[:2])[0]
+                topic = payload[2:2 + topic_length].decode("utf-8")
+                offset = 2 + topic_length
+                qos = (flags >> 1) & 0x03
+                if qos:
+                    packet_id = payload[offset:offset + 2]
+                    offset += 2
+                    await self._send(build_packet(PUBACK, 0, packet_id))
+                yield topic, bytes(payload[offset:])
+
+    async def close(self) -> None:
+        # Say goodbye to the broker and release the connection.
+        if self._ping_task is not None:
+            self._ping_task.cancel()
+            self._ping_task = None
+        if self._ws is not None and not self._ws.closed:
+            try:
+                await self._send(build_packet(DISCONNECT, 0, b""))
+            except (ConnectionError, aiohttp.ClientError):
+                pass
+            await self._ws.close()
+        self._ws = None
+        self._buffer.clear()
+        self._backlog.clear()
+        if self._session is not None and self._close_session:
+            await self._session.close()
+            self._session = None
+
+    def _next_packet_id(self) -> int:
+        self._packet_id = self._packet_id % 0xFFFF + 1
+        return self._packet_id
+
+    async def _ping(self) -> None:
+        # Keep the session alive, the broker drops it after 1.5x keepalive;
+        # close the connection once the broker stops answering the pings.
+        while True:
+            await asyncio.sleep(self.keepalive / 2)
+            if not self.is_alive():
+                if self._ws is not None:
+                    await self._ws.close()
+                return
+            try:
+                await self._send(build_packet(PINGREQ, 0, b""))
+            except (ConnectionError, aiohttp.ClientError):
+                return
+
+    async def _send(self, packet: bytes) -> None:
+        if self._ws is None or self._ws.closed:
+            raise ConnectionError("MQTT connection is closed")
+        await self._ws.send_bytes(packet)
+
+    async def _fill(self, size: int) -> None:
+        # Read WebSocket frames until the buffer holds at least size bytes.
+        while len(self._buffer) < size:
+            msg = await self._ws.receive()
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                self._buffer.extend(msg.data)
+            elif msg.type in (
+                aiohttp.WSMsgType.CLOSE,
+                aiohttp.WSMsgType.CLOSED,
+                aiohttp.WSMsgType.CLOSING,
+                aiohttp.WSMsgType.ERROR,
+            ):
+                raise ConnectionError("MQTT connection closed by broker")
+
+    async def _read_packet(self) -> Tuple[int, int, bytes]:
+        # Read one packet; a WebSocket frame may carry several or a partial one.
+        await self._fill(2)
+        length = 0
+        multiplier = 1
+        index = 1
+        while True:
+            await self._fill(index + 1)
+            byte = self._buffer[index]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            index += 1
+            if not byte & 0x80:
+                break
+        await self._fill(index + length)
+        header = self._buffer[0]
+        payload = bytes(self._buffer[index:index + length])
+        del self._buffer[:index + length]
+        if header >> 4 == PINGRESP:
+            self.answered_at = asyncio.get_running_loop().time()
+        return header >> 4, header & 0x0F, payload
@@ -1,27 +1,29 @@
-import boto3
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
-import aiohttp
+from contextlib import AsyncExitStack
 import time
 import datetime
-from typing import Any, Dict, Optional
-from urllib.parse import urlparse
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple
 
 # Import the utility classes and constants
+from lib.heathub.bathroom.credentials import CredentialCache
+from lib.heathub.bathroom.shadow import ShadowClient
+from lib.heathub.metrics import get_metrics
+from lib.heathub.resilience import TransientError
 from lib.heathub.utils import (
-    ConfigManager,
     LogManager,
     Helper,
     DEVICE_SALUS_BUTTON_BATHROOM,
     LOG_TYPE_ERROR,
+    METRICS_PATH,
 )
 
+from lib.heathub.config import SalusConfig, get_config_store
+
+if TYPE_CHECKING:
+    from lib.heathub.bathroom.subscription import ShadowSubscription
+
 # Initialize managers
-config_manager = ConfigManager()
 log_manager = LogManager()
-
-# Load configuration
-config_salus = config_manager.get_config().get("salus", {})
+metrics = get_metrics(METRICS_PATH)
 
 
 class SmartButton:
@@ -30,20 +32,84 @@ class SmartButton:
     heat_status_off = "off"
     heat_status_on = "on"
 
-    def __init__(self):
-        self.user_pool_id = config_salus.get("account_user_pool_id")
-        self.client_id = config_salus.get("account_client_id")
-        self.identity_id = config_salus.get("account_identity_id")
-        self.region = config_salus.get("account_region")
-        self.username = config_salus.get("account_username")
-        self.password = config_salus.get("account_password")
-        self.endpoint = config_salus.get("account_iot_endpoint")
-        self.thing_name = config_salus.get("account_device_button_bathroom_id")
-        self.boiler_working_time = float(
-            config_salus.get("device_button_bathroom_boiler_working_time", 0)
+    def __init__(
+        self,
+        config_salus: Optional[SalusConfig] = None,
+        shadow_client: Optional[ShadowClient] = None,
+        device: str = DEVICE_SALUS_BUTTON_BATHROOM,
+        credential_cache: Optional[CredentialCache] = None,
+        open_cognito: Optional[Callable[[str], Awaitable[Tuple[Any, Any]]]] = None,
+    ):
+        if config_salus is None:
+            config_salus = get_config_store().get().salus
+        self.user_pool_id = config_salus.account_user_pool_id
+        self.client_id = config_salus.account_client_id
+        self.identity_id = config_salus.account_identity_id
+        self.region = config_salus.account_region
+        self.username = config_salus.account_username
+        self.password = config_salus.account_password
+        self.endpoint = config_salus.account_iot_endpoint
+        self.thing_name = config_salus.account_device_button_bathroom_id
+        # Optional ws:// URL of a local MQTT broker used instead of AWS IoT
+        self.mqtt_url = config_salus.account_iot_mqtt_url
+        self.boiler_working_time = config_salus.device_button_bathroom_boiler_working_time
+        # Async Cognito clients are opened on first use and kept until close(),
+        # or borrowed from open_cognito(region) when several buttons share them
+        self.aws_session = None
+        self.open_cognito = open_cognito
+        self.client_stack: Optional[AsyncExitStack] = None
+        self.auth_client = None
+        self.identity_client = None
+        self.credential_cache = credential_cache or CredentialCache(self.account)
+        # Buttons of several sites can share one pool towards the same endpoint
+        self.owns_shadow_client = shadow_client is None
+        self.shadow_client = shadow_client or ShadowClient(self.endpoint, self.region)
+        # Log device, scoped to the site the button belongs to
+        self.device = device
+        self.subscription: Optional["ShadowSubscription"] = None
+        self.subscription_callback: Optional[Callable[[], None]] = None
+        # ButtonPressed timestamps of the last shadow seen, a change runs the cycle
+        self.presses: Optional[Tuple[Any, Any]] = None
+
+    @property
+    def account(self) -> str:
+        # Key of the cached tokens and credentials.
+        return f"{self.username}@{self.identity_id}"
+
+    async def open_clients(self) -> None:
+        # Open the async Cognito clients without blocking the event loop.
+
+        if self.auth_client is not None:
+            return
+        if self.open_cognito is not None:
+            self.auth_client, self.identity_client = await self.open_cognito(self.region)
+            return
+        if self.aws_session is None:
+            # aioboto3 is only imported when Cognito has to be called
+            import aioboto3
+
+            self.aws_session = aioboto3.Session()
+        stack = AsyncExitStack()
+        self.auth_client = await stack.enter_async_context(
+            self.aws_session.client("cognito-idp", region_name=self.region)
+        )
+        self.identity_client = await stack.enter_async_context(
+            self.aws_session.client("cognito-identity", region_name=self.region)
         )
-        self.auth_client = boto3.client("cognito-idp", region_name=self.region)
-        self.identity_client = boto3.client("cognito-identity", region_name=self.region)
+        self.client_stack = stack
+
+    async def close(self) -> None:
+        # Close the Cognito clients and their connection pools.
+
+        if self.subscription is not None:
+            await self.subscription.stop()
+        if self.owns_shadow_client:
+            await self.shadow_client.close()
+        if self.client_stack is not None:
+            await self.client_stack.aclose()
+            self.client_stack = None
+        self.auth_client = None
+        self.identity_client = None
 
     async def authenticate_user(self) -> str:
         # Authenticate the user and retrieve the ID token.
@@ -54,136 +120,239 @@ class SmartButton:
             "AuthParameters": {"USERNAME": self.username, "PASSWORD": self.password},
         }
 
-        auth_response = self.auth_client.initiate_auth(**auth_params)
-        id_token = auth_response["AuthenticationResult"]["IdToken"]
-        return id_token
+        await self.open_clients()
+        with metrics.span("button_auth"):
+            auth_response = await self.auth_client.initiate_auth(**auth_params)
+        result = auth_response["AuthenticationResult"]
+        self.credential_cache.set_tokens(
+            result["IdToken"], result["ExpiresIn"], result.get("RefreshToken")
+        )
+        return result["IdToken"]
+
+    async def refresh_user(self) -> Optional[str]:
+        # Renew the ID token with the cached refresh token instead of the password.
+
+        refresh_token = self.credential_cache.get_refresh_token()
+        if not refresh_token:
+            return None
+
+        auth_params = {
+            "AuthFlow": "REFRESH_TOKEN_AUTH",
+            "ClientId": self.client_id,
+            "AuthParameters": {"REFRESH_TOKEN": refresh_token},
+        }
+
+        await self.open_clients()
+        try:
+            with metrics.span("button_auth"):
+                auth_response = await self.auth_client.initiate_auth(**auth_params)
+        except self.auth_client.exceptions.NotAuthorizedException:
+            # Refresh token expired or revoked, fall back to the password
+            metrics.inc("heathub_retries_total", source="button_auth")
+            self.credential_cache.invalidate(keep_refresh_token=False)
+            return None
+        result = auth_response["AuthenticationResult"]
+        self.credential_cache.set_tokens(result["IdToken"], result["ExpiresIn"])
+        return result["IdToken"]
 
     async def get_aws_credentials(self, id_token: str) -> Dict[str, Any]:
         # Retrieve AWS credentials using the ID token.
 
-        credentials_response = self.identity_client.get_credentials_for_identity(
-            IdentityId=self.identity_id,
-            Logins={
-                f"cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}": id_token
-            },
-        )
-        return credentials_response["Credentials"]
+        await self.open_clients()
+        with metrics.span("button_credentials"):
+            credentials_response = await self.identity_client.get_credentials_for_identity(
+                IdentityId=self.identity_id,
+                Logins={
+                    f"cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}": id_token
+                },
+            )
+        credentials = credentials_response["Credentials"]
+        self.credential_cache.set_aws_credentials(credentials)
+        return credentials
+
+    async def get_credentials(self) -> Dict[str, Any]:
+        # Return AWS credentials, reusing cached ones until shortly before expiry.
+
+        credentials = self.credential_cache.get_aws_credentials()
+        if credentials:
+            return credentials
+
+        async with self.credential_cache.renew_lock:
+            # Another button of the same account may have renewed them meanwhile
+            credentials = self.credential_cache.get_aws_credentials()
+            if credentials:
+                return credentials
+            id_token = self.credential_cache.get_id_token()
+            if id_token is None:
+                id_token = await self.refresh_user() or await self.authenticate_user()
+            return await self.get_aws_credentials(id_token)
 
     async def make_signed_request(self, credentials: Dict[str, Any]) -> Any:
         # Make a signed GET request to the AWS IoT endpoint.
 
-        request_url = f"{self.endpoint}/things/{self.thing_name}/shadow"
-        aws_credentials = (
-            boto3.Session(
-                aws_access_key_id=credentials["AccessKeyId"],
-                aws_secret_access_key=credentials["SecretKey"],
-                aws_session_token=credentials["SessionToken"],
+        with metrics.span("button_shadow"):
+            return await self.shadow_client.get_shadow(self.thing_name, credentials)
+
+    def start_subscription(self, on_change: Optional[Callable[[], None]] = None) -> None:
+        # Follow shadow updates over MQTT instead of polling on every cycle.
+
+        from lib.heathub.bathroom.subscription import ShadowSubscription
+
+        self.subscription_callback = on_change
+        if self.subscription is None:
+            self.subscription = ShadowSubscription(
+                self.thing_name,
+                self.get_subscription_url,
+                on_update=self.on_shadow_update,
+                get_document=self.fetch_shadow,
+                device=self.device,
             )
-            .get_credentials()
-            .get_frozen_credentials()
-        )
+        self.subscription.start()
 
-        request = AWSRequest(method="GET", url=request_url)
-        SigV4Auth(aws_credentials, "iotdata", self.region).add_auth(request)
+    def on_shadow_update(self, document: Dict[str, Any]) -> None:
+        # Run the cycle when a pushed or re-seeded shadow holds a new press.
 
-        # Extract host from endpoint URL
-        parsed_url = urlparse(self.endpoint)
-        host = parsed_url.netloc
+        previous = self.presses
+        self.remember_presses(document)
+        if (
+            previous is not None
+            and self.presses != previous
+            and self.subscription_callback is not None
+        ):
+            self.subscription_callback()
 
-        headers = {
-            "X-Amz-Security-Token": credentials["SessionToken"],
-            "X-Amz-Date": request.headers["X-Amz-Date"],
-            "Authorization": request.headers["Authorization"],
-            "Accept": "application/json",
-            "Host": host,
-        }
+    def remember_presses(self, document: Dict[str, Any]) -> None:
+        # Keep the button press timestamps of the newest shadow seen.
+
+        presses = self.get_press_timestamps(document)
+        if presses is not None:
+            self.presses = presses
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(request_url, headers=headers) as response:
-                response_json = None
-                response_text = None
-                if response.status == 200:
-                    response_json = await response.json()
-                else:
-                    response_text = await response.text()
-                return response.status, response_json, response_text
+    @staticmethod
+    def get_press_timestamps(document: Dict[str, Any]) -> Optional[Tuple[Any, Any]]:
+        # Up (ep2) and down (ep3) ButtonPressed timestamps, None when absent.
+
+        try:
+            metadata = document["metadata"]["reported"]["11"]["properties"]
+            return (
+                metadata["ep2:sButtonS:ButtonPressed"]["timestamp"],
+                metadata["ep3:sButtonS:ButtonPressed"]["timestamp"],
+            )
+        except (KeyError, TypeError):
+            return None
+
+    async def fetch_shadow(self) -> Optional[Dict[str, Any]]:
+        # Read the shadow once, None when the endpoint does not return it.
+
+        credentials = await self.get_credentials()
+        status, response_json, _ = await self.make_signed_request(credentials)
+        return response_json if status == 200 else None
+
+    async def get_subscription_url(self) -> str:
+        # Return the MQTT WebSocket URL, presigned unless a local broker is set.
+
+        if self.mqtt_url:
+            return self.mqtt_url
+        from lib.heathub.bathroom.subscription import presign_iot_url
+
+        credentials = await self.get_credentials()
+        return presign_iot_url(self.endpoint, self.region, credentials)
+
+    async def read_heat_status(self) -> Optional[str]:
+        # Retrieve the heat status based on the button presses, raise when unreadable.
+
+        if self.subscription is not None and self.subscription.is_live():
+            # Pushed shadow updates are already in memory, no request needed
+            return self.evaluate_shadow(self.subscription.document)
+
+        credentials = await self.get_credentials()
+        status, response_json, response_text = await self.make_signed_request(credentials)
+        if status in (401, 403):
+            # Cached credentials were rejected, sign in again on the next attempt
+            metrics.inc("heathub_errors_total", kind="button_unauthorized")
+            self.credential_cache.invalidate()
+        if status == 200 and response_json:
+            if self.subscription is not None:
+                # Seed the subscription until the first pushed update arrives;
+                # this cycle handles the presses, the next push need not
+                self.subscription.document = response_json
+                self.remember_presses(response_json)
+            return self.evaluate_shadow(response_json)
+        message = f"Request failed with status {status}: {response_text}"
+        if status in (401, 403, 429) or status >= 500:
+            raise TransientError(message)
+        raise ValueError(message)
 
     async def get_heat_status(self) -> Optional[str]:
-        # Retrieve the heat status based on the button presses.
+        # Retrieve the heat status, None when the shadow cannot be read.
 
         try:
-            id_token = await self.authenticate_user()
-            credentials = await self.get_aws_credentials(id_token)
-            status, response_json, response_text = await self.make_signed_request(
-                credentials
+            return await self.read_heat_status()
+        except Exception as e:
+            log_manager.set_log(
+                f"Exception in get_heat_status: {e}",
+                device=self.device,
+                log_type=LOG_TYPE_ERROR,
             )
-            if status == 200 and response_json:
-                try:
-                    reported = response_json["state"]["reported"]["11"]["properties"]
-                    metadata = response_json["metadata"]["reported"]["11"]["properties"]
-
-                    button_up_pressed_timestamp = metadata[
-                        "ep2:sButtonS:ButtonPressed"
-                    ]["timestamp"]
-                    button_down_pressed_timestamp = metadata[
-                        "ep3:sButtonS:ButtonPressed"
-                    ]["timestamp"]
-
-                    # Convert timestamps to human-readable format
-                    button_up_pressed_date = datetime.datetime.fromtimestamp(
-                        button_up_pressed_timestamp
-                    ).strftime("%Y-%m-%d %H:%M:%S")
-                    button_down_pressed_date = datetime.datetime.fromtimestamp(
-                        button_down_pressed_timestamp
-                    ).strftime("%Y-%m-%d %H:%M:%S")
-
-                    # Get the current time and hour
-                    current_time = int(time.time())
-                    current_hour = datetime.datetime.now().hour
-                    current_minute = datetime.datetime.now().minute
-
-                    # Check if the current time is between 11 PM and 5:30 AM
-                    if (
-                        (current_hour == 23)
-                        or (0 <= current_hour < 5)
-                        or (current_hour == 5 and current_minute < 30)
-                    ):
-                        log_manager.set_log(
-                            "Button press ignored due to time restriction (11 PM - 5:30 AM)",
-                            device=DEVICE_SALUS_BUTTON_BATHROOM,
-                        )
-                        return self.heat_status_off
-
-                    heat_status = self.heat_status_off
-                    if button_up_pressed_timestamp > button_down_pressed_timestamp:
-                        time_difference = current_time - button_up_pressed_timestamp
-                        time_difference_minutes = time_difference / 60
-                        if 0 <= time_difference_minutes < self.boiler_working_time:
-                            log_manager.set_log(
-                                f"Button pressed up at {button_up_pressed_date}; "
-                                f"Button pressed down at {button_down_pressed_date}; "
-                                f"Waiting time: {self.boiler_working_time}; "
-                                f"Time difference (minutes): {time_difference_minutes}",
-                                device=DEVICE_SALUS_BUTTON_BATHROOM,
-                            )
-                            heat_status = self.heat_status_on
-                    return heat_status
-                except KeyError as e:
-                    log_manager.set_log(
-                        f"KeyError: {e}",
-                        device=DEVICE_SALUS_BUTTON_BATHROOM,
-                        log_type=LOG_TYPE_ERROR,
-                    )
-            else:
+        return None
+
+    def evaluate_shadow(self, response_json: Dict[str, Any]) -> Optional[str]:
+        # Derive the heat status from the button timestamps in a shadow document.
+
+        try:
+            reported = response_json["state"]["reported"]["11"]["properties"]
+            metadata = response_json["metadata"]["reported"]["11"]["properties"]
+
+            button_up_pressed_timestamp = metadata[
+                "ep2:sButtonS:ButtonPressed"
+            ]["timestamp"]
+            button_down_pressed_timestamp = metadata[
+                "ep3:sButtonS:ButtonPressed"
+            ]["timestamp"]
+
+            # Convert timestamps to human-readable format
+            button_up_pressed_date = datetime.datetime.fromtimestamp(
+                button_up_pressed_timestamp
+            ).strftime("%Y-%m-%d %H:%M:%S")
+            button_down_pressed_date = datetime.datetime.fromtimestamp(
+                button_down_pressed_timestamp
+            ).strftime("%Y-%m-%d %H:%M:%S")
+
+            # Get the current time and hour
+            current_time = int(time.time())
+            current_hour = datetime.datetime.now().hour
+            current_minute = datetime.datetime.now().minute
+
+            # Check if the current time is between 11 PM and 5:30 AM
+            if (
+                (current_hour == 23)
+                or (0 <= current_hour < 5)
+                or (current_hour == 5 and current_minute < 30)
+            ):
                 log_manager.set_log(
-                    f"Request failed with status {status}: {response_text}",
-                    device=DEVICE_SALUS_BUTTON_BATHROOM,
-                    log_type=LOG_TYPE_ERROR,
+                    "Button press ignored due to time restriction (11 PM - 5:30 AM)",
+                    device=self.device,
                 )
-        except Exception as e:
+                return self.heat_status_off
+
+            heat_status = self.heat_status_off
+            if button_up_pressed_timestamp > button_down_pressed_timestamp:
+                time_difference = current_time - button_up_pressed_timestamp
+                time_difference_minutes = time_difference / 60
+                if 0 <= time_difference_minutes < self.boiler_working_time:
+                    log_manager.set_log(
+                        f"Button pressed up at {button_up_pressed_date}; "
+                        f"Button pressed down at {button_down_pressed_date}; "
+                        f"Waiting time: {self.boiler_working_time}; "
+                        f"Time difference (minutes): {time_difference_minutes}",
+                        device=self.device,
+                    )
+                    heat_status = self.heat_status_on
+            return heat_status
+        except KeyError as e:
             log_manager.set_log(
-                f"Exception in get_heat_status: {e}",
-                device=DEVICE_SALUS_BUTTON_BATHROOM,
+                f"KeyError: {e}",
+                device=self.device,
                 log_type=LOG_TYPE_ERROR,
             )
         return None
@@ -0,0 +1,89 @@
+import aiohttp
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+# Connections kept open towards the IoT data endpoint
+POOL_SIZE = 8
+KEEPALIVE_TIMEOUT = 120
+REQUEST_TIMEOUT = 10
+
+ShadowResponse = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+class ShadowClient:
+    """Reads AWS IoT device shadows over a shared keep-alive connection pool.
+
+    The SigV4 signer is built once per credential set and reused until the
+    credentials change.
+    """
+
+    def __init__(self, endpoint: str, region: str):
+        self.endpoint = endpoint
+        self.region = region
+        self.host = urlparse(endpoint).netloc
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._signer: Optional[SigV4Auth] = None
+        self._signer_key: Optional[Tuple[str, str]] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Open the pooled HTTP session on first use.
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=POOL_SIZE, keepalive_timeout=KEEPALIVE_TIMEOUT
+                ),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            )
+        return self._session
+
+    def _get_signer(self, credentials: Dict[str, Any]) -> SigV4Auth:
+        # Return the signer for these credentials, rebuilding it when they change.
+        key = (credentials["AccessKeyId"], credentials["SessionToken"])
+        if self._signer is None or self._signer_key != key:
+            self._signer = SigV4Auth(
+                Credentials(
+                    credentials["AccessKeyId"],
+                    credentials["SecretKey"],
+                    credentials["SessionToken"],
+                ),
+                "iotdata",
+                self.region,
+            )
+            self._signer_key = key
+        return self._signer
+
+    def sign(self, url: str, credentials: Dict[str, Any]) -> Dict[str, str]:
+        # Build the signed headers for a GET request.
+        request = AWSRequest(method="GET", url=url)
+        self._get_signer(credentials).add_auth(request)
+        return {
+            "X-Amz-Security-Token": credentials["SessionToken"],
+            "X-Amz-Date": request.headers["X-Amz-Date"],
+            "Authorization": request.headers["Authorization"],
+            "Accept": "application/json",
+            "Host": self.host,
+        }
+
+    async def get_shadow(
+        self, thing_name: str, credentials: Dict[str, Any]
+    ) -> ShadowResponse:
+        # Fetch one thing's shadow, returns (status, json, text).
+        request_url = f"{self.endpoint}/things/{thing_name}/shadow"
+        headers = self.sign(request_url, credentials)
+        async with self._get_session().get(request_url, headers=headers) as response:
+            response_json = None
+            response_text = None
+            if response.status == 200:
+                response_json = await response.json()
+            else:
+                response_text = await response.text()
+            return response.status, response_json, response_text
+
+    async def close(self) -> None:
+        # Close the pooled connections.
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
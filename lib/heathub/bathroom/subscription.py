@@ -0,0 +1,159 @@
+import asyncio
+import json
+import time
+import uuid
+from botocore.auth import SigV4QueryAuth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import quote, urlparse
+
+from lib.heathub.bathroom.mqtt import DEFAULT_KEEPALIVE, MqttWebSocketClient, MqttError
+from lib.heathub.utils import LogManager, DEVICE_SALUS_BUTTON_BATHROOM, LOG_TYPE_ERROR
+
+# Reconnect backoff after the broker drops the connection
+RECONNECT_DELAY_MIN = 1
+RECONNECT_DELAY_MAX = 60
+# Presigned URLs only need to be valid for the handshake
+PRESIGN_EXPIRES = 300
+
+log_manager = LogManager()
+
+
+def presign_iot_url(endpoint: str, region: str, credentials: Dict[str, Any]) -> str:
+    # Build a SigV4 presigned wss:// URL for AWS IoT MQTT over WebSocket.
+    # AWS IoT expects the session token after the signature, not signed.
+    host = urlparse(endpoint).netloc or endpoint
+    request = AWSRequest(method="GET", url=f"wss://{host}/mqtt")
+    SigV4QueryAuth(
+        Credentials(credentials["AccessKeyId"], credentials["SecretKey"]),
+        "iotdevicegateway",
+        region,
+        expires=PRESIGN_EXPIRES,
+    ).add_auth(request)
+    return f"{request.url}&X-Amz-Security-Token={quote(credentials['SessionToken'], safe='')}"
+
+
+class ShadowSubscription:
+    """Keeps an in-memory copy of a thing's shadow from MQTT update events.
+
+    Subscribes to the shadow's update/documents topic over a persistent MQTT
+    over WebSocket connection and calls on_update with every new document.
+    The connection is re-established with backoff when it drops. The copy is
+    only kept while connected: updates sent during an outage are lost, so it
+    is dropped with the connection and, once subscribed again, re-seeded
+    from get_document. A broker that stops answering the keepalive pings
+    counts as disconnected.
+    """
+
+    def __init__(
+        self,
+        thing_name: str,
+        get_url: Callable[[], Awaitable[str]],
+        on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+        get_document: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None,
+        device: str = DEVICE_SALUS_BUTTON_BATHROOM,
+        keepalive: int = DEFAULT_KEEPALIVE,
+    ):
+        self.thing_name = thing_name
+        self.get_url = get_url
+        self.on_update = on_update
+        self.get_document = get_document
+        # Log device, scoped to the site the button belongs to
+        self.device = device
+        self.keepalive = keepalive
+        self.topic = f"$aws/things/{thing_name}/shadow/update/documents"
+        self.document: Optional[Dict[str, Any]] = None
+        self.connected = False
+        self.updated_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[MqttWebSocketClient] = None
+
+    def is_live(self) -> bool:
+        # True while subscribed, answered by the broker and holding a shadow document.
+        return (
+            self.connected
+            and self.document is not None
+            and self._client is not None
+            and self._client.is_alive()
+        )
+
+    def set_document(self, document: Dict[str, Any]) -> None:
+        # Replace the in-memory shadow, e.g. with a polled seed or a pushed update.
+        self.document = document
+        self.updated_at = time.time()
+        if self.on_update is not None:
+            self.on_update(document)
+
+    def start(self) -> None:
+        # Run the subscription in the background.
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Cancel the background subscription.
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.connected = False
+        self.document = None
+
+    async def _seed(self) -> None:
+        # Read the current shadow, it holds whatever changed while disconnected.
+        if self.get_document is None:
+            return
+        try:
+            document = await self.get_document()
+        except Exception as e:
+            log_manager.set_log(
+                f"Shadow seed failed: {e}",
+                device=self.device,
+                log_type=LOG_TYPE_ERROR,
+            )
+            return
+        if document is not None:
+            self.set_document(document)
+
+    async def _run(self) -> None:
+        delay = RECONNECT_DELAY_MIN
+        while True:
+            client = None
+            try:
+                client = MqttWebSocketClient(
+                    await self.get_url(), f"heathub-{uuid.uuid4().hex[:12]}", self.keepalive
+                )
+                self._client = client
+                await client.connect()
+                await client.subscribe(self.topic)
+                # Anything set before SUBACK may have missed updates
+                self.document = None
+                self.connected = True
+                delay = RECONNECT_DELAY_MIN
+                await self._seed()
+                async for topic, payload in client.messages():
+                    if topic == self.topic:
+                        # The documents topic carries the full shadow after the update
+                        self.set_document(json.loads(payload)["current"])
+            except asyncio.CancelledError:
+                raise
+            except (ConnectionError, MqttError, ValueError, KeyError, OSError) as e:
+                log_manager.set_log(
+                    f"Shadow subscription dropped: {e}",
+                    device=self.device,
+                    log_type=LOG_TYPE_ERROR,
+                )
+            except Exception as e:
+                log_manager.set_log(
+                    f"Exception in shadow subscription: {e}",
+                    device=self.device,
+                    log_type=LOG_TYPE_ERROR,
+                )
+            finally:
+                self.connected = False
+                self.document = None
+                self._client = None
+                if client is not None:
+                    await client.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
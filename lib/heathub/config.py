@@ -0,0 +1,337 @@
+import asyncio
+import os
+import re
+import threading
+import yaml
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from lib.heathub.acquisition import DEFAULT_SOURCE_DEADLINES
+from lib.heathub.utils import CONFIG_PATH, LogManager, DEVICE_APP, LOG_TYPE_ERROR
+
+# How often a running controller looks for a changed config file
+RELOAD_CHECK_INTERVAL = 10
+# Site built from the top-level salus and wave sections when no sites are listed
+DEFAULT_SITE = "default"
+# Site names end up in flag keys, log devices and series file names
+SITE_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+log_manager = LogManager()
+
+
+class ConfigError(ValueError):
+    """The config file cannot be parsed or holds an invalid value."""
+
+
+def _section(data: Dict[str, Any], name: str) -> Dict[str, Any]:
+    section = data.get(name) or {}
+    if not isinstance(section, dict):
+        raise ConfigError(f"{name}: expected a mapping, got {type(section).__name__}")
+    return section
+
+
+def _value(section: Dict[str, Any], path: str, name: str, kind: type, default: Any) -> Any:
+    # Read one setting and check or convert its type.
+    value = section.get(name)
+    if value is None:
+        return default
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+    elif kind is str:
+        if isinstance(value, (str, int)) and not isinstance(value, bool):
+            return str(value)
+    elif kind in (int, float):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return kind(value)
+        if isinstance(value, str):
+            try:
+                return kind(value)
+            except ValueError:
+                pass
+    raise ConfigError(f"{path}.{name}: expected {kind.__name__}, got {value!r}")
+
+
+def _positive(section: Dict[str, Any], path: str, name: str, kind: type, default: Any) -> Any:
+    # Read a setting that must be greater than zero.
+    value = _value(section, path, name, kind, default)
+    if value <= 0:
+        raise ConfigError(f"{path}.{name}: expected a value greater than 0, got {value!r}")
+    return value
+
+
+class AppConfig(NamedTuple):
+    enabled: bool = True
+    cycle_interval: float = 90.0
+    enabled_device_button_bathroom: bool = False
+    max_concurrent_sites: int = 4
+    source_deadlines: Dict[str, float] = {}
+    retry_attempts: int = 3
+    breaker_threshold: int = 3
+    breaker_reset_timeout: float = 60.0
+    # Last known gateway and button states stand in for a failed read this long
+    fallback_max_age: float = 300.0
+    # Gas usage pages a sync requests in one batch
+    gas_usage_sync_window: int = 4
+
+    @classmethod
+    def from_dict(cls, section: Dict[str, Any]) -> "AppConfig":
+        deadlines = section.get("source_deadlines") or {}
+        if not isinstance(deadlines, dict):
+            raise ConfigError("app.source_deadlines: expected a mapping")
+        unknown = sorted(str(name) for name in deadlines if name not in DEFAULT_SOURCE_DEADLINES)
+        if unknown:
+            raise ConfigError(
+                f"app.source_deadlines: unknown sources {', '.join(unknown)}, "
+                f"expected {', '.join(DEFAULT_SOURCE_DEADLINES)}"
+            )
+        return cls(
+            enabled=_value(section, "app", "enabled", bool, True),
+            cycle_interval=_positive(section, "app", "cycle_interval", float, 90.0),
+            enabled_device_button_bathroom=_value(
+                section, "app", "enabled_device_button_bathroom", bool, False
+            ),
+            max_concurrent_sites=max(1, _value(section, "app", "max_concurrent_sites", int, 4)),
+            source_deadlines={
+                name: _positive(
+                    deadlines, "app.source_deadlines", name, float, DEFAULT_SOURCE_DEADLINES[name]
+                )
+                for name in deadlines
+            },
+            retry_attempts=max(1, _value(section, "app", "retry_attempts", int, 3)),
+            breaker_threshold=max(1, _value(section, "app", "breaker_threshold", int, 3)),
+            breaker_reset_timeout=_positive(section, "app", "breaker_reset_timeout", float, 60.0),
+            fallback_max_age=_positive(section, "app", "fallback_max_age", float, 300.0),
+            gas_usage_sync_window=max(1, _value(section, "app", "gas_usage_sync_window", int, 4)),
+        )
+
+
+class SalusConfig(NamedTuple):
+    gateway_host: Optional[str] = None
+    gateway_port: int = 80
+    gateway_euid: Optional[str] = None
+    gateway_watch: bool = False
+    gateway_watch_min_interval: float = 5.0
+    gateway_watch_max_interval: float = 30.0
+    account_client_id: Optional[str] = None
+    account_device_button_bathroom_id: Optional[str] = None
+    account_identity_id: Optional[str] = None
+    account_iot_endpoint: Optional[str] = None
+    account_iot_mqtt_url: Optional[str] = None
+    account_iot_subscribe: bool = False
+    account_password: Optional[str] = None
+    account_region: Optional[str] = None
+    account_user_pool_id: Optional[str] = None
+    account_username: Optional[str] = None
+    device_button_bathroom_boiler_working_time: float = 0.0
+
+    @classmethod
+    def from_dict(cls, section: Dict[str, Any], path: str = "salus") -> "SalusConfig":
+        kinds = {name: type(default) if default is not None else str
+                 for name, default in cls._field_defaults.items()}
+        return cls(**{
+            name: _value(section, path, name, kind, cls._field_defaults[name])
+            for name, kind in kinds.items()
+        })
+
+    def gateway_settings(self) -> Tuple[Any, ...]:
+        # Settings the gateway connection is built from.
+        return self.gateway_host, self.gateway_port, self.gateway_euid
+
+    def button_settings(self) -> Tuple[Any, ...]:
+        # Settings the smart button clients are built from.
+        return tuple(
+            getattr(self, name) for name in self._fields
+            if name.startswith("account_") or name.startswith("device_button_bathroom_")
+        )
+
+
+class WaveConfig(NamedTuple):
+    serial_number: Optional[str] = None
+    access_code: Optional[str] = None
+    password: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, section: Dict[str, Any], path: str = "wave") -> "WaveConfig":
+        return cls(**{
+            name: _value(section, path, name, str, None) for name in cls._fields
+        })
+
+
+class SiteConfig(NamedTuple):
+    """One installation: an IT600 gateway, a Wave thermostat and its button."""
+
+    name: str = DEFAULT_SITE
+    salus: SalusConfig = SalusConfig()
+    wave: WaveConfig = WaveConfig()
+    enabled_device_button_bathroom: bool = False
+
+    @classmethod
+    def from_dict(
+        cls, entry: Dict[str, Any], index: int, salus: Dict[str, Any], app: AppConfig
+    ) -> "SiteConfig":
+        # Site salus settings extend the top-level ones, e.g. a shared account.
+        name = entry.get("name")
+        if not isinstance(name, str) or not SITE_NAME.match(name):
+            raise ConfigError(f"sites[{index}].name: expected letters, digits, - or _, got {name!r}")
+        path = f"sites.{name}"
+        return cls(
+            name=name,
+            salus=SalusConfig.from_dict({**salus, **_section(entry, "salus")}, f"{path}.salus"),
+            wave=WaveConfig.from_dict(_section(entry, "wave"), f"{path}.wave"),
+            enabled_device_button_bathroom=_value(
+                entry, path, "enabled_device_button_bathroom", bool,
+                app.enabled_device_button_bathroom,
+            ),
+        )
+
+    def scoped(self, name: str) -> str:
+        # Flag key, log device or series name of this site; unchanged for the default site.
+        return name if self.name == DEFAULT_SITE else f"{self.name}.{name}"
+
+    def missing(self) -> List[str]:
+        # Settings a control cycle of this site cannot run without.
+        path = "" if self.name == DEFAULT_SITE else f"sites.{self.name}."
+        required = [
+            ("salus.gateway_host", self.salus.gateway_host),
+            ("salus.gateway_euid", self.salus.gateway_euid),
+            ("wave.serial_number", self.wave.serial_number),
+            ("wave.access_code", self.wave.access_code),
+            ("wave.password", self.wave.password),
+        ]
+        return [path + name for name, value in required if not value]
+
+
+class Config(NamedTuple):
+    """Validated, immutable snapshot of etc/config.yaml.
+
+    Without a sites list the top-level salus and wave sections describe a
+    single site named "default".
+    """
+
+    app: AppConfig = AppConfig()
+    salus: SalusConfig = SalusConfig()
+    wave: WaveConfig = WaveConfig()
+    sites: Tuple[SiteConfig, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Config":
+        app = AppConfig.from_dict(_section(data, "app"))
+        salus = _section(data, "salus")
+        entries = data.get("sites") or []
+        if not isinstance(entries, list):
+            raise ConfigError("sites: expected a list")
+        sites = tuple(
+            SiteConfig.from_dict(_section({f"sites[{index}]": entry}, f"sites[{index}]"), index, salus, app)
+            for index, entry in enumerate(entries)
+        )
+        names = [site.name for site in sites]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ConfigError(f"sites: duplicate names {', '.join(duplicates)}")
+        return cls(
+            app=app,
+            salus=SalusConfig.from_dict(salus),
+            wave=WaveConfig.from_dict(_section(data, "wave")),
+            sites=sites,
+        )
+
+    def get_sites(self) -> Tuple[SiteConfig, ...]:
+        # Configured sites, or the default site built from salus and wave.
+        if self.sites:
+            return self.sites
+        return (SiteConfig(DEFAULT_SITE, self.salus, self.wave, self.app.enabled_device_button_bathroom),)
+
+    def missing(self) -> List[str]:
+        # Settings a control cycle cannot run without.
+        return [name for site in self.get_sites() for name in site.missing()]
+
+
+def load_config(path: str) -> Config:
+    # Parse and validate a config file; a missing file gives the defaults.
+    try:
+        with open(path, "r") as stream:
+            data = yaml.safe_load(stream) or {}
+    except FileNotFoundError:
+        return Config()
+    except yaml.YAMLError as e:
+        raise ConfigError(f"{path}: {e}") from e
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path}: expected a mapping at the top level")
+    return Config.from_dict(data)
+
+
+class ConfigStore:
+    """Process-wide config snapshot, parsed once and swapped on change.
+
+    get() only returns the current snapshot, it never touches the file.
+    reload_if_changed() compares the file's stat signature with the one of
+    the loaded snapshot and parses the file only when it differs; an
+    invalid file keeps the previous snapshot in place.
+    """
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self._signature = self._stat_signature()
+        self._config = load_config(path)
+        self._listeners: List[Callable[[Config, Config], None]] = []
+
+    def _stat_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def get(self) -> Config:
+        return self._config
+
+    def replace(self, config: Config) -> None:
+        # Install a snapshot and notify listeners of the change.
+        with self.lock:
+            previous, self._config = self._config, config
+        if config != previous:
+            for listener in self._listeners:
+                listener(previous, config)
+
+    def on_change(self, listener: Callable[[Config, Config], None]) -> None:
+        # Call listener(previous, current) after every reload that changed values.
+        self._listeners.append(listener)
+
+    def reload_if_changed(self) -> bool:
+        # Re-parse the file if it changed on disk, True when a new snapshot was installed.
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            config = load_config(self.path)
+        except ConfigError as e:
+            log_manager.set_log(
+                f"Config reload failed, keeping the previous config: {e}",
+                device=DEVICE_APP,
+                log_type=LOG_TYPE_ERROR,
+            )
+            return False
+        self.replace(config)
+        log_manager.set_log("Config reloaded", device=DEVICE_APP)
+        return True
+
+    async def watch(self, interval: float = RELOAD_CHECK_INTERVAL) -> None:
+        # Check for changes until cancelled; one stat() per interval.
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_if_changed()
+
+
+_stores: Dict[str, ConfigStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_config_store(path: str = CONFIG_PATH) -> ConfigStore:
+    # Return the process-wide store for a config file.
+    path = os.path.abspath(path)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ConfigStore(path)
+        return _stores[path]
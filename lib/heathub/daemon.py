@@ -0,0 +1,134 @@
+import asyncio
+import os
+import signal
+from typing import Awaitable, Callable, Optional
+import sdnotify
+
+from lib.heathub.metrics import get_metrics
+from lib.heathub.utils import LogManager, DEVICE_APP, LOG_TYPE_ERROR, METRICS_PATH
+
+# Default interval between two control cycles, matches salus.cron.timer
+DEFAULT_CYCLE_INTERVAL = 90
+# Used when systemd does not pass WATCHDOG_USEC, half of WatchdogSec=60
+DEFAULT_WATCHDOG_INTERVAL = 30
+# Time given to a running cycle to finish after SIGTERM, below TimeoutStopSec
+SHUTDOWN_GRACE_PERIOD = 8
+# Bursts of triggers within this window run a single cycle
+TRIGGER_DEBOUNCE = 1
+
+log_manager = LogManager()
+metrics = get_metrics(METRICS_PATH)
+
+
+class Daemon:
+    """Runs the control cycle on an internal asyncio scheduler.
+
+    Readiness, status and watchdog pings are reported to systemd through
+    sdnotify. SIGTERM and SIGINT stop the scheduler after the running cycle.
+    trigger() runs the next cycle right away, e.g. on a pushed device event.
+    """
+
+    def __init__(
+        self,
+        cycle: Callable[[], Awaitable[None]],
+        interval: float = DEFAULT_CYCLE_INTERVAL,
+        on_shutdown: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.cycle = cycle
+        self.interval = interval
+        self.on_shutdown = on_shutdown
+        self.notifier = sdnotify.SystemdNotifier()
+        self._stop_event: Optional[asyncio.Event] = None
+        self._wake_event: Optional[asyncio.Event] = None
+
+    @staticmethod
+    def get_watchdog_interval() -> float:
+        # Ping twice per systemd watchdog period.
+        watchdog_usec = os.environ.get("WATCHDOG_USEC")
+        if watchdog_usec:
+            return int(watchdog_usec) / 1_000_000 / 2
+        return DEFAULT_WATCHDOG_INTERVAL
+
+    def stop(self) -> None:
+        # Request a clean shutdown.
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def trigger(self) -> None:
+        # Run the next cycle now instead of waiting for the interval.
+        if self._wake_event is not None:
+            self._wake_event.set()
+
+    async def _sleep(self, delay: float) -> None:
+        # Wait for the next cycle, a trigger or a stop request.
+        wake_task = asyncio.create_task(self._wake_event.wait())
+        stop_task = asyncio.create_task(self._stop_event.wait())
+        await asyncio.wait(
+            {wake_task, stop_task}, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+        )
+        wake_task.cancel()
+        stop_task.cancel()
+        if self._wake_event.is_set() and not self._stop_event.is_set():
+            await asyncio.sleep(TRIGGER_DEBOUNCE)
+
+    async def _watchdog(self) -> None:
+        # Keep systemd's watchdog fed while the event loop is responsive.
+        interval = self.get_watchdog_interval()
+        while True:
+            self.notifier.notify("WATCHDOG=1")
+            await asyncio.sleep(interval)
+
+    async def _run_cycle(self) -> None:
+        # Run one cycle; a failing cycle must never stop the daemon.
+        try:
+            await self.cycle()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.inc("heathub_errors_total", kind="cycle")
+            log_manager.set_log(
+                f"Cycle failed: {e}",
+                device=DEVICE_APP,
+                log_type=LOG_TYPE_ERROR,
+            )
+
+    async def run(self) -> None:
+        # Schedule cycles until a stop signal arrives.
+        loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._wake_event = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        watchdog_task = asyncio.create_task(self._watchdog())
+        self.notifier.notify("READY=1")
+        log_manager.set_log("Daemon started", device=DEVICE_APP)
+
+        try:
+            while not self._stop_event.is_set():
+                started = loop.time()
+                self._wake_event.clear()
+                self.notifier.notify("STATUS=Running cycle")
+                cycle_task = asyncio.create_task(self._run_cycle())
+                stop_task = asyncio.create_task(self._stop_event.wait())
+                await asyncio.wait(
+                    {cycle_task, stop_task}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not cycle_task.done():
+                    # Stop requested mid-cycle, give it a short grace period
+                    await asyncio.wait({cycle_task}, timeout=SHUTDOWN_GRACE_PERIOD)
+                    cycle_task.cancel()
+                    await asyncio.gather(cycle_task, return_exceptions=True)
+                stop_task.cancel()
+
+                self.notifier.notify("STATUS=Idle")
+                delay = max(0.0, self.interval - (loop.time() - started))
+                await self._sleep(delay)
+        finally:
+            self.notifier.notify("STOPPING=1")
+            watchdog_task.cancel()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(sig)
+            if self.on_shutdown is not None:
+                await self.on_shutdown()
+            log_manager.set_log("Daemon stopped", device=DEVICE_APP)
@@ -0,0 +1,94 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class FlagStore:
+    """Flag namespace kept in one JSON file, shared between processes.
+
+    A write merges a whole dict of flags and replaces the file atomically
+    (temp file + rename) under an exclusive flock, bumping a version number.
+    Readers keep an in-memory snapshot and reload it only when the file's
+    stat signature changes, so repeated reads cost one stat() call.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.lock = threading.Lock()
+        self._flags: Dict[str, Any] = {}
+        self._version = 0
+        self._signature: Optional[Tuple[int, int, int]] = None
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Serialize writers within this process and across processes.
+        with self.lock:
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stat_signature(self) -> Optional[Tuple[int, int, int]]:
+        # Identify the file content; rename gives every write a new inode.
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _reload(self) -> None:
+        # Refresh the snapshot if another writer replaced the file.
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return
+        flags: Dict[str, Any] = {}
+        version = 0
+        if signature is not None:
+            try:
+                with open(self.path, "r") as stream:
+                    data = json.load(stream)
+                flags = data.get("flags", {})
+                version = data.get("version", 0)
+            except (FileNotFoundError, ValueError):
+                pass
+        self._flags, self._version, self._signature = flags, version, signature
+
+    def get_all(self) -> Dict[str, Any]:
+        # Return a copy of the current flags.
+        with self.lock:
+            self._reload()
+            return dict(self._flags)
+
+    def get(self, key: str) -> Optional[Any]:
+        # Return one flag value.
+        with self.lock:
+            self._reload()
+            return self._flags.get(key)
+
+    @property
+    def version(self) -> int:
+        with self.lock:
+            self._reload()
+            return self._version
+
+    def update(self, new_flags: Dict[str, Any]) -> None:
+        # Merge a dict of flags and commit it in one atomic write.
+        with self._locked():
+            self._reload()
+            flags = dict(self._flags)
+            flags.update(new_flags)
+            version = self._version + 1
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as stream:
+                json.dump({"version": version, "flags": flags}, stream)
+                stream.flush()
+                os.fsync(stream.fileno())
+            os.replace(tmp_path, self.path)
+            self._flags, self._version = flags, version
+            self._signature = self._stat_signature()
@@ -0,0 +1,193 @@
+import datetime
+import os
+import re
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from lib.wave.GasUsage import (
+    ENTRIES_PER_PAGE,
+    GasUsageDay,
+    gas_usage_pages,
+    read_gas_usage_pages,
+    read_gas_usage_pointer,
+)
+
+HEADER = struct.Struct("<4sIId")  # magic, pointer, next page, synced at
+RECORD = struct.Struct("<Ifff")  # day ordinal (0 = empty), central heating, hot water, outdoor
+MAGIC = b"HGU1"
+# Gas usage pages requested in one batch by a sync
+DEFAULT_SYNC_WINDOW = 4
+
+
+class SyncState(NamedTuple):
+    # Thermostat pointer at the last sync, 0 before the first one
+    pointer: int
+    # Page the next sync starts from: the last page read, which the
+    # thermostat keeps filling, or the first page that failed
+    page: int
+    synced_at: float
+
+
+class SyncResult(NamedTuple):
+    pointer: int
+    pages: List[int]
+    failed: List[int]
+    # Requests sent, the pointer read included
+    requests: int
+
+
+class GasUsageStore:
+    """Local copy of a thermostat's daily gas usage recordings.
+
+    One file per thermostat: a header with the sync state followed by one
+    fixed-width record per recording slot, at the slot's index, so a page
+    read from the thermostat is written in place. Records are written
+    before the header, a sync interrupted halfway is repeated from the
+    previous state. A file left empty by an interrupted creation is
+    initialised, one whose records stop short of the pages its state
+    covers is reset so the next sync reads the history again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "xb") as stream:
+                stream.write(HEADER.pack(MAGIC, 0, 0, 0.0))
+        except FileExistsError:
+            pass
+        self._file = open(path, "r+b")
+        header = self._file.read(HEADER.size)
+        if not header:
+            self.reset()
+        elif len(header) < HEADER.size or HEADER.unpack(header)[0] != MAGIC:
+            self._file.close()
+            raise ValueError(f"Not a gas usage file: {path}")
+        elif self._records_missing():
+            self.reset()
+
+    def _records_missing(self) -> bool:
+        # True when pages before the state's page are not all in the file.
+        page = self.state().page
+        size = os.fstat(self._file.fileno()).st_size
+        return size < HEADER.size + max(page - 1, 0) * ENTRIES_PER_PAGE * RECORD.size
+
+    def state(self) -> SyncState:
+        with self.lock:
+            self._file.seek(0)
+            _, pointer, page, synced_at = HEADER.unpack(self._file.read(HEADER.size))
+        return SyncState(pointer, page, synced_at)
+
+    def write_page(self, page: int, entries: List[GasUsageDay]) -> None:
+        data = b"".join(
+            RECORD.pack(
+                entry.day.toordinal() if entry.day else 0,
+                entry.central_heating,
+                entry.hot_water,
+                entry.outdoor_temp,
+            )
+            for entry in entries
+        )
+        with self.lock:
+            self._file.seek(HEADER.size + (page - 1) * ENTRIES_PER_PAGE * RECORD.size)
+            self._file.write(data)
+
+    def commit(self, state: SyncState) -> None:
+        # Persist the pages written so far, then the state that covers them.
+        with self.lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, *state))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def reset(self) -> None:
+        # Drop every record, e.g. after the thermostat's recordings restarted.
+        with self.lock:
+            self._file.truncate(HEADER.size)
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, 0, 0, 0.0))
+            self._file.flush()
+
+    def days(
+        self,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+    ) -> Iterator[GasUsageDay]:
+        # Recorded days with start <= day < end, in recording order.
+        with self.lock:
+            self._file.seek(HEADER.size)
+            data = self._file.read()
+        for offset in range(0, len(data) - len(data) % RECORD.size, RECORD.size):
+            ordinal, central_heating, hot_water, outdoor_temp = RECORD.unpack_from(data, offset)
+            if not ordinal:
+                continue
+            day = datetime.date.fromordinal(ordinal)
+            if (start is None or day >= start) and (end is None or day < end):
+                yield GasUsageDay(day, central_heating, hot_water, outdoor_temp)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class GasUsageStores:
+    """Gas usage stores of every thermostat, one file per device name."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._stores: Dict[str, GasUsageStore] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, device: str) -> GasUsageStore:
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", device)
+        with self.lock:
+            if name not in self._stores:
+                self._stores[name] = GasUsageStore(os.path.join(self.directory, f"{name}.bin"))
+            return self._stores[name]
+
+    def close(self) -> None:
+        with self.lock:
+            for store in self._stores.values():
+                store.close()
+            self._stores = {}
+
+
+async def sync_gas_usage(
+    reader,
+    store: GasUsageStore,
+    window: int = DEFAULT_SYNC_WINDOW,
+    now: Optional[float] = None,
+) -> SyncResult:
+    """Bring the local gas usage recordings up to date with the thermostat.
+
+    Reads the pointer, then every page from the one the last sync stopped
+    at to the one the thermostat is writing, window pages per batch. A
+    daily sync after the initial backfill reads the pointer and one or two
+    pages. A pointer that went backwards means the recordings restarted and
+    the history is read again from page 1.
+    """
+    pointer = await read_gas_usage_pointer(reader)
+    if pointer is None:
+        raise ConnectionError("Gas usage pointer could not be read")
+    state = store.state()
+    if pointer < state.pointer:
+        store.reset()
+        state = store.state()
+    first = state.page if state.pointer and state.page else 1
+    pages = list(range(first, gas_usage_pages(pointer) + 1))
+
+    results = await read_gas_usage_pages(reader, pages, window)
+    failed = [page for page in pages if results[page] is None]
+    for page in pages:
+        if results[page] is not None:
+            store.write_page(page, results[page])
+    store.commit(SyncState(
+        pointer,
+        failed[0] if failed else pages[-1],
+        time.time() if now is None else now,
+    ))
+    return SyncResult(pointer, pages, failed, len(pages) + 1)
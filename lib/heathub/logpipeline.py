@@ -0,0 +1,145 @@
+import atexit
+import datetime
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler
+from typing import Any, Dict, List, Optional
+
+from lib.heathub.logstore import SegmentedLogStore
+
+# Buffered records are written once either threshold is reached
+FLUSH_BATCH_SIZE = 100
+FLUSH_INTERVAL_SECONDS = 5.0
+# Upper bound for flush() and the exit flush, keeps shutdown bounded
+FLUSH_TIMEOUT_SECONDS = 10.0
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_STOP = object()
+
+
+class BufferedLogWriter(threading.Thread):
+    """Background thread moving queued log records into the log store.
+
+    Records are buffered and written with a single append per batch: when
+    FLUSH_BATCH_SIZE records are waiting, FLUSH_INTERVAL_SECONDS after the
+    first one, on an explicit flush() and when the process exits.
+    """
+
+    def __init__(self, store: SegmentedLogStore, record_queue: queue.Queue):
+        super().__init__(name="heathub-log-writer", daemon=True)
+        self.store = store
+        self.queue = record_queue
+        self._buffer: List[str] = []
+        self._first_buffered: Optional[float] = None
+
+    @staticmethod
+    def to_entry(record: logging.LogRecord) -> Dict[str, Any]:
+        # Convert a log record into the stored entry format.
+        return {
+            "date": datetime.datetime.fromtimestamp(record.created).strftime(DATE_FORMAT),
+            "device": getattr(record, "device", ""),
+            "type": getattr(record, "log_type", "info"),
+            "message": record.getMessage(),
+        }
+
+    def _write(self) -> None:
+        if not self._buffer:
+            return
+        try:
+            self.store.append_lines(self._buffer)
+        except Exception as e:
+            # Reported through the root logger, never back into the failing store
+            logging.getLogger(__name__).error(
+                "Failed to save %d log entries: %s", len(self._buffer), e
+            )
+        self._buffer = []
+        self._first_buffered = None
+
+    def run(self) -> None:
+        while True:
+            timeout = None
+            if self._first_buffered is not None:
+                timeout = max(
+                    0.0, self._first_buffered + FLUSH_INTERVAL_SECONDS - time.monotonic()
+                )
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write()
+                continue
+
+            if item is _STOP:
+                self._write()
+                return
+            if isinstance(item, threading.Event):
+                # flush() marker, everything queued before it is buffered now
+                self._write()
+                item.set()
+                continue
+
+            self._buffer.append(json.dumps(self.to_entry(item), ensure_ascii=False) + "\n")
+            if self._first_buffered is None:
+                self._first_buffered = time.monotonic()
+            if len(self._buffer) >= FLUSH_BATCH_SIZE:
+                self._write()
+
+
+class LogPipeline:
+    """A logging.Logger whose records reach the store through a queue.
+
+    Emitting a record only puts it on an in-memory queue; disk writes happen
+    on the BufferedLogWriter thread.
+    """
+
+    def __init__(self, store: SegmentedLogStore):
+        self.store = store
+        self.queue: queue.Queue = queue.Queue()
+        self.logger = logging.getLogger(f"heathub.store.{id(store)}")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.logger.addHandler(QueueHandler(self.queue))
+        self.lock = threading.Lock()
+        self._writer: Optional[BufferedLogWriter] = None
+        atexit.register(self.close)
+
+    def _ensure_writer(self) -> None:
+        with self.lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = BufferedLogWriter(self.store, self.queue)
+                self._writer.start()
+
+    def log(self, level: int, message: str, device: str, log_type: str) -> None:
+        # Queue one record, never touches the disk.
+        self._ensure_writer()
+        self.logger.log(level, message, extra={"device": device, "log_type": log_type})
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT_SECONDS) -> None:
+        # Block until every record queued so far has been written.
+        if self._writer is None or not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self) -> None:
+        # Write what is left and stop the writer thread.
+        if self._writer is None or not self._writer.is_alive():
+            return
+        self.queue.put(_STOP)
+        self._writer.join(FLUSH_TIMEOUT_SECONDS)
+
+
+_pipelines: Dict[int, LogPipeline] = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_log_pipeline(store: SegmentedLogStore) -> LogPipeline:
+    # Return the process-wide pipeline feeding a store.
+    with _pipelines_lock:
+        if id(store) not in _pipelines:
+            _pipelines[id(store)] = LogPipeline(store)
+        return _pipelines[id(store)]
@@ -0,0 +1,409 @@
+import datetime
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Segments are sealed once they reach this size or age
+SEGMENT_MAX_BYTES = 256 * 1024
+SEGMENT_MAX_AGE_SECONDS = 24 * 60 * 60
+# Sealed segments are retired oldest first beyond these limits
+RETENTION_MAX_BYTES = 32 * 1024 * 1024
+RETENTION_MAX_AGE_SECONDS = 180 * 24 * 60 * 60
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+INDEX_NAME = "index.json"
+LOCK_NAME = ".lock"
+
+
+class SegmentedLogStore:
+    """Append-only log store made of size-bounded JSON-lines segments.
+
+    Every record is appended as one line to the active segment, so an insert
+    costs the same no matter how much history is kept. When the active
+    segment grows too big or too old it is sealed: its time range, devices and
+    types go to index.json and a new segment is started. Sealed segments are
+    retired whole by age or total size. Readers use the index to skip
+    segments that cannot match a query.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.lock_path = os.path.join(directory, LOCK_NAME)
+        self.lock = threading.Lock()
+        self._index: List[Dict[str, Any]] = []
+        self._index_mtime: Optional[float] = None
+        self._active_seq = 0
+        self._active_started: Optional[float] = None
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Serialize writers within this process and across processes.
+        with self.lock:
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seq:08d}{SEGMENT_SUFFIX}")
+
+    def segment_seqs(self) -> List[int]:
+        # Sequence numbers of every segment on disk, oldest first.
+        return self._list_segments()
+
+    def segment_size(self, seq: int) -> int:
+        # Current size of a segment in bytes, 0 if it does not exist.
+        try:
+            return os.path.getsize(self._segment_path(seq))
+        except FileNotFoundError:
+            return 0
+
+    def _list_segments(self) -> List[int]:
+        # Sequence numbers of every segment on disk, oldest first.
+        seqs = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                seqs.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(seqs)
+
+    def _load_index(self) -> List[Dict[str, Any]]:
+        # Read index.json again only if another writer changed it.
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except FileNotFoundError:
+            self._index, self._index_mtime = [], None
+            return self._index
+        if mtime != self._index_mtime:
+            with open(self.index_path, "r") as stream:
+                self._index = json.load(stream)["segments"]
+            self._index_mtime = mtime
+        return self._index
+
+    def _save_index(self, index: List[Dict[str, Any]]) -> None:
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as stream:
+            json.dump({"segments": index}, stream)
+        os.replace(tmp_path, self.index_path)
+        self._index = index
+        self._index_mtime = os.path.getmtime(self.index_path)
+
+    def _refresh_active(self) -> None:
+        # Find the active segment, which may have been rotated by another process.
+        # Every rotation rewrites index.json, so an unchanged index means the
+        # known active segment is still current.
+        index_mtime = self._index_mtime
+        index = self._load_index()
+        if self._active_seq and self._index_mtime == index_mtime:
+            return
+        sealed = {entry["seq"] for entry in index}
+        seqs = [seq for seq in self._list_segments() if seq not in sealed]
+        seq = seqs[-1] if seqs else max(sealed, default=0) + 1
+        if seq != self._active_seq:
+            self._active_seq = seq
+            self._active_started = self._read_started(self._segment_path(seq))
+
+    @staticmethod
+    def _read_started(path: str) -> Optional[float]:
+        # Timestamp of the first record of a segment, None if it is empty.
+        try:
+            with open(path, "r") as stream:
+                first = json.loads(stream.readline())
+            return datetime.datetime.strptime(first["date"], DATE_FORMAT).timestamp()
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def scan_segment(path: str) -> Dict[str, Any]:
+        # Compute the index entry of a segment from its content.
+        entry: Dict[str, Any] = {
+            "start": None,
+            "end": None,
+            "count": 0,
+            "bytes": os.path.getsize(path),
+            "devices": set(),
+            "types": set(),
+        }
+        with open(path, "r") as stream:
+            for line in stream:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                date = record.get("date")
+                if entry["start"] is None or date < entry["start"]:
+                    entry["start"] = date
+                if entry["end"] is None or date > entry["end"]:
+                    entry["end"] = date
+                entry["count"] += 1
+                entry["devices"].add(record.get("device", ""))
+                entry["types"].add(record.get("type", ""))
+        entry["devices"] = sorted(entry["devices"])
+        entry["types"] = sorted(entry["types"])
+        return entry
+
+    def _seal_active(self) -> None:
+        # Index the active segment and start a new one.
+        path = self._segment_path(self._active_seq)
+        index = list(self._load_index())
+        if os.path.exists(path) and os.path.getsize(path):
+            entry = self.scan_segment(path)
+            entry["seq"] = self._active_seq
+            entry["sealed_at"] = time.time()
+            index.append(entry)
+        index = self._retire(index)
+        self._save_index(index)
+        self._active_seq += 1
+        self._active_started = None
+
+    def _retire(self, index: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Drop the oldest sealed segments beyond the age and size limits.
+        now = time.time()
+        total = sum(entry["bytes"] for entry in index)
+        while index and (
+            total > RETENTION_MAX_BYTES
+            or now - index[0]["sealed_at"] > RETENTION_MAX_AGE_SECONDS
+        ):
+            oldest = index.pop(0)
+            total -= oldest["bytes"]
+            try:
+                os.remove(self._segment_path(oldest["seq"]))
+            except FileNotFoundError:
+                pass
+        return index
+
+    def append(self, record: Dict[str, Any]) -> None:
+        # Append one record to the active segment, rotating it when full.
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        self.append_lines([line])
+
+    def append_lines(self, lines: List[str]) -> None:
+        # Append already serialized records in a single write.
+        data = "".join(lines).encode("utf-8")
+        with self._locked():
+            self._refresh_active()
+            path = self._segment_path(self._active_seq)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            too_old = (
+                self._active_started is not None
+                and time.time() - self._active_started > SEGMENT_MAX_AGE_SECONDS
+            )
+            if size and (size + len(data) > SEGMENT_MAX_BYTES or too_old):
+                self._seal_active()
+                path = self._segment_path(self._active_seq)
+            with open(path, "ab") as stream:
+                stream.write(data)
+            if self._active_started is None:
+                self._active_started = time.time()
+
+    def segments(self, scan_active: bool = True) -> List[Dict[str, Any]]:
+        # Index entries of every segment, oldest first. The active segment is
+        # scanned on the fly, or only listed by seq when scan_active is False.
+        with self.lock:
+            index = list(self._load_index())
+        sealed = {entry["seq"] for entry in index}
+        for seq in self._list_segments():
+            if seq not in sealed:
+                if scan_active:
+                    entry = self.scan_segment(self._segment_path(seq))
+                else:
+                    entry = {"count": None}
+                entry["seq"] = seq
+                index.append(entry)
+        return index
+
+    @staticmethod
+    def _matches_segment(
+        entry: Dict[str, Any],
+        start: Optional[str],
+        end: Optional[str],
+        device: Optional[str],
+        log_type: Optional[str],
+    ) -> bool:
+        if entry["count"] is None:
+            # Unscanned active segment, it may hold anything
+            return True
+        if not entry["count"]:
+            return False
+        if start is not None and entry["end"] < start:
+            return False
+        if end is not None and entry["start"] > end:
+            return False
+        if device is not None and device not in entry["devices"]:
+            return False
+        if log_type is not None and log_type not in entry["types"]:
+            return False
+        return True
+
+    @staticmethod
+    def matches_record(
+        record: Dict[str, Any],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        device: Optional[str] = None,
+        log_type: Optional[str] = None,
+    ) -> bool:
+        # True when a record passes the filters of query() and page().
+        date = record.get("date", "")
+        if start is not None and date < start:
+            return False
+        if end is not None and date > end:
+            return False
+        if device is not None and record.get("device") != device:
+            return False
+        if log_type is not None and record.get("type") != log_type:
+            return False
+        return True
+
+    def read_segment(self, seq: int) -> Iterator[Dict[str, Any]]:
+        # Yield the records of one segment in insertion order.
+        try:
+            with open(self._segment_path(seq), "r") as stream:
+                for line in stream:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # A partially written last line is skipped
+                        continue
+        except FileNotFoundError:
+            return
+
+    def query(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        device: Optional[str] = None,
+        log_type: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        # Yield matching records oldest first, skipping segments via the index.
+        for entry in self.segments():
+            if not self._matches_segment(entry, start, end, device, log_type):
+                continue
+            for record in self.read_segment(entry["seq"]):
+                if self.matches_record(record, start, end, device, log_type):
+                    yield record
+
+    def read_forward(self, seq: int, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        # Read the complete lines appended to a segment after offset and
+        # return them with the offset to continue from.
+        try:
+            with open(self._segment_path(seq), "rb") as stream:
+                stream.seek(offset)
+                data = stream.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b"\n") + 1
+        records = []
+        for line in data[:end].split(b"\n"):
+            record = self._parse_line(line)
+            if record is not None:
+                records.append(record)
+        return records, offset + end
+
+    def read_segment_reverse(
+        self, seq: int, before: Optional[int] = None, block_size: int = 8192
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        # Yield (line offset, record) newest first, reading the file backwards
+        # in blocks from byte offset before (end of file by default).
+        try:
+            stream = open(self._segment_path(seq), "rb")
+        except FileNotFoundError:
+            return
+        with stream:
+            position = stream.seek(0, os.SEEK_END) if before is None else before
+            carry = b""
+            while position > 0:
+                size = min(block_size, position)
+                position -= size
+                stream.seek(position)
+                parts = (stream.read(size) + carry).split(b"\n")
+                carry = parts[0]
+                offset = position + len(carry) + 1
+                lines = []
+                for part in parts[1:]:
+                    lines.append((offset, part))
+                    offset += len(part) + 1
+                for line_offset, line in reversed(lines):
+                    record = self._parse_line(line)
+                    if record is not None:
+                        yield line_offset, record
+            record = self._parse_line(carry)
+            if record is not None:
+                yield 0, record
+
+    @staticmethod
+    def _parse_line(line: bytes) -> Optional[Dict[str, Any]]:
+        if not line.strip():
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            # A partially written last line is skipped
+            return None
+
+    def page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        device: Optional[str] = None,
+        log_type: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # Return up to limit matching records newest first and the cursor of
+        # the next (older) page, "<seq>:<offset>" of the last returned line.
+        # Segments are time ordered, so the walk stops at the first segment
+        # older than start and reads about as much as it returns.
+        before_seq, before_offset = None, None
+        if cursor:
+            seq_text, offset_text = cursor.split(":", 1)
+            before_seq, before_offset = int(seq_text), int(offset_text)
+
+        records: List[Dict[str, Any]] = []
+        last_position = None
+        for entry in reversed(self.segments(scan_active=False)):
+            seq = entry["seq"]
+            if before_seq is not None and seq > before_seq:
+                continue
+            if entry["count"] and start is not None and entry["end"] < start:
+                break
+            if not self._matches_segment(entry, start, end, device, log_type):
+                continue
+            before = before_offset if seq == before_seq else None
+            for offset, record in self.read_segment_reverse(seq, before):
+                if start is not None and record.get("date", "") < start:
+                    break
+                if not self.matches_record(record, start, end, device, log_type):
+                    continue
+                if len(records) == limit:
+                    # One more match exists, the next page starts before the
+                    # last returned record
+                    return records, "%d:%d" % last_position
+                records.append(record)
+                last_position = (seq, offset)
+        return records, None
+
+    def all(self) -> List[Dict[str, Any]]:
+        # Return every retained record, oldest first.
+        return list(self.query())
+
+
+_stores: Dict[str, SegmentedLogStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_log_store(directory: str) -> SegmentedLogStore:
+    # Return the process-wide store for a directory.
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = SegmentedLogStore(directory)
+        return _stores[directory]
@@ -0,0 +1,117 @@
+import json
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from lib.heathub.logstore import SegmentedLogStore
+
+# How often the tailer looks for new log lines and flag changes
+POLL_INTERVAL_SECONDS = 1.0
+# Events kept per subscriber; a stalled client loses the oldest ones
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+Event = Tuple[str, Any]
+
+
+class LogTailer:
+    """Follows the log store and flag store for any number of subscribers.
+
+    A single background thread reads only the bytes appended since its last
+    position and fans new log entries ("log" events) and changed flags
+    ("flags" events) out to every subscriber queue, so open dashboards do
+    not multiply disk reads. The thread runs only while someone listens.
+    """
+
+    def __init__(
+        self,
+        store: SegmentedLogStore,
+        get_flags: Callable[[], Dict[str, Any]],
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+    ):
+        self.store = store
+        self.get_flags = get_flags
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._seq: Optional[int] = None
+        self._offset = 0
+        self._flags: Optional[Dict[str, Any]] = None
+
+    def subscribe(self) -> queue.Queue:
+        # Register a subscriber and start the tailer if needed.
+        subscriber: queue.Queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self._subscribers.append(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="heathub-log-tailer", daemon=True
+                )
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        # Remove a subscriber; the tailer stops after the last one leaves.
+        with self.lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+        self._wake.set()
+
+    def _publish(self, event: Event) -> None:
+        with self.lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(event)
+
+    def _start_position(self) -> None:
+        # Start at the end of the newest segment, only new entries are sent.
+        seqs = self.store.segment_seqs()
+        self._seq = seqs[-1] if seqs else None
+        self._offset = self.store.segment_size(self._seq) if seqs else 0
+
+    def poll(self) -> None:
+        # Publish log entries appended and flags changed since the last poll.
+        seqs = self.store.segment_seqs()
+        if self._seq is None and seqs:
+            self._seq, self._offset = seqs[0], 0
+        while self._seq is not None:
+            records, self._offset = self.store.read_forward(self._seq, self._offset)
+            for record in records:
+                self._publish(("log", record))
+            newer = [seq for seq in seqs if seq > self._seq]
+            if not newer:
+                break
+            # The segment was rotated, continue with the next one
+            self._seq, self._offset = newer[0], 0
+
+        flags = self.get_flags()
+        if flags != self._flags:
+            if self._flags is not None:
+                self._publish(("flags", flags))
+            self._flags = flags
+
+    def _run(self) -> None:
+        self._start_position()
+        self._flags = self.get_flags()
+        while True:
+            with self.lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            self.poll()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    @staticmethod
+    def format_event(event: Event) -> str:
+        # Encode an event in the Server-Sent Events wire format.
+        name, data = event
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
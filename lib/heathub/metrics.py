@@ -0,0 +1,226 @@
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+SPAN_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def series_key(name: str, labels: Dict[str, Any]) -> SeriesKey:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    """Cumulative-on-render histogram: per-bucket counts, sum and count."""
+
+    def __init__(self, buckets: Tuple[float, ...] = SPAN_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [first + second for first, second in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"buckets": list(self.buckets), "counts": self.counts, "sum": self.sum, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        histogram = cls(tuple(data["buckets"]))
+        histogram.counts = list(data["counts"])
+        histogram.sum = data["sum"]
+        histogram.count = data["count"]
+        return histogram
+
+
+class Metrics:
+    """In-process counters, gauges and latency spans, persisted between cycles.
+
+    Recording only touches dicts in memory. flush() adds everything recorded
+    since the last flush to the totals in a JSON file (atomic replace under
+    an flock), so short-lived cron runs, the daemon and the Flask app all
+    see the same monotonic series. render() emits the Prometheus text format.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.lock = threading.Lock()
+        self._counters: Dict[SeriesKey, float] = {}
+        self._gauges: Dict[SeriesKey, float] = {}
+        self._histograms: Dict[SeriesKey, Histogram] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: Any) -> None:
+        # Add to a counter.
+        key = series_key(name, labels)
+        with self.lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        # Set a gauge, the last value written wins.
+        with self.lock:
+            self._gauges[series_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        # Record one value in a histogram.
+        key = series_key(name, labels)
+        with self.lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        # Time a block into heathub_stage_seconds{stage=...}, also on errors.
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("heathub_stage_seconds", time.perf_counter() - started, stage=stage)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        try:
+            with open(self.path, "r") as stream:
+                return json.load(stream)
+        except (FileNotFoundError, ValueError):
+            return {"counters": [], "gauges": [], "histograms": []}
+
+    @staticmethod
+    def _index(entries: List[Dict[str, Any]]) -> Dict[SeriesKey, Dict[str, Any]]:
+        return {series_key(entry["name"], entry["labels"]): entry for entry in entries}
+
+    def flush(self) -> None:
+        # Merge everything recorded since the last flush into the file.
+        with self.lock:
+            counters, self._counters = self._counters, {}
+            gauges, self._gauges = self._gauges, {}
+            histograms, self._histograms = self._histograms, {}
+        if not (counters or gauges or histograms):
+            return
+        with self._locked():
+            data = self._load()
+            stored_counters = self._index(data["counters"])
+            for (name, labels), value in counters.items():
+                entry = stored_counters.setdefault(
+                    (name, labels), {"name": name, "labels": dict(labels), "value": 0}
+                )
+                entry["value"] += value
+            stored_gauges = self._index(data["gauges"])
+            for (name, labels), value in gauges.items():
+                stored_gauges[(name, labels)] = {"name": name, "labels": dict(labels), "value": value}
+            stored_histograms = self._index(data["histograms"])
+            for (name, labels), histogram in histograms.items():
+                entry = stored_histograms.get((name, labels))
+                if entry is not None:
+                    merged = Histogram.from_dict(entry)
+                    merged.merge(histogram)
+                    histogram = merged
+                stored_histograms[(name, labels)] = {
+                    "name": name, "labels": dict(labels), **histogram.to_dict()
+                }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as stream:
+                json.dump(
+                    {
+                        "counters": list(stored_counters.values()),
+                        "gauges": list(stored_gauges.values()),
+                        "histograms": list(stored_histograms.values()),
+                    },
+                    stream,
+                )
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _format_labels(labels: Dict[str, Any], extra: Optional[Tuple[str, str]] = None) -> str:
+        items = sorted((key, str(value)) for key, value in labels.items())
+        if extra is not None:
+            items.append(extra)
+        if not items:
+            return ""
+        return "{" + ",".join(
+            '%s="%s"' % (key, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+            for key, value in items
+        ) + "}"
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(float(value)) if value != int(value) else str(int(value))
+
+    def render(self) -> str:
+        # Persisted totals in the Prometheus text exposition format.
+        with self.lock:
+            data = self._load()
+        lines: List[str] = []
+        typed = set()
+
+        def header(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for kind, entries in (("counter", data["counters"]), ("gauge", data["gauges"])):
+            for entry in sorted(entries, key=lambda entry: entry["name"]):
+                header(entry["name"], kind)
+                lines.append(
+                    f"{entry['name']}{self._format_labels(entry['labels'])} "
+                    f"{self._format_value(entry['value'])}"
+                )
+        for entry in sorted(data["histograms"], key=lambda entry: entry["name"]):
+            name, labels = entry["name"], entry["labels"]
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(entry["buckets"]) + [math.inf], entry["counts"]):
+                cumulative += count
+                le = ("le", "+Inf" if math.isinf(bound) else repr(float(bound)))
+                lines.append(f"{name}_bucket{self._format_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {self._format_value(entry['sum'])}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics: Dict[str, Metrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_metrics(path: str) -> Metrics:
+    # Return the process-wide registry persisted at path.
+    path = os.path.abspath(path)
+    with _metrics_lock:
+        if path not in _metrics:
+            _metrics[path] = Metrics(path)
+        return _metrics[path]
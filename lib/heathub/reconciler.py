@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from lib.heathub.metrics import get_metrics
+from lib.heathub.resilience import RetryPolicy, call_with_retries
+from lib.heathub.utils import METRICS_PATH
+from lib.wave.WaveThermo import WaveThermo
+
+# A write confirmed this recently is not repeated while the Wave still
+# reports the old set point, its status can lag behind the acknowledgement
+CONFIRMATION_GRACE_SECONDS = 300
+# Set points closer than this are considered equal
+SET_POINT_TOLERANCE = 0.05
+
+STATE_COMMANDED = "wave_commanded_set_point"
+STATE_CONFIRMED = "wave_confirmed_set_point"
+STATE_CONFIRMED_AT = "wave_confirmed_at"
+
+metrics = get_metrics(METRICS_PATH)
+
+
+class WaveReconciler:
+    """Sends a Wave set point only when it differs from the known state.
+
+    request() records the desired set point, later calls in the same cycle
+    replace earlier ones. reconcile() compares it with the set point read
+    from the Wave this cycle and with the last confirmed write (kept in the
+    flag namespace between cycles), writes at most once, and takes the
+    write acknowledgement as confirmation instead of re-reading the status.
+    """
+
+    def __init__(self, wave: WaveThermo, state: Dict[str, Any]):
+        self.wave = wave
+        self.state = {
+            key: state.get(key)
+            for key in (STATE_COMMANDED, STATE_CONFIRMED, STATE_CONFIRMED_AT)
+        }
+        self.desired: Optional[float] = None
+
+    @staticmethod
+    def _same(first: Optional[float], second: Optional[float]) -> bool:
+        if first is None or second is None:
+            return False
+        return abs(float(first) - float(second)) < SET_POINT_TOLERANCE
+
+    def request(self, set_point: float) -> None:
+        # Record the desired set point, the last request of a cycle wins.
+        self.desired = set_point
+
+    def needs_write(self, now: Optional[float] = None) -> bool:
+        # True when the desired set point is not in place yet.
+        if self.desired is None:
+            return False
+        if self._same(self.desired, self.wave.status.set_point):
+            return False
+        confirmed_at = self.state[STATE_CONFIRMED_AT] or 0
+        now = time.time() if now is None else now
+        # The same value was acknowledged moments ago, the status is stale
+        return not (
+            self._same(self.desired, self.state[STATE_CONFIRMED])
+            and now - confirmed_at < CONFIRMATION_GRACE_SECONDS
+        )
+
+    async def reconcile(
+        self, deadline: float, retry: RetryPolicy = RetryPolicy(attempts=1)
+    ) -> Optional[float]:
+        # Write the desired set point if needed, return it when written.
+        if not self.needs_write():
+            if self.desired is not None:
+                metrics.inc("heathub_wave_writes_total", result="skipped")
+            return None
+        set_point = self.desired
+        self.state[STATE_COMMANDED] = set_point
+        try:
+            with metrics.span("wave_write"):
+                # Raises ValueError when the Wave rejects any of the writes;
+                # setting the same set point twice is harmless, so lost
+                # replies are retried within the deadline
+                await call_with_retries(
+                    lambda: self.wave.set_temperature(set_point), deadline, retry
+                )
+        except ValueError:
+            metrics.inc("heathub_errors_total", kind="wave_bad_request")
+            raise
+        except (OSError, asyncio.TimeoutError):
+            metrics.inc("heathub_errors_total", kind="wave_write")
+            raise
+        metrics.inc("heathub_wave_writes_total", result="sent")
+        # Every write was acknowledged, the status reflects it without a read
+        self.wave.status.set_point = float(set_point)
+        self.state[STATE_CONFIRMED] = set_point
+        self.state[STATE_CONFIRMED_AT] = time.time()
+        return set_point
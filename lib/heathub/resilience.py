@@ -0,0 +1,142 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple, Type
+
+# Attempts per source read, all within the source's deadline
+DEFAULT_RETRY_ATTEMPTS = 3
+# Backoff before retry n is drawn from [0, min(cap, base * 2**n)]
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_CAP = 5.0
+# Consecutive failed cycles that open a breaker
+DEFAULT_BREAKER_THRESHOLD = 3
+# Time an open breaker skips its device, doubled after every failed probe
+DEFAULT_BREAKER_RESET_TIMEOUT = 60.0
+BREAKER_RESET_TIMEOUT_MAX = 900.0
+
+
+class TransientError(Exception):
+    """A device answered with a temporary failure, e.g. HTTP 503."""
+
+
+class CircuitOpenError(Exception):
+    """The device failed repeatedly and is skipped until its breaker resets."""
+
+
+class RetryPolicy(NamedTuple):
+    attempts: int = DEFAULT_RETRY_ATTEMPTS
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+    backoff_base: float = RETRY_BACKOFF_BASE
+    backoff_cap: float = RETRY_BACKOFF_CAP
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter, so sites retrying the same cloud endpoint spread out.
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def attempt_budget(self, deadline: float) -> float:
+        # Least time call_with_retries gives any attempt within deadline, even
+        # when every earlier attempt used its share and every backoff its cap.
+        backoffs = sum(
+            min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+            for attempt in range(self.attempts - 1)
+        )
+        return max(deadline - backoffs, 0) / self.attempts
+
+
+async def call_with_retries(
+    fetch: Callable[[], Awaitable[Any]],
+    deadline: float,
+    policy: RetryPolicy = RetryPolicy(),
+    on_retry: Optional[Callable[[int, BaseException], None]] = None,
+) -> Tuple[Any, int]:
+    """Call fetch until it succeeds, the attempts run out or the deadline passes.
+
+    Each attempt gets an equal share of the time left, so a hung first try
+    still leaves room for another one. Backoff sleeps never run past the
+    deadline. Returns the value and the number of attempts made; the last
+    error is raised when every attempt failed, asyncio.TimeoutError when
+    the deadline passed.
+    """
+    loop = asyncio.get_running_loop()
+    ends_at = loop.time() + deadline
+    attempt = 0
+    while True:
+        remaining = ends_at - loop.time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        attempt += 1
+        try:
+            value = await asyncio.wait_for(
+                fetch(), timeout=remaining / (policy.attempts - attempt + 1)
+            )
+            return value, attempt
+        except (asyncio.TimeoutError, *policy.retry_on) as e:
+            if attempt >= policy.attempts:
+                raise
+            delay = policy.backoff(attempt - 1)
+            if loop.time() + delay >= ends_at:
+                raise
+            if on_retry is not None:
+                on_retry(attempt, e)
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """Per-device breaker whose state travels with the site's flags.
+
+    Closed while reads succeed. After threshold consecutive failures it opens
+    and allow() turns False, so the cycle skips the device instead of
+    waiting for its deadline. Once reset_timeout has passed one probe is let
+    through (half-open): success closes the breaker, failure opens it again
+    for twice as long. The state is a plain dict, stored in the flag store
+    so short-lived cron runs share it.
+    """
+
+    def __init__(
+        self,
+        state: Optional[Dict[str, Any]] = None,
+        threshold: int = DEFAULT_BREAKER_THRESHOLD,
+        reset_timeout: float = DEFAULT_BREAKER_RESET_TIMEOUT,
+    ):
+        state = state or {}
+        self.threshold = threshold
+        self.base_reset_timeout = reset_timeout
+        self.failures: int = state.get("failures", 0)
+        self.opened_at: Optional[float] = state.get("opened_at")
+        self.reset_timeout: float = state.get("reset_timeout", reset_timeout)
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        return {
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "reset_timeout": self.reset_timeout,
+        }
+
+    def is_open(self, now: Optional[float] = None) -> bool:
+        # True while the device is skipped.
+        if self.opened_at is None:
+            return False
+        now = time.time() if now is None else now
+        return now - self.opened_at < self.reset_timeout
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        # Closed, or half-open with a probe due.
+        return not self.is_open(now)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self, now: Optional[float] = None) -> bool:
+        # Count a failed read, True when this opened the breaker.
+        now = time.time() if now is None else now
+        probe_failed = self.opened_at is not None
+        self.failures += 1
+        if probe_failed:
+            self.reset_timeout = min(self.reset_timeout * 2, BREAKER_RESET_TIMEOUT_MAX)
+        elif self.failures < self.threshold:
+            return False
+        self.opened_at = now
+        return not probe_failed
@@ -0,0 +1,333 @@
+import asyncio
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+import aiohttp
+from pyit600 import IT600Gateway
+from lib.wave.WaveThermo import WaveThermo
+from lib.heathub.config import Config, SiteConfig
+from lib.heathub.metrics import get_metrics
+from lib.heathub.utils import (
+    METRICS_PATH,
+    DEVICE_SALUS,
+    DEVICE_SALUS_BUTTON_BATHROOM,
+)
+from lib.heathub.zones import ZoneWatcher
+
+if TYPE_CHECKING:
+    from lib.heathub.bathroom.credentials import CredentialCache
+    from lib.heathub.bathroom.salus import SmartButton
+    from lib.heathub.bathroom.shadow import ShadowClient
+
+# Connections to all IT600 gateways, shared by every site
+GATEWAY_POOL_SIZE = 32
+GATEWAY_REQUEST_TIMEOUT = 5
+
+metrics = get_metrics(METRICS_PATH)
+
+
+class SharedClients:
+    """Connection pools used by the clients of every site.
+
+    The gateways share one aiohttp session. Smart buttons share the Cognito
+    clients of their region, the shadow client of their IoT endpoint and the
+    credential cache of their account, so the number of pools, service
+    models and sign-ins does not grow with the number of sites.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._shadow_clients: Dict[Tuple[str, str], "ShadowClient"] = {}
+        self._credential_caches: Dict[str, "CredentialCache"] = {}
+        self._cognito_clients: Dict[str, Tuple[Any, Any]] = {}
+        self._cognito_lock = asyncio.Lock()
+        self._aws_session = None
+        self._client_stack = AsyncExitStack()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # Open the gateway HTTP session on first use.
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=GATEWAY_POOL_SIZE),
+            )
+        return self._session
+
+    def get_shadow_client(self, endpoint: str, region: str) -> "ShadowClient":
+        # Return the shadow client for an endpoint, creating it on first use.
+        from lib.heathub.bathroom.shadow import ShadowClient
+
+        key = (endpoint, region)
+        if key not in self._shadow_clients:
+            self._shadow_clients[key] = ShadowClient(endpoint, region)
+        return self._shadow_clients[key]
+
+    def get_credential_cache(self, account: str) -> "CredentialCache":
+        from lib.heathub.bathroom.credentials import CredentialCache
+
+        if account not in self._credential_caches:
+            self._credential_caches[account] = CredentialCache(account)
+        return self._credential_caches[account]
+
+    async def open_cognito(self, region: str) -> Tuple[Any, Any]:
+        # Return the Cognito user pool and identity clients of a region.
+        async with self._cognito_lock:
+            if region not in self._cognito_clients:
+                if self._aws_session is None:
+                    import aioboto3
+
+                    self._aws_session = aioboto3.Session()
+                self._cognito_clients[region] = (
+                    await self._client_stack.enter_async_context(
+                        self._aws_session.client("cognito-idp", region_name=region)
+                    ),
+                    await self._client_stack.enter_async_context(
+                        self._aws_session.client("cognito-identity", region_name=region)
+                    ),
+                )
+            return self._cognito_clients[region]
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        for shadow_client in self._shadow_clients.values():
+            await shadow_client.close()
+        self._shadow_clients = {}
+        await self._client_stack.aclose()
+        self._cognito_clients = {}
+
+
+class CycleResources:
+    """Holds the device clients of one site used by the control cycle.
+
+    In one-shot mode a fresh instance is created and closed for every run. In
+    daemon mode the same instance is kept for the lifetime of the process, so
+    the gateway, HTTP and XMPP sessions are reused between cycles. Clients
+    are built from the current site config; apply_config() closes those
+    whose settings changed since, so the next use rebuilds them. The cycle
+    and the zone watcher poll the same gateway object, which keeps its
+    devices in shared dicts, so both hold gateway_lock while using it.
+    """
+
+    def __init__(
+        self,
+        get_site: Callable[[], SiteConfig],
+        shared: Optional[SharedClients] = None,
+    ):
+        self.get_site = get_site
+        # One-shot callers without a pool get pools of their own
+        self.owns_shared = shared is None
+        self.shared = shared or SharedClients()
+        # Site config the current clients were built with
+        self._built: Optional[SiteConfig] = None
+        self._gateway: Optional[IT600Gateway] = None
+        self._gateway_connected = False
+        self._gateway_reconnect = False
+        self.gateway_lock = asyncio.Lock()
+        self._wave: Optional[WaveThermo] = None
+        self._smart_button: Optional["SmartButton"] = None
+        self._zone_watcher: Optional[ZoneWatcher] = None
+
+    @property
+    def site(self) -> SiteConfig:
+        # Site config the current clients belong to.
+        if self._built is None:
+            self._built = self.get_site()
+        return self._built
+
+    @property
+    def name(self) -> str:
+        return self.site.name
+
+    async def get_gateway(self) -> IT600Gateway:
+        # Return a connected IT600 gateway, connecting only on first use.
+        if self._gateway is None:
+            salus = self.site.salus
+            self._gateway = IT600Gateway(
+                host=salus.gateway_host,
+                euid=salus.gateway_euid,
+                port=salus.gateway_port,
+                request_timeout=GATEWAY_REQUEST_TIMEOUT,
+                session=self.shared.get_session(),
+                debug=1,
+            )
+        if not self._gateway_connected:
+            if self._gateway_reconnect:
+                metrics.inc("heathub_retries_total", source="gateway")
+            with metrics.span("gateway_connect"):
+                await self._gateway.connect()
+            self._gateway_connected = True
+            self._gateway_reconnect = False
+        return self._gateway
+
+    def reset_gateway(self) -> None:
+        # Force a fresh connect on the next cycle, e.g. after a connection error.
+        self._gateway_connected = False
+        self._gateway_reconnect = True
+
+    def get_wave(self) -> WaveThermo:
+        # Return the Wave thermostat client, creating it on first use.
+        if self._wave is None:
+            wave = self.site.wave
+            self._wave = WaveThermo(
+                serial_number=wave.serial_number,
+                access_code=wave.access_code,
+                password=wave.password,
+            )
+        return self._wave
+
+    def get_smart_button(self) -> "SmartButton":
+        # Return the bathroom smart button client, creating it on first use.
+        if self._smart_button is None:
+            # The AWS SDKs are only loaded when the button is enabled
+            from lib.heathub.bathroom.salus import SmartButton
+
+            salus = self.site.salus
+            self._smart_button = SmartButton(
+                salus,
+                shadow_client=self.shared.get_shadow_client(
+                    salus.account_iot_endpoint, salus.account_region
+                ),
+                device=self.site.scoped(DEVICE_SALUS_BUTTON_BATHROOM),
+                credential_cache=self.shared.get_credential_cache(
+                    f"{salus.account_username}@{salus.account_identity_id}"
+                ),
+                open_cognito=self.shared.open_cognito,
+            )
+        return self._smart_button
+
+    def start_zone_watcher(self, on_change: Callable[[], None]) -> ZoneWatcher:
+        # Watch the Salus zones on the shared gateway connection.
+        if self._zone_watcher is None:
+            self._zone_watcher = ZoneWatcher(
+                get_gateway=self.get_gateway,
+                reset_gateway=self.reset_gateway,
+                on_change=on_change,
+                min_interval=self.site.salus.gateway_watch_min_interval,
+                max_interval=self.site.salus.gateway_watch_max_interval,
+                device=self.site.scoped(DEVICE_SALUS),
+                lock=self.gateway_lock,
+            )
+        self._zone_watcher.start()
+        return self._zone_watcher
+
+    def start_watchers(self, on_change: Callable[[], None]) -> None:
+        # Follow pushed button and zone changes where the site asks for it.
+        site = self.site
+        if site.enabled_device_button_bathroom and site.salus.account_iot_subscribe:
+            # Button presses wake the daemon instead of waiting for the next tick
+            self.get_smart_button().start_subscription(on_change=on_change)
+        if site.salus.gateway_watch:
+            # A zone starting or stopping to call for heat runs the cycle right away
+            self.start_zone_watcher(on_change=on_change)
+
+    async def _close_gateway(self) -> None:
+        async with self.gateway_lock:
+            if self._gateway is not None:
+                await self._gateway.close()
+                self._gateway = None
+                self._gateway_connected = False
+
+    async def _close_wave(self) -> None:
+        if self._wave is not None:
+            await self._wave.close()
+            self._wave = None
+
+    async def _close_smart_button(self) -> "Optional[SmartButton]":
+        button = self._smart_button
+        if button is not None:
+            await button.close()
+            self._smart_button = None
+        return button
+
+    async def apply_config(self) -> None:
+        # Rebuild clients whose settings changed since they were created.
+        current = self.get_site()
+        built = self.site
+        if current == built:
+            return
+        if current.salus.gateway_settings() != built.salus.gateway_settings():
+            await self._close_gateway()
+        if current.wave != built.wave:
+            await self._close_wave()
+        if current.salus.button_settings() != built.salus.button_settings():
+            old_button = await self._close_smart_button()
+            if old_button is not None and old_button.subscription is not None:
+                # Keep following shadow updates with the new credentials
+                self._built = current
+                self.get_smart_button().start_subscription(old_button.subscription_callback)
+        if self._zone_watcher is not None:
+            self._zone_watcher.min_interval = current.salus.gateway_watch_min_interval
+            self._zone_watcher.max_interval = current.salus.gateway_watch_max_interval
+        self._built = current
+
+    async def close(self) -> None:
+        # Release every open session.
+        if self._zone_watcher is not None:
+            await self._zone_watcher.stop()
+            self._zone_watcher = None
+        await self._close_gateway()
+        await self._close_wave()
+        await self._close_smart_button()
+        if self.owns_shared:
+            await self.shared.close()
+
+
+class SitePool:
+    """The CycleResources of every configured site and their shared pools.
+
+    apply_config() follows the config snapshot: sites added to the config
+    get resources, removed sites are closed, and the remaining ones rebuild
+    the clients whose settings changed.
+    """
+
+    def __init__(self, get_config: Callable[[], Config]):
+        self.get_config = get_config
+        self.shared = SharedClients()
+        self.sites: Dict[str, CycleResources] = {}
+        self._on_change: Optional[Callable[[], None]] = None
+        self._add_sites(get_config())
+
+    def _site_getter(self, site: SiteConfig) -> Callable[[], SiteConfig]:
+        def get_site() -> SiteConfig:
+            nonlocal site
+            # A removed site keeps its last config until it is closed
+            for current in self.get_config().get_sites():
+                if current.name == site.name:
+                    site = current
+                    break
+            return site
+
+        return get_site
+
+    def _add_sites(self, config: Config) -> None:
+        for site in config.get_sites():
+            if site.name not in self.sites:
+                self.sites[site.name] = CycleResources(self._site_getter(site), self.shared)
+                if self._on_change is not None:
+                    self.sites[site.name].start_watchers(self._on_change)
+
+    def get(self, name: str) -> CycleResources:
+        return self.sites[name]
+
+    def start_watchers(self, on_change: Callable[[], None]) -> None:
+        # Start pushed-change watchers now and for sites added later.
+        self._on_change = on_change
+        for resources in self.sites.values():
+            resources.start_watchers(on_change)
+
+    async def apply_config(self) -> None:
+        # Follow sites added to, removed from or changed in the config.
+        config = self.get_config()
+        names = {site.name for site in config.get_sites()}
+        for name in [name for name in self.sites if name not in names]:
+            await self.sites.pop(name).close()
+        self._add_sites(config)
+        await asyncio.gather(*[resources.apply_config() for resources in self.sites.values()])
+
+    async def close(self) -> None:
+        await asyncio.gather(
+            *[resources.close() for resources in self.sites.values()],
+            return_exceptions=True,
+        )
+        self.sites = {}
+        await self.shared.close()
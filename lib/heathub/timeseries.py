@@ -0,0 +1,250 @@
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Resolution (seconds, 0 = raw) -> number of slots kept; raw 90 s samples for
+# a week, 15 min rollups for a quarter and hourly rollups for two years
+RAW_INTERVAL = 90
+RESOLUTIONS: List[Tuple[int, int]] = [
+    (0, 7 * 24 * 60 * 60 // RAW_INTERVAL),
+    (15 * 60, 92 * 24 * 4),
+    (60 * 60, 731 * 24),
+]
+
+HEADER = struct.Struct("<4sIII")  # magic, capacity, next slot, count
+RECORD = struct.Struct("<Ifff")  # timestamp, current, target, active
+MAGIC = b"HTS1"
+
+
+class Sample(NamedTuple):
+    timestamp: int
+    current: float
+    target: float
+    active: float
+
+
+class RingSeries:
+    """Fixed-capacity ring of fixed-width samples in one memory-mapped file.
+
+    Samples are appended in time order; once the ring is full the oldest
+    slot is overwritten. Range queries binary search the timestamps. A
+    read-only series never creates its file, opening a missing one raises
+    FileNotFoundError.
+    """
+
+    def __init__(self, path: str, capacity: int, readonly: bool = False):
+        self.path = path
+        self.lock = threading.Lock()
+        if not readonly:
+            try:
+                # Exclusive create, a file made by another process is kept as is
+                with open(path, "xb") as stream:
+                    stream.write(HEADER.pack(MAGIC, capacity, 0, 0))
+                    stream.truncate(HEADER.size + capacity * RECORD.size)
+            except FileExistsError:
+                pass
+        self._file = open(path, "rb" if readonly else "r+b")
+        self._map = mmap.mmap(
+            self._file.fileno(), 0, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE
+        )
+        magic, self.capacity, _, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a time-series file: {path}")
+
+    def _header(self) -> Tuple[int, int]:
+        _, _, next_slot, count = HEADER.unpack_from(self._map, 0)
+        return next_slot, count
+
+    def _slot(self, logical: int, next_slot: int, count: int) -> int:
+        # Physical slot of the logical index (0 = oldest).
+        return (next_slot - count + logical) % self.capacity
+
+    def _read(self, slot: int) -> Sample:
+        return Sample(*RECORD.unpack_from(self._map, HEADER.size + slot * RECORD.size))
+
+    def __len__(self) -> int:
+        return self._header()[1]
+
+    def last(self) -> Optional[Sample]:
+        next_slot, count = self._header()
+        if not count:
+            return None
+        return self._read((next_slot - 1) % self.capacity)
+
+    def append(self, sample: Sample) -> None:
+        with self.lock:
+            next_slot, count = self._header()
+            RECORD.pack_into(self._map, HEADER.size + next_slot * RECORD.size, *sample)
+            HEADER.pack_into(
+                self._map,
+                0,
+                MAGIC,
+                self.capacity,
+                (next_slot + 1) % self.capacity,
+                min(count + 1, self.capacity),
+            )
+
+    def _bisect(self, timestamp: int, next_slot: int, count: int) -> int:
+        # First logical index whose timestamp is >= timestamp.
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._read(self._slot(middle, next_slot, count)).timestamp < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start: int, end: int) -> Iterator[Sample]:
+        # Samples with start <= timestamp < end, oldest first.
+        next_slot, count = self._header()
+        for logical in range(self._bisect(start, next_slot, count), count):
+            sample = self._read(self._slot(logical, next_slot, count))
+            if sample.timestamp >= end:
+                return
+            yield sample
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class TimeSeriesStore:
+    """Per-device temperature history with automatic rollups.
+
+    record() appends a raw sample. When a sample starts a new 15 min (or
+    hourly) bucket, the previous bucket is averaged from the finer series
+    and appended to the coarser one; "active" becomes the share of samples
+    with heating or the boiler on. query() picks the finest resolution that
+    still covers the requested range and only reads: a resolution without
+    a file yet has no samples.
+    """
+
+    def __init__(self, directory: str, resolutions: List[Tuple[int, int]] = RESOLUTIONS):
+        self.directory = directory
+        self.resolutions = resolutions
+        self.lock = threading.Lock()
+        self._series: Dict[Tuple[str, int], RingSeries] = {}
+        # Series opened read-only by queries
+        self._readers: Dict[Tuple[str, int], RingSeries] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _safe_name(device: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", device)
+
+    def devices(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        )
+
+    def series(self, device: str, resolution: int) -> RingSeries:
+        key = (self._safe_name(device), resolution)
+        with self.lock:
+            if key not in self._series:
+                device_dir = os.path.join(self.directory, key[0])
+                os.makedirs(device_dir, exist_ok=True)
+                capacity = dict(self.resolutions)[resolution]
+                self._series[key] = RingSeries(
+                    os.path.join(device_dir, f"{resolution}.bin"), capacity
+                )
+            return self._series[key]
+
+    def reader(self, device: str, resolution: int) -> Optional[RingSeries]:
+        # Open a series for reading, None while it has no file yet.
+        key = (self._safe_name(device), resolution)
+        capacity = dict(self.resolutions)[resolution]
+        with self.lock:
+            series = self._series.get(key) or self._readers.get(key)
+            if series is None:
+                path = os.path.join(self.directory, key[0], f"{resolution}.bin")
+                try:
+                    series = RingSeries(path, capacity, readonly=True)
+                except FileNotFoundError:
+                    return None
+                self._readers[key] = series
+            return series
+
+    def record(
+        self,
+        device: str,
+        timestamp: float,
+        current: Optional[float],
+        target: Optional[float],
+        active: Optional[bool],
+    ) -> None:
+        # Store one reading and roll finished buckets up.
+        sample = Sample(
+            int(timestamp),
+            math.nan if current is None else float(current),
+            math.nan if target is None else float(target),
+            math.nan if active is None else float(bool(active)),
+        )
+        finer = self.series(device, self.resolutions[0][0])
+        previous = finer.last()
+        if previous is not None and sample.timestamp <= previous.timestamp:
+            return
+        finer.append(sample)
+        if previous is None:
+            return
+        for resolution, _ in self.resolutions[1:]:
+            if previous.timestamp // resolution == sample.timestamp // resolution:
+                break
+            # The previous sample closed a bucket, its finer data is complete
+            bucket = previous.timestamp - previous.timestamp % resolution
+            coarser = self.series(device, resolution)
+            rollup = self._rollup(list(finer.range(bucket, bucket + resolution)), bucket)
+            if rollup is not None:
+                coarser.append(rollup)
+            finer = coarser
+
+    @staticmethod
+    def _mean(values: List[float]) -> float:
+        values = [value for value in values if not math.isnan(value)]
+        return sum(values) / len(values) if values else math.nan
+
+    def _rollup(self, samples: List[Sample], bucket: int) -> Optional[Sample]:
+        if not samples:
+            return None
+        return Sample(
+            bucket,
+            self._mean([sample.current for sample in samples]),
+            self._mean([sample.target for sample in samples]),
+            self._mean([sample.active for sample in samples]),
+        )
+
+    def pick_resolution(self, start: int, now: int) -> int:
+        # Finest resolution whose retention still reaches back to start.
+        for resolution, capacity in self.resolutions:
+            span = capacity * (resolution or RAW_INTERVAL)
+            if now - start <= span:
+                return resolution
+        return self.resolutions[-1][0]
+
+    def query(
+        self,
+        device: str,
+        start: int,
+        end: int,
+        resolution: Optional[int] = None,
+        now: Optional[int] = None,
+    ) -> Tuple[int, List[Sample]]:
+        # Return (resolution, samples) for a time range.
+        if resolution is None:
+            resolution = self.pick_resolution(start, int(time.time()) if now is None else now)
+        series = self.reader(device, resolution)
+        return resolution, [] if series is None else list(series.range(start, end))
+
+    def flush(self) -> None:
+        with self.lock:
+            for series in self._series.values():
+                series.flush()
@@ -1,160 +1,135 @@
 import datetime
+import json
+import logging
 import os
-import yaml
-import threading
-from tinydb import TinyDB, Query
-from typing import Any, Optional, Dict, List
+from typing import Any, Optional, Dict, List, Tuple
+from lib.heathub.flagstore import FlagStore
+from lib.heathub.logpipeline import LogPipeline, get_log_pipeline
+from lib.heathub.logstore import SegmentedLogStore, get_log_store
 
 # Define configuration directory and path at the module level
 CONFIG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../etc'))
 CONFIG_PATH = os.path.join(CONFIG_DIR, 'config.yaml')
-DB_DIR = os.path.join(CONFIG_DIR, 'tinyDb')
+# HEATHUB_DB_DIR moves the stores elsewhere, e.g. for benchmark runs
+DB_DIR = os.environ.get('HEATHUB_DB_DIR') or os.path.join(CONFIG_DIR, 'tinyDb')
+LOG_DIR = os.path.join(DB_DIR, 'logs')
+FLAGS_PATH = os.path.join(DB_DIR, 'flags.json')
+TIMESERIES_DIR = os.path.join(DB_DIR, 'timeseries')
+GAS_USAGE_DIR = os.path.join(DB_DIR, 'gasusage')
+METRICS_PATH = os.path.join(DB_DIR, 'metrics.json')
 
 # Ensure directories exist
 os.makedirs(CONFIG_DIR, exist_ok=True)
 os.makedirs(DB_DIR, exist_ok=True)
 
 # Some other constants
+DEVICE_APP = "app"
 DEVICE_SALUS = "salus"
 DEVICE_SALUS_BUTTON_BATHROOM = "salus_button_bathroom"
 DEVICE_WAVE = "wave"
 LOG_TYPE_ERROR = "error"
 
 
-class ConfigManager:
-    """Handles configuration loading and saving."""
-
-    def __init__(self, config_path: str = CONFIG_PATH):
-        self.config_path = config_path
-
-    def get_config(self) -> dict:
-        # Load configuration from a YAML file.
-        try:
-            with open(self.config_path, "r") as stream:
-                return yaml.safe_load(stream) or {}
-        except FileNotFoundError:
-            return {}
-        except yaml.YAMLError as e:
-            return {}
-
-    def save_config(self, config: dict) -> None:
-        # Save configuration to a YAML file.
-        try:
-            with open(self.config_path, "w") as stream:
-                yaml.dump(config, stream)
-        except Exception as e:
-            raise
-
-
-class DatabaseManager:
-    """Handles database interactions using TinyDB."""
-
-    MAX_DB_SIZE_MB = 1.5
-
-    def __init__(self):
-        self.db_dir = DB_DIR
-        self.lock = threading.Lock()
-
-    def get_db(self, db_name: str = "db") -> TinyDB:
-        # Get a TinyDB instance for the specified database name.
-        file_path = os.path.join(self.db_dir, f"{db_name}.json")
-        with self.lock:
-            if not os.path.exists(file_path):
-                open(file_path, "a").close()
-            else:
-                file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-                if file_size_mb > self.MAX_DB_SIZE_MB:
-                    os.remove(file_path)
-                    open(file_path, "a").close()
-        return TinyDB(file_path)
-
-
 class FlagManager:
     """Handles flag storage and retrieval."""
 
-    def __init__(self):
-        self.db_manager = DatabaseManager()
-        self._flag_cache: Dict[str, Any] = {}
-        self._flag_table = None
+    def __init__(self, flags_path: str = FLAGS_PATH):
+        self.store = FlagStore(flags_path)
+        self._migrate_tinydb()
+
+    def _migrate_tinydb(self) -> None:
+        # Move flags of the former TinyDB db.json into the flag store, once.
+        legacy_path = os.path.join(DB_DIR, "db.json")
+        with self.store.lock:
+            if not os.path.exists(legacy_path):
+                return
+            try:
+                with open(legacy_path, "r") as stream:
+                    table = json.load(stream).get("flags", {})
+            except ValueError:
+                table = {}
+            legacy_flags = {record["key"]: record["value"] for record in table.values()}
+            os.replace(legacy_path, f"{legacy_path}.migrated")
+        if legacy_flags:
+            self.store.update({**legacy_flags, **self.store.get_all()})
 
     def set_flag_namespace(self, new_flag_data: Dict[str, Any]) -> None:
-        # Save or update flags in the database.
-        db = self.db_manager.get_db("db")
-        table = db.table("flags")
-        Flag = Query()
-        for key, value in new_flag_data.items():
-            table.upsert({"key": key, "value": value}, Flag.key == key)
-            self._flag_cache[key] = value  # Update cache
+        # Save or update a dict of flags in a single atomic write.
+        self.store.update(new_flag_data)
 
     def get_flag(self, key: str) -> Optional[Any]:
         # Retrieve the value of a flag by key.
-        if key in self._flag_cache:
-            return self._flag_cache[key]
-
-        if not self._flag_table:
-            db = self.db_manager.get_db("db")
-            self._flag_table = db.table("flags")
-
-        Flag = Query()
-        result = self._flag_table.get(Flag.key == key)
-        if result:
-            value = result["value"]
-            self._flag_cache[key] = value
-            return value
-        return None
+        return self.store.get(key)
 
     def get_flags(self) -> Dict[str, Any]:
         # Retrieve all flags as a dictionary.
-        if not self._flag_table:
-            db = self.db_manager.get_db("db")
-            self._flag_table = db.table("flags")
-
-        results = self._flag_table.all()
-        return {record["key"]: record["value"] for record in results}
+        return self.store.get_all()
 
 
 class LogManager:
-    """Handles logging to a TinyDB database."""
-
-    def __init__(self):
-        self.db_manager = DatabaseManager()
-        self.lock = threading.Lock()
-        self._log_table = None
-
-    def _get_log_table(self) -> Any:
-        # Get the 'logs' table from the database.
-        if self._log_table is None:
-            db = self.db_manager.get_db("logs")
-            self._log_table = db.table("logs")
-        return self._log_table
+    """Handles logging to the segmented log store through the logging module.
+
+    set_log only queues a record; a background writer stores them in batches
+    and flush() waits for everything queued so far, e.g. at the end of a cycle.
+    """
+
+    def __init__(self, log_dir: str = LOG_DIR):
+        self.store: SegmentedLogStore = get_log_store(log_dir)
+        self.pipeline: LogPipeline = get_log_pipeline(self.store)
+        self._migrate_tinydb()
+
+    def _migrate_tinydb(self) -> None:
+        # Move records of the former TinyDB logs.json into the store, once.
+        legacy_path = os.path.join(DB_DIR, "logs.json")
+        with self.store.lock:
+            if not os.path.exists(legacy_path):
+                return
+            try:
+                with open(legacy_path, "r") as stream:
+                    table = json.load(stream).get("logs", {})
+            except ValueError:
+                table = {}
+            lines = [
+                json.dumps(table[doc_id], ensure_ascii=False) + "\n"
+                for doc_id in sorted(table, key=int)
+            ]
+            os.replace(legacy_path, f"{legacy_path}.migrated")
+        if lines:
+            self.store.append_lines(lines)
 
     def set_log(self, message: str = "", device: str = "", log_type: str = "info") -> None:
-        # Save a log entry to the database.
-        log_entry = {
-            "date": Helper.get_current_formatted_date(),
-            "device": device,
-            "type": log_type,
-            "message": message,
-        }
+        # Queue a log entry for the background writer.
+        level = logging.ERROR if log_type == LOG_TYPE_ERROR else logging.INFO
+        self.pipeline.log(level, message, device=device, log_type=log_type)
 
-        try:
-            with self.lock:
-                table = self._get_log_table()
-                table.insert(log_entry)
-        except Exception as e:
-            # TODO: move this to native logging
-            print(f"Failed to save log entry: {e}")
+    def flush(self) -> None:
+        # Wait until every queued log entry is written.
+        self.pipeline.flush()
 
     def get_logs(self) -> List[Dict[str, Any]]:
-        # Retrieve all log entries from the database.
+        # Retrieve all retained log entries, oldest first.
+        self.flush()
         try:
-            table = self._get_log_table()
-            return table.all()
+            return self.store.all()
         except Exception as e:
-            # TODO: move this to native logging
-            print(f"Failed to retrieve logs: {e}")
+            logging.getLogger(__name__).error("Failed to retrieve logs: %s", e)
             return []
 
+    def get_logs_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        device: Optional[str] = None,
+        log_type: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # Retrieve one page of log entries, newest first, and the next cursor.
+        self.flush()
+        return self.store.page(
+            limit, cursor, start=start, end=end, device=device, log_type=log_type
+        )
+
 
 class Helper:
     """Contains utility methods for diffrent purposes."""
@@ -0,0 +1,108 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from lib.heathub.utils import LogManager, DEVICE_SALUS, LOG_TYPE_ERROR
+
+# Poll interval right after a zone changed, grows while nothing happens
+WATCH_INTERVAL_MIN = 5
+WATCH_INTERVAL_MAX = 30
+WATCH_INTERVAL_BACKOFF = 1.5
+
+log_manager = LogManager()
+
+
+class ZoneWatcher:
+    """Polls the Salus gateway on a short, adaptive interval.
+
+    A climate update callback registered on the gateway compares every
+    zone's hvac_action with the previous poll; on_change is called once per
+    poll in which any zone started or stopped calling for heat, so the full
+    control cycle only runs when its decision could change. The interval
+    drops to the minimum after a change and backs off while zones are stable.
+    Polls hold lock, which the control cycle holds while it polls the same
+    gateway.
+    """
+
+    def __init__(
+        self,
+        get_gateway: Callable[[], Awaitable[Any]],
+        reset_gateway: Callable[[], None],
+        on_change: Callable[[], None],
+        min_interval: float = WATCH_INTERVAL_MIN,
+        max_interval: float = WATCH_INTERVAL_MAX,
+        device: str = DEVICE_SALUS,
+        lock: Optional[asyncio.Lock] = None,
+    ):
+        self.get_gateway = get_gateway
+        self.reset_gateway = reset_gateway
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Log device, scoped to the site the gateway belongs to
+        self.device = device
+        self.lock = lock or asyncio.Lock()
+        self.interval = min_interval
+        self.actions: Dict[str, str] = {}
+        self._changed = False
+        self._gateway: Optional[Any] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        # Run the watcher in the background.
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Cancel the background polling.
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _on_climate_update(self, device_id: str) -> None:
+        # Called by the gateway for every climate device on every poll.
+        device = self._gateway.get_climate_device(device_id)
+        if device is None:
+            return
+        previous = self.actions.get(device_id)
+        self.actions[device_id] = device.hvac_action
+        if previous is not None and previous != device.hvac_action:
+            log_manager.set_log(
+                f"Zone {device.name} changed: {previous} -> {device.hvac_action}",
+                device=self.device,
+            )
+            self._changed = True
+
+    async def poll(self) -> bool:
+        # Poll the gateway once, True when any zone's hvac_action changed.
+        async with self.lock:
+            gateway = await self.get_gateway()
+            if gateway is not self._gateway:
+                # Callbacks live on the gateway object, register once per instance
+                self._gateway = gateway
+                await gateway.add_climate_update_callback(self._on_climate_update)
+            self._changed = False
+            await gateway.poll_status(send_callback=True)
+            return self._changed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.poll():
+                    self.interval = self.min_interval
+                    self.on_change()
+                else:
+                    self.interval = min(
+                        self.interval * WATCH_INTERVAL_BACKOFF, self.max_interval
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.reset_gateway()
+                self.interval = self.max_interval
+                log_manager.set_log(
+                    f"Zone watcher poll failed: {e}",
+                    device=self.device,
+                    log_type=LOG_TYPE_ERROR,
+                )
+            await asyncio.sleep(self.interval)
@@ -1,92 +1,31 @@
-import base64
-from Crypto.Cipher import AES
-import asyncio
-import slixmpp
+from lib.wave.codec import WaveCodec
 
-import ssl
 
-from lib.wave.utils import get_md5
+class BaseWaveMessageBot:
+    """
+    Builds and reads the Wave messages of one kind of request
 
-class BaseWaveMessageBot(slixmpp.ClientXMPP):
+    Bots do not connect themselves: every message goes through the
+    thermostat's shared WaveSession, the only XMPP client, and is encoded
+    with the codec derived once per thermostat.
+    """
 
-    secret = b'X\xf1\x8dp\xf6g\xc9\xc7\x9e\xf7\xdeC[\xf0\xf9\xb1U;\xbbna\x81b\x12\xab\x80\xe5\xb0\xd3Q\xfb\xb1'
-
-
-    def __init__(self, serial_number, access_code, password, message):
-
-        jid = "rrccontact_%s@wa2-mz36-qrmzh6.bosch.de" % serial_number
-        connection_password = "Ct7ZR03b_%s" % access_code
-
-        slixmpp.ClientXMPP.__init__(self, jid, connection_password)
-
-        self.recipient = "rrcgateway_%s@wa2-mz36-qrmzh6.bosch.de" % serial_number
-        self.msg = message
-
-        self.add_event_handler("session_start", self.start)
-        self.add_event_handler("message", self.message)
-
-        self.connected = False
-
-        abyte1 = get_md5(access_code.encode() + self.secret)
-        abyte2 = get_md5(self.secret + password.encode())
-
-        self.key = abyte1 + abyte2
-
-    def connect(self):
-        self.connected = True
-        return slixmpp.ClientXMPP.connect(self, ('wa2-mz36-qrmzh6.bosch.de', 5222),
-                                            use_ssl=False)
-
-    def disconnect(self):
-        self.connected = False
-        return slixmpp.ClientXMPP.disconnect(self)
-
-    def run(self):
-        self.connect()
-        self.go()
-        self.process(forever=False)
-        self.get_roster(timeout=5)
-
-    def start(self, event):
-        self.send_presence()
-        self.get_roster()
-
-    def go(self):
-        if not self.connected:
-            self.connect()
-
-        self.send_message(mto=self.recipient,
-                          mbody=self.msg,
-                          mtype='chat')
+    def __init__(self, session, codec: WaveCodec):
+        self.session = session
+        self.codec = codec
+        self.msg = ""
 
     ##
     ## Now functions for encoding/decoding and creating messages
     ##
     def set_message(self, url, value):
-        j = '{"value":%s}' % (value)
-        if type(value) == str:
-            j = '{"value":"%s"}' % (value)
-
-        remainder = len(j) % 16
+        self.msg = self.create_message(url, value)
 
-        j = j + '\x00' * (16 - remainder)
-
-        self.msg = "PUT %s HTTP:/1.0\nContent-Type: application/json\nContent-Length: 25\nUser-Agent: NefitEasy\n\n\n\n%s\n" % (url, self.encode(j).decode('utf-8'))
+    def create_message(self, url, value):
+        return self.codec.build_put(url, value)
 
     def encode(self, s):
-        #a = AES.new(self.key)
-        a = AES.new(self.key, AES.MODE_ECB)
-        res = a.encrypt(s.encode())
-
-        encoded = base64.b64encode(res)
-
-        return encoded
+        return self.codec.encrypt(s.encode())
 
     def decode(self, data):
-        decoded = base64.b64decode(data)
-
-        #a = AES.new(self.key)
-        a = AES.new(self.key, AES.MODE_ECB)
-        res = a.decrypt(decoded)
-
-        return res
+        return self.codec.decrypt(data)
@@ -0,0 +1,108 @@
+import datetime
+from typing import NamedTuple, Optional
+
+# Daily gas usage recordings, ENTRIES_PER_PAGE days per page and pages
+# numbered from 1; the pointer is the 1-based index of the entry the
+# thermostat writes next
+GAS_USAGE_POINTER_PATH = "/ecus/rrc/recordings/gasusagePointer"
+GAS_USAGE_PAGE_PATH = "/ecus/rrc/recordings/gasusage?page=%d"
+ENTRIES_PER_PAGE = 32
+# Date of the slots the thermostat has not written yet
+EMPTY_DAY = "255-256-65535"
+
+
+class GasUsageDay(NamedTuple):
+    """
+    One day of the gas usage recordings
+
+    day is None for a slot the thermostat has not written yet. Usage is in
+    kWh, outdoor_temp the day's mean outdoor temperature in degrees.
+    """
+    day: Optional[datetime.date]
+    central_heating: float
+    hot_water: float
+    outdoor_temp: float
+
+
+def parse_gas_usage_page(value):
+    """
+    Turn the value of a gas usage page into GasUsageDay entries
+
+    Parameters
+    ----------
+    value : list of {"d": "dd-mm-yyyy", "ch": kWh, "hw": kWh, "T": tenths of a degree}
+
+    Returns
+    -------
+    list of GasUsageDay, None when the page is malformed
+    """
+    if not isinstance(value, list):
+        return None
+    entries = []
+    for entry in value:
+        try:
+            day = None
+            if entry['d'] != EMPTY_DAY:
+                day = datetime.datetime.strptime(entry['d'], "%d-%m-%Y").date()
+            entries.append(GasUsageDay(day, float(entry['ch']), float(entry['hw']),
+                                       float(entry['T']) / 10))
+        except (KeyError, TypeError, ValueError):
+            return None
+    return entries
+
+
+def gas_usage_pages(pointer):
+    """
+    Number of pages holding entries for a pointer value
+    """
+    return max(1, -(-(pointer - 1) // ENTRIES_PER_PAGE))
+
+
+async def read_gas_usage_pointer(reader):
+    """
+    Index of the entry the thermostat writes next, None when unreadable
+    """
+    reading = (await reader.read([GAS_USAGE_POINTER_PATH]))[GAS_USAGE_POINTER_PATH]
+    if not reading.ok or not isinstance(reading.value, (int, float)):
+        return None
+    return int(reading.value)
+
+
+async def read_gas_usage_pages(reader, pages, window=4):
+    """
+    Read gas usage pages, window pages per batch
+
+    Pages answer with the resource id without the query, so replies are
+    matched to requests by order only; a lost or late reply shifts the
+    pages of its batch. A batch with a missing page, or whose dates do not
+    follow the pages read before it, is therefore dropped as a whole.
+
+    Parameters
+    ----------
+    reader : ReadBot
+    pages : iterable of page numbers, ascending
+    window : int, pages requested in one batch
+
+    Returns
+    -------
+    dict mapping each page to its list of GasUsageDay, None for pages
+    that could not be read
+    """
+    pages = list(pages)
+    window = max(1, window)
+    results = {}
+    last_day = None
+    for start in range(0, len(pages), window):
+        batch = pages[start:start + window]
+        paths = [GAS_USAGE_PAGE_PATH % page for page in batch]
+        readings = await reader.read(paths)
+        entries = [parse_gas_usage_page(readings[path].value) if readings[path].ok else None
+                   for path in paths]
+        days = [entry.day for page in entries if page is not None for entry in page if entry.day]
+        in_order = all(a < b for a, b in zip([last_day] + days, days) if a is not None)
+        if None in entries or not in_order:
+            results.update((page, None) for page in batch)
+            continue
+        results.update(zip(batch, entries))
+        last_day = days[-1] if days else last_day
+    return results
@@ -0,0 +1,131 @@
+from typing import Any, NamedTuple, Optional
+
+from lib.wave.BaseBot import BaseWaveMessageBot
+from lib.wave.codec import STATUS_PATH
+
+# Resources read by a diagnostics refresh besides uiStatus
+OUTDOOR_TEMP_PATH = "/system/sensors/temperatures/outdoor_t1"
+SUPPLY_TEMP_PATH = "/heatingCircuits/hc1/actualSupplyTemperature"
+SYSTEM_PRESSURE_PATH = "/system/appliance/systemPressure"
+ACTIVE_PROGRAM_PATH = "/ecus/rrc/userprogram/activeprogram"
+
+
+class WaveReading(NamedTuple):
+    """
+    One resource as read from the thermostat
+
+    value is converted after the document's type: floatValue to float,
+    anything else as sent. ok is False when the thermostat gave no usable
+    reply (unknown resource, timeout), value and unit are None then.
+    """
+    path: str
+    ok: bool
+    value: Any = None
+    unit: Optional[str] = None
+    type: Optional[str] = None
+    document: Optional[dict] = None
+
+
+class WaveDiagnostics(NamedTuple):
+    """
+    Typed snapshot of the thermostat, taken with one batch of GETs
+    """
+    current_temp: Optional[float]
+    set_point: Optional[float]
+    boiler_on: Optional[int]
+    program_mode: Optional[str]
+    outdoor_temp: Optional[float]
+    supply_temp: Optional[float]
+    system_pressure: Optional[float]
+    active_program: Optional[int]
+
+
+class ReadBot(BaseWaveMessageBot):
+    """
+    Reads any number of Wave resources over the shared session
+
+    All GETs go out back to back and replies are matched to their request
+    by the resource id in the decrypted payload, so a batch costs about
+    one round trip however many resources it holds.
+    """
+
+    def parse_reading(self, path, body):
+        """
+        Turn one reply body into a WaveReading for path
+        """
+        document = self.codec.parse_reply(body) if body is not None else None
+        # A 404 without payload may have been handed to this request, and the
+        # reply it displaced then carries another resource's id; paged
+        # resources answer with their path without the query
+        if (not isinstance(document, dict) or 'value' not in document
+                or document.get('id', path) not in (path, path.split('?')[0])):
+            return WaveReading(path, ok=False)
+        value = document['value']
+        kind = document.get('type')
+        if kind == 'floatValue':
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return WaveReading(path, ok=False, type=kind, document=document)
+        return WaveReading(path, ok=True, value=value, unit=document.get('unitOfMeasure'),
+                           type=kind, document=document)
+
+    async def read_bodies(self, paths):
+        """
+        Raw reply bodies of several resources, None for those unanswered
+        """
+        msgs = [self.codec.build_get(path) for path in paths]
+        return await self.session.request_many(msgs, partial=True)
+
+    async def read(self, paths):
+        """
+        Read several resources in one batch
+
+        Parameters
+        ----------
+        paths : list of resource paths, e.g. ["/system/appliance/systemPressure"]
+
+        Returns
+        -------
+        dict mapping each path to its WaveReading
+        """
+        paths = list(dict.fromkeys(paths))
+        bodies = await self.read_bodies(paths)
+        return {path: self.parse_reading(path, body) for path, body in zip(paths, bodies)}
+
+
+async def read_diagnostics(reader, status):
+    """
+    Refresh uiStatus together with the diagnostics resources
+
+    Parameters
+    ----------
+    reader : ReadBot
+    status : StatusBot, updated from the same batch
+
+    Returns
+    -------
+    WaveDiagnostics
+    """
+    paths = [STATUS_PATH, OUTDOOR_TEMP_PATH, SUPPLY_TEMP_PATH, SYSTEM_PRESSURE_PATH,
+             ACTIVE_PROGRAM_PATH]
+    bodies = dict(zip(paths, await reader.read_bodies(paths)))
+    # Values of an older refresh are not reported as current
+    status_ok = bodies[STATUS_PATH] is not None and status.parse_status(bodies[STATUS_PATH])
+    readings = {path: reader.parse_reading(path, bodies[path]) for path in paths[1:]}
+
+    def number(path):
+        reading = readings[path]
+        return reading.value if reading.ok and isinstance(reading.value, float) else None
+
+    active_program = readings[ACTIVE_PROGRAM_PATH].value
+    return WaveDiagnostics(
+        current_temp=status.current_temp if status_ok else None,
+        set_point=status.set_point if status_ok else None,
+        boiler_on=status.boiler_on if status_ok else None,
+        program_mode=status.program_mode if status_ok else None,
+        outdoor_temp=number(OUTDOOR_TEMP_PATH),
+        supply_temp=number(SUPPLY_TEMP_PATH),
+        system_pressure=number(SYSTEM_PRESSURE_PATH),
+        active_program=int(active_program) if isinstance(active_program, (int, float)) else None,
+    )
@@ -5,20 +5,31 @@ class SetBot(BaseWaveMessageBot):
     set_point = None
     boiler_on = None
 
-    def __init__(self, serial_number, access_code, password):
-        super().__init__(serial_number, access_code, password, "")
+    async def post_message(self, url, value):
+        self.set_message(url, value)
+        body = await self.session.request(self.msg)
+        if self.codec.is_bad_request(body):
+            raise ValueError("Bad Request for %s" % url)
 
-    def message(self, msg):
+    async def post_messages(self, values):
         """
-        Process a message once it has been received
-        """
-        if 'No Content' in msg['body']:
-            self.disconnect()
-        elif 'Bad Request' in msg['body']:
-            self.disconnect()
-            print('ERROR: Bad Request')
-            raise ValueError
+        Write several resources in one go
 
-    async def post_message(self, url, value):
-        self.set_message(url, value)
-        self.run()
+        All PUTs are sent back to back over the shared session and the
+        acknowledgements are collected afterwards, so the whole batch costs
+        about one round trip.
+
+        Parameters
+        ----------
+        values : list of (url, value) tuples
+
+        Returns
+        -------
+        dict mapping each url to True ("No Content") or False ("Bad Request")
+        """
+        results = {}
+        msgs = [self.create_message(url, value) for url, value in values]
+        bodies = await self.session.request_many(msgs)
+        for (url, value), body in zip(values, bodies):
+            results[url] = not self.codec.is_bad_request(body)
+        return results
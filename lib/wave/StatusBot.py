@@ -1,42 +1,29 @@
-import json
-import asyncio
-import time
-
 from lib.wave.utils import parse_on_off
 from lib.wave.BaseBot import BaseWaveMessageBot
+from lib.wave.codec import STATUS_PATH
 
 class StatusBot(BaseWaveMessageBot):
     current_temp = None
     set_point = None
     boiler_on = None
 
-    def __init__(self, serial_number, access_code, password):
-        super().__init__(serial_number, access_code, password, "GET /ecus/rrc/uiStatus HTTP /1.0\nUser-Agent: NefitEasy")
+    def __init__(self, session, codec):
+        super().__init__(session, codec)
+        self.msg = self.codec.build_get()
 
-    def message(self, msg):
+    def parse_status(self, body):
         """
-        Process a message once it has been received
+        Parse a uiStatus reply body, returns True when it contained data
         """
-        spl = str(msg['body']).split("\n\n")
+        # Decrypted JSON document, None for an invalid or empty reply
+        document = self.codec.parse_reply(body)
 
-        if len(spl) < 2:
-            # Invalid message
-            return
+        # A reply for another resource says nothing about the status
+        if not isinstance(document, dict) or document.get('id', STATUS_PATH) != STATUS_PATH:
+            return False
         else:
-            to_decode = spl[1].strip()
-
-            # Decode the encrypted message
-            data = self.decode(to_decode)
-
-            # For some reason we have a load of null characters at the end
-            # of the message, so strip these out
-            data = data.replace(b'\x00', b'')
-
-            # 'decode' from bytes to str, with UTF-8 encoding
-            # (a different sort of 'decode' to above!)
-            data = data.decode('utf-8')
-            if len(data) > 0:
-                self.data = json.loads(data)['value']
+            if 'value' in document:
+                self.data = document['value']
 
                 # Temperature set point (ie. temperature it is aiming for)
                 self.set_point = float(self.data['TSP'])
@@ -69,7 +56,10 @@ class StatusBot(BaseWaveMessageBot):
                 elif self.data['BAI'] == 'CH' or self.data['BAI'] == 'HW':
                     self.boiler_on = 1
 
-                self.disconnect()
+                return True
+            return False
 
     async def update(self):
-        self.run()
+        # A rejected or empty reply must not leave an earlier cycle's values in place
+        if not self.parse_status(await self.session.request(self.msg)):
+            raise ValueError("Wave returned no status")
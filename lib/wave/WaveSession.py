@@ -0,0 +1,233 @@
+import asyncio
+from collections import deque
+
+import slixmpp
+
+from lib.wave.codec import WaveCodec
+
+WAVE_HOST = "wa2-mz36-qrmzh6.bosch.de"
+WAVE_PORT = 5222
+
+
+class PendingRequest:
+    """A request sent to the thermostat that is still waiting for its reply."""
+
+    def __init__(self, method, path, future, sent_at):
+        self.method = method
+        self.path = path
+        self.future = future
+        self.sent_at = sent_at
+
+
+class WaveSession(slixmpp.ClientXMPP):
+    """
+    Long-lived XMPP session shared by every bot of one thermostat.
+
+    This is the only XMPP client of a thermostat; the bots build messages
+    with the session's codec and send them through request().
+
+    The session connects once, keeps the stream alive with whitespace pings
+    and reconnects on its own after the server drops it. Requests are plain
+    Wave messages (as built by the bots); replies are matched to requests by
+    the resource id in the decrypted payload, or in send order for replies
+    without a payload ("No Content", "Bad Request"). A request given up on
+    (timeout, cancellation) stays queued for stale_reply_window seconds, so
+    its late reply is dropped instead of resolving a newer request.
+
+    A caller that gives every attempt a fixed time, e.g. a retry loop,
+    sets attempt_budget; connecting and waiting for the replies of one
+    request then end within it, so the session raises its own
+    TimeoutError before the caller cancels it.
+    """
+
+    connect_timeout = 15
+    request_timeout = 10
+    keepalive_interval = 60
+    reconnect_delay = 5
+    stale_reply_window = 20
+    # Share of attempt_budget a request may use, the rest covers sending
+    # and the caller's own bookkeeping
+    attempt_budget_share = 0.9
+
+    def __init__(self, serial_number, access_code, password, codec=None):
+        jid = "rrccontact_%s@%s" % (serial_number, WAVE_HOST)
+        connection_password = "Ct7ZR03b_%s" % access_code
+        super().__init__(jid, connection_password)
+
+        self.recipient = "rrcgateway_%s@%s" % (serial_number, WAVE_HOST)
+        # Key and cipher are derived once per thermostat, not per message
+        self.codec = codec or WaveCodec(access_code, password)
+
+        self.whitespace_keepalive_interval = self.keepalive_interval
+        self.add_event_handler("session_start", self.start)
+        self.add_event_handler("message", self.message)
+        self.add_event_handler("disconnected", self.on_disconnected)
+
+        self.attempt_budget = None
+        self._pending = deque()
+        self._ready = asyncio.Event()
+        self._connecting = False
+        self._closing = False
+
+    async def start(self, event):
+        self.send_presence()
+        await self.get_roster(timeout=self.request_timeout)
+        self._connecting = False
+        self._ready.set()
+
+    def on_disconnected(self, event):
+        self._ready.clear()
+        self._connecting = False
+        self._fail_pending(ConnectionError("Wave session disconnected"))
+        if not self._closing:
+            self.loop.call_later(self.reconnect_delay, self._open)
+
+    def _open(self):
+        if self._closing or self._connecting or self._ready.is_set():
+            return
+        self._connecting = True
+        self.connect((WAVE_HOST, WAVE_PORT), use_ssl=False)
+
+    async def ensure_connected(self, timeout=None):
+        """
+        Wait until the session is logged in, connecting if needed
+
+        Waits at most connect_timeout seconds, or timeout if shorter.
+        """
+        self._closing = False
+        self._open()
+        if self._ready.is_set():
+            return
+        limit = self.connect_timeout if timeout is None else min(self.connect_timeout, timeout)
+        await asyncio.wait_for(self._ready.wait(), limit)
+
+    async def close(self):
+        """
+        Disconnect for good, failing any request still in flight
+        """
+        self._closing = True
+        self._fail_pending(ConnectionError("Wave session closed"))
+        if self._ready.is_set() or self._connecting:
+            self._ready.clear()
+            self._connecting = False
+            await asyncio.wait_for(self.disconnect(), self.request_timeout)
+
+    def _fail_pending(self, exc):
+        while self._pending:
+            pending = self._pending.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(exc)
+
+    ##
+    ## Request / reply correlation
+    ##
+    async def request(self, msg):
+        """
+        Send one Wave message and return the body of its reply
+
+        Parameters
+        ----------
+        msg : str
+            Message as built by the bots, e.g. "GET /ecus/rrc/uiStatus ..."
+        """
+        return (await self.request_many([msg]))[0]
+
+    async def request_many(self, msgs, partial=False):
+        """
+        Send several Wave messages back to back and return their reply
+        bodies in the same order
+
+        With partial=True a request left unanswered when the timeout passes
+        gets None instead of failing the whole batch.
+        """
+        ends_at = None
+        if self.attempt_budget is not None:
+            ends_at = self.loop.time() + self.attempt_budget * self.attempt_budget_share
+        await self.ensure_connected(None if ends_at is None else ends_at - self.loop.time())
+
+        pending = []
+        for msg in msgs:
+            method, path = self.parse_request_line(msg)
+            entry = PendingRequest(method, path, self.loop.create_future(), self.loop.time())
+            self._pending.append(entry)
+            pending.append(entry)
+            self.send_message(mto=self.recipient, mbody=msg, mtype='chat')
+
+        if not pending:
+            return []
+        timeout = self.request_timeout
+        if ends_at is not None:
+            timeout = max(min(timeout, ends_at - self.loop.time()), 0)
+        futures = [entry.future for entry in pending]
+        try:
+            # asyncio.wait leaves the futures alone when it times out or is
+            # cancelled; every outcome is collected here or cancelled below,
+            # so no failed future is reported as never retrieved
+            done, _ = await asyncio.wait(futures, timeout=timeout)
+            errors = {future: future.exception() for future in done}
+            if partial:
+                return [future.result() if future in done and errors[future] is None else None
+                        for future in futures]
+            error = next((errors[future] for future in futures if errors.get(future)), None)
+            if error is not None:
+                raise error
+            if len(done) < len(futures):
+                raise asyncio.TimeoutError()
+            return [future.result() for future in futures]
+        finally:
+            # Unanswered entries stay queued to absorb their late replies
+            for future in futures:
+                future.cancel()
+            self._expire_abandoned()
+
+    def _expire_abandoned(self):
+        deadline = self.loop.time() - self.stale_reply_window
+        for entry in [p for p in self._pending if p.future.done() and p.sent_at < deadline]:
+            self._pending.remove(entry)
+
+    def parse_request_line(self, msg):
+        return self.codec.parse_request_line(msg)
+
+    def reply_path(self, body):
+        """
+        Resource id of an encrypted reply, None for replies without payload
+        """
+        document = self.codec.parse_reply(body)
+        if not isinstance(document, dict):
+            return None
+        return document.get('id')
+
+    def message(self, msg):
+        """
+        Hand a received reply to the oldest request it belongs to
+
+        Replies matching no request are dropped, as are those matching a
+        request that was given up on.
+        """
+        body = str(msg['body'])
+        self._expire_abandoned()
+        if not body or not self._pending:
+            return
+
+        path = self.reply_path(body)
+        if path is not None:
+            # A resource reads the same for any request of it, so a waiting
+            # request is served before one that was given up on
+            candidates = sorted(self._pending, key=lambda p: p.future.done())
+            entry = next((p for p in candidates if p.path == path), None)
+            if entry is None:
+                # Pages of a paged resource share the id without the query
+                entry = next((p for p in candidates
+                              if p.path and p.path.split('?')[0] == path), None)
+        else:
+            # Without payload only the send order tells whose reply it is
+            entry = next((p for p in self._pending if p.method == 'PUT'), None)
+            if entry is None:
+                # An unknown resource is answered without payload as well
+                entry = next((p for p in self._pending if p.method == 'GET'), None)
+        if entry is None:
+            return
+
+        self._pending.remove(entry)
+        if not entry.future.done():
+            entry.future.set_result(body)
@@ -1,16 +1,41 @@
+from lib.wave.ReadBot import ReadBot, read_diagnostics
 from lib.wave.SetBot import SetBot
 from lib.wave.StatusBot import StatusBot
+from lib.wave.WaveSession import WaveSession
 
 class WaveThermo:
 
     def __init__(self, serial_number, access_code, password):
-        self.status = StatusBot(serial_number=serial_number,
-                                access_code=access_code,
-                                password=password)
+        # One XMPP session per thermostat; the bots only build and parse
+        # messages, with the session's codec, and send them through it
+        self.session = WaveSession(serial_number=serial_number,
+                                   access_code=access_code,
+                                   password=password)
 
-        self.setter = SetBot(serial_number=serial_number,
-                             access_code=access_code,
-                             password=password)
+        self.status = StatusBot(self.session, self.session.codec)
+        self.setter = SetBot(self.session, self.session.codec)
+        self.reader = ReadBot(self.session, self.session.codec)
+
+    async def read(self, paths):
+        """
+        Read several resources in one batch, returns {path: WaveReading}
+        """
+        return await self.reader.read(paths)
+
+    async def diagnostics(self):
+        """
+        Refresh the status and the diagnostics resources in one batch
+
+        Returns a WaveDiagnostics snapshot; self.status is updated as by
+        status.update().
+        """
+        return await read_diagnostics(self.reader, self.status)
+
+    async def close(self):
+        """
+        Close the shared XMPP session
+        """
+        await self.session.close()
 
     async def set_mode(self, mode):
         """
@@ -24,23 +49,31 @@ class WaveThermo:
         await  self.setter.post_message("/heatingCircuits/hc1/usermode", mode)
 
     async def set_temperature(self, temperature):
+        """
+        Set the room temperature, returns the per-path write results
+
+        Raises ValueError when any of the writes got a Bad Request.
+        """
         #await self.status.update()
 
         if self.status.program_mode == 'manual':
-            await self.setter.post_message("/heatingCircuits/hc1/temperatureRoomManual", temperature)
+            values = [("/heatingCircuits/hc1/temperatureRoomManual", temperature)]
         else:
 
             #https://gist.github.com/pszafer/20513389782d5bb50801106d0c5e36cb
             #https://github.com/bosch-thermostat/home-assistant-bosch-custom-component/issues/283
 
-            
-            await self.setter.post_message("/heatingCircuits/hc1/temperatureRoomManual", temperature)
-            await self.setter.post_message("/heatingCircuits/hc1/manualTempOverride/status", "on")
-            await self.setter.post_message("/heatingCircuits/hc1/manualTempOverride/temperature", temperature)
+            values = [
+                ("/heatingCircuits/hc1/temperatureRoomManual", temperature),
+                ("/heatingCircuits/hc1/manualTempOverride/status", "on"),
+                ("/heatingCircuits/hc1/manualTempOverride/temperature", temperature),
+            ]
 
-            #await self.setter.post_message("/heatingCircuits/hc1/manualTempOverride/temperature", temperature)
+        results = await self.setter.post_messages(values)
+        if not all(results.values()):
+            raise ValueError("Bad Request for %s" % [url for url, ok in results.items() if not ok])
+        return results
 
-        #await self.status.update()
     async def override(self, b):
         if b:
             await self.setter.post_message("/heatingCircuits/hc1/manualTempOverride/status", 'on')
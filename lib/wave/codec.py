@@ -0,0 +1,106 @@
+import base64
+import binascii
+import json
+
+from Crypto.Cipher import AES
+
+from lib.wave.utils import get_md5, secret
+
+BLOCK_SIZE = 16
+STATUS_PATH = "/ecus/rrc/uiStatus"
+USER_AGENT = "NefitEasy"
+
+
+class WaveCodec:
+    """
+    Encryption and message framing of the Wave protocol, without XMPP
+
+    The AES key and the ECB cipher are derived once per thermostat; ECB
+    keeps no state between blocks, so a single cipher object serves every
+    message. Payloads are zero padded to the block size only when needed.
+    """
+
+    def __init__(self, access_code, password):
+        self.key = get_md5(access_code.encode() + secret) + get_md5(secret + password.encode())
+        self._cipher = AES.new(self.key, AES.MODE_ECB)
+
+    ##
+    ## Payload encryption
+    ##
+    def encrypt(self, data):
+        """
+        Zero pad and encrypt bytes, returns the base64 encoded ciphertext
+        """
+        remainder = len(data) % BLOCK_SIZE
+        if remainder:
+            data = data + b'\x00' * (BLOCK_SIZE - remainder)
+        return base64.b64encode(self._cipher.encrypt(data))
+
+    def decrypt(self, data):
+        """
+        Decrypt a base64 payload (str or bytes) and strip the zero padding
+        """
+        return self._cipher.decrypt(base64.b64decode(data)).rstrip(b'\x00')
+
+    ##
+    ## Requests
+    ##
+    def build_get(self, path=STATUS_PATH):
+        return "GET %s HTTP /1.0\nUser-Agent: %s" % (path, USER_AGENT)
+
+    def build_put(self, path, value):
+        """
+        Build a PUT request writing {"value": value} to a resource
+        """
+        payload = self.encrypt(json.dumps({"value": value}, separators=(',', ':')).encode())
+        return "PUT %s HTTP:/1.0\nContent-Type: application/json\nContent-Length: %d\nUser-Agent: %s\n\n\n\n%s\n" % (
+            path, len(payload), USER_AGENT, payload.decode('ascii'))
+
+    @staticmethod
+    def parse_request_line(msg):
+        """
+        Method and path of a request, (None, None) when malformed
+        """
+        end = msg.find("\n")
+        parts = (msg if end < 0 else msg[:end]).split()
+        if len(parts) < 2:
+            return None, None
+        return parts[0], parts[1]
+
+    ##
+    ## Replies
+    ##
+    @staticmethod
+    def reply_payload(body):
+        """
+        Encrypted payload of a reply body, None for replies without one
+        """
+        body = str(body)
+        start = body.find("\n\n")
+        if start < 0:
+            return None
+        start += 2
+        end = body.find("\n\n", start)
+        payload = (body[start:] if end < 0 else body[start:end]).strip()
+        return payload or None
+
+    def parse_reply(self, body):
+        """
+        Decrypt and parse the JSON document of a reply, None without one
+        """
+        payload = self.reply_payload(body)
+        if payload is None:
+            return None
+        try:
+            data = self.decrypt(payload)
+            return json.loads(data) if data else None
+        except (ValueError, binascii.Error):
+            return None
+
+    @staticmethod
+    def is_no_content(body):
+        return 'No Content' in body
+
+    @staticmethod
+    def is_bad_request(body):
+        return 'Bad Request' in body
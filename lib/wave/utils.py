@@ -10,17 +10,11 @@ def parse_on_off(s):
         return False
 
 
-def create_message(url, value):
-    j = '{"value":%s}' % (repr(value))
-
-    remainder = len(j) % 16
-
-    j = j + '\x00' * (16 - remainder)
-
-
-    msg = "PUT %s HTTP:/1.0\nContent-Type: application/json\nContent-Length: 25\nUser-Agent: NefitEasy\n\n\n\n%s\n" % (url, encode(j).decode('utf-8'))
-
-    return msg
+def create_message(codec, url, value):
+    """
+    Build a PUT message with the codec (lib.wave.codec.WaveCodec) of a thermostat
+    """
+    return codec.build_put(url, value)
 
 
 def get_md5(data):
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+
+import app as dashboard
+from lib.heathub.logstore import SegmentedLogStore
+from lib.heathub.logtail import LogTailer
+from lib.heathub.timeseries import TimeSeriesStore
+
+
+def test_dashboard_tail_carries_the_filters():
+    client = dashboard.app.test_client()
+    page = client.get("/?device=wave&from=2026-01-01&to=2026-01-31").get_data(as_text=True)
+    assert "/logs/stream?" in page
+    for part in ("device=wave", "from=2026-01-01", "to=2026-01-31"):
+        assert part in page
+
+
+def test_tail_applies_the_filters(tmp_path, monkeypatch):
+    store = SegmentedLogStore(str(tmp_path))
+    tailer = LogTailer(store, lambda: {}, poll_interval=0.05)
+    monkeypatch.setattr(dashboard, "log_tailer", tailer)
+    client = dashboard.app.test_client()
+
+    response = client.get("/logs/stream?device=wave&from=2026-01-01&to=2026-01-31",
+                          buffered=False)
+    chunks = (chunk.decode() for chunk in response.response)
+    assert next(chunks).startswith("retry:")
+    # Let the tailer settle at the end of the store, it only sends new entries
+    time.sleep(0.3)
+    store.append({"date": "2026-01-10 10:00:00", "device": "app", "type": "info", "message": "device"})
+    store.append({"date": "2026-02-10 10:00:00", "device": "wave", "type": "info", "message": "date"})
+    store.append({"date": "2026-01-10 10:00:00", "device": "wave", "type": "info", "message": "match"})
+
+    chunk = next(chunks)
+    while chunk.startswith(":"):
+        chunk = next(chunks)
+    response.close()
+    assert chunk.startswith("event: log") and '"match"' in chunk
+
+
+def test_dashboard_shows_the_flags_of_every_site(monkeypatch):
+    from lib.heathub.config import Config
+
+    config = Config.from_dict({"sites": [{"name": "home"}, {"name": "cabin"}]})
+    monkeypatch.setattr(dashboard.config_store, "reload_if_changed", lambda: False)
+    monkeypatch.setattr(dashboard.config_store, "get", lambda: config)
+    monkeypatch.setattr(dashboard.flag_manager, "get_flags", lambda: {
+        "last_date_app_run": "2026-01-10 10:00:00",
+        "cabin.last_date_heat_on": "2026-01-10 09:00:00",
+    })
+    page = dashboard.app.test_client().get("/").get_data(as_text=True)
+    assert 'data-flag="home.last_date_heat_on"' in page
+    assert "cabin: Heat last date on: <span>2026-01-10 09:00:00</span>" in page
+    assert "App last date run: <span>2026-01-10 10:00:00</span>" in page
+
+
+def test_timeseries_of_a_resolution_without_a_file(tmp_path, monkeypatch):
+    store = TimeSeriesStore(str(tmp_path))
+    store.record("wave", 1000, 20.0, 21.0, True)
+    monkeypatch.setattr(dashboard, "timeseries_store", TimeSeriesStore(str(tmp_path)))
+    client = dashboard.app.test_client()
+
+    response = client.get("/api/timeseries/wave?from=0&to=2000&resolution=3600")
+    assert response.get_json() == {"device": "wave", "resolution": 3600, "samples": []}
+    assert sorted(path.name for path in (tmp_path / "wave").iterdir()) == ["0.bin"]
+    response = client.get("/api/timeseries/wave?from=0&to=2000&resolution=0")
+    assert response.get_json()["samples"] == [[1000, 20.0, 21.0, 1.0]]
+    assert client.get("/api/timeseries/wave?resolution=60").status_code == 400
+    assert client.get("/api/timeseries/gas").status_code == 404
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from lib.heathub.acquisition import DEFAULT_SOURCE_DEADLINES
+from lib.heathub.config import DEFAULT_SITE, Config, ConfigError, ConfigStore, load_config
+
+
+def write(path, text):
+    path.write_text(text)
+    # Distinct stat signature even within one mtime tick
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000))
+
+
+def test_defaults_without_file(tmp_path):
+    assert load_config(str(tmp_path / "missing.yaml")) == Config()
+
+
+def test_types_are_checked_and_converted():
+    config = Config.from_dict({"app": {"cycle_interval": "45", "retry_attempts": 0},
+                               "salus": {"gateway_port": "8080"}})
+    assert config.app.cycle_interval == 45.0
+    assert config.app.retry_attempts == 1
+    assert config.salus.gateway_port == 8080
+    with pytest.raises(ConfigError, match="app.enabled"):
+        Config.from_dict({"app": {"enabled": "yes"}})
+    with pytest.raises(ConfigError, match="salus: expected a mapping"):
+        Config.from_dict({"salus": ["gateway_host"]})
+
+
+@pytest.mark.parametrize("interval", [0, -5, "0"])
+def test_cycle_interval_must_be_positive(interval):
+    with pytest.raises(ConfigError, match="app.cycle_interval"):
+        Config.from_dict({"app": {"cycle_interval": interval}})
+
+
+@pytest.mark.parametrize("name", ["breaker_reset_timeout", "fallback_max_age"])
+@pytest.mark.parametrize("value", [0, -1])
+def test_app_durations_must_be_positive(name, value):
+    with pytest.raises(ConfigError, match=f"app.{name}"):
+        Config.from_dict({"app": {name: value}})
+
+
+@pytest.mark.parametrize("deadline", [0, -2.5, "0"])
+def test_source_deadlines_must_be_positive(deadline):
+    with pytest.raises(ConfigError, match="app.source_deadlines.wave"):
+        Config.from_dict({"app": {"source_deadlines": {"wave": deadline}}})
+
+
+def test_source_deadlines():
+    config = Config.from_dict({"app": {"source_deadlines": {"wave": "12", "button": None}}})
+    # A null deadline keeps the default, like any other setting
+    assert config.app.source_deadlines == {"wave": 12.0, "button": DEFAULT_SOURCE_DEADLINES["button"]}
+    with pytest.raises(ConfigError, match="unknown sources wav"):
+        Config.from_dict({"app": {"source_deadlines": {"wav": 5}}})
+
+
+def test_sites():
+    config = Config.from_dict({
+        "salus": {"account_username": "shared", "gateway_host": "top"},
+        "sites": [
+            {"name": "home", "salus": {"gateway_host": "10.0.0.1"}},
+            {"name": "cabin", "enabled_device_button_bathroom": True},
+        ],
+    })
+    home, cabin = config.get_sites()
+    assert home.salus.gateway_host == "10.0.0.1"
+    assert cabin.salus.account_username == "shared"
+    assert cabin.enabled_device_button_bathroom and not home.enabled_device_button_bathroom
+    assert cabin.scoped("wave") == "cabin.wave"
+    assert "sites.home.wave.serial_number" in config.missing()
+    assert Config().get_sites()[0].name == DEFAULT_SITE
+    assert Config().get_sites()[0].scoped("wave") == "wave"
+
+    with pytest.raises(ConfigError, match="duplicate names home"):
+        Config.from_dict({"sites": [{"name": "home"}, {"name": "home"}]})
+    with pytest.raises(ConfigError, match=r"sites\[0\].name"):
+        Config.from_dict({"sites": [{"name": "a.b"}]})
+
+
+def test_reload_keeps_previous_config_on_error(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, "app: {cycle_interval: 60}\n")
+    store = ConfigStore(str(path))
+    changes = []
+    store.on_change(lambda previous, current: changes.append(current.app.cycle_interval))
+    assert not store.reload_if_changed()
+
+    write(path, "app: {cycle_interval: 0}\n")
+    assert not store.reload_if_changed()
+    assert store.get().app.cycle_interval == 60.0
+
+    write(path, "app: {cycle_interval: 30}\n")
+    assert store.reload_if_changed()
+    assert changes == [30.0]
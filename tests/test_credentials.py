@@ -0,0 +1,36 @@
+import datetime
+import os
+import stat
+
+from lib.heathub.bathroom.credentials import CredentialCache
+
+
+def test_accounts_share_the_file(tmp_path):
+    path = str(tmp_path / "credentials.json")
+    first = CredentialCache("first@example.com", path)
+    second = CredentialCache("second@example.com", path)
+    # Both read the file before either writes, as two processes would
+    assert first.get_id_token() is None and second.get_id_token() is None
+
+    first.set_tokens("token-1", 3600, "refresh-1")
+    second.set_aws_credentials({
+        "AccessKeyId": "key",
+        "SecretKey": "secret",
+        "SessionToken": "session",
+        "Expiration": datetime.datetime.now() + datetime.timedelta(hours=1),
+    })
+
+    reloaded = CredentialCache("first@example.com", path)
+    assert reloaded.get_id_token() == "token-1"
+    assert reloaded.get_refresh_token() == "refresh-1"
+    assert CredentialCache("second@example.com", path).get_aws_credentials()["AccessKeyId"] == "key"
+
+
+def test_file_is_private_and_no_temp_files_remain(tmp_path):
+    path = str(tmp_path / "credentials.json")
+    cache = CredentialCache("user@example.com", path)
+    cache.set_tokens("token", 3600)
+    cache.invalidate()
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert sorted(os.listdir(tmp_path)) == ["credentials.json", "credentials.json.lock"]
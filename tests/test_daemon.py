@@ -0,0 +1,126 @@
+import asyncio
+import os
+import signal
+
+import pytest
+
+from lib.heathub import daemon as daemon_module
+from lib.heathub.daemon import Daemon
+from lib.heathub.utils import LogManager
+
+
+class StubNotifier:
+    def __init__(self):
+        self.messages = []
+
+    def notify(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def make_daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon_module, "log_manager", LogManager(str(tmp_path / "logs")))
+    monkeypatch.setattr(daemon_module, "SHUTDOWN_GRACE_PERIOD", 0.2)
+    monkeypatch.setattr(daemon_module, "TRIGGER_DEBOUNCE", 0.1)
+    # Watchdog pings every 10 ms
+    monkeypatch.setenv("WATCHDOG_USEC", "20000")
+
+    def make(cycle, interval=10, on_shutdown=None):
+        daemon = Daemon(cycle, interval, on_shutdown)
+        daemon.notifier = StubNotifier()
+        return daemon
+
+    return make
+
+
+def test_notifications_in_order(make_daemon):
+    cycles = []
+
+    async def cycle():
+        cycles.append(asyncio.get_running_loop().time())
+        if len(cycles) == 3:
+            daemon.stop()
+
+    daemon = make_daemon(cycle, interval=0.05)
+    asyncio.run(daemon.run())
+    messages = daemon.notifier.messages
+
+    assert len(cycles) == 3
+    assert messages[0] == "READY=1"
+    assert messages[-1] == "STOPPING=1"
+    assert messages.count("STOPPING=1") == 1
+    # The watchdog kept pinging between the cycles
+    assert messages.count("WATCHDOG=1") >= 5
+    assert messages.count("STATUS=Running cycle") == 3
+    statuses = [message for message in messages if message.startswith("STATUS=")]
+    assert statuses == ["STATUS=Running cycle", "STATUS=Idle"] * 3
+    # Cycles start an interval apart
+    assert all(second - first >= 0.05 for first, second in zip(cycles, cycles[1:]))
+
+
+def test_sigterm_lets_the_running_cycle_finish(make_daemon):
+    finished, shut_down = [], []
+
+    async def cycle():
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    async def on_shutdown():
+        shut_down.append(daemon.notifier.messages[-1])
+
+    daemon = make_daemon(cycle, on_shutdown=on_shutdown)
+    asyncio.run(daemon.run())
+    # Within the grace period, the cycle completes and no other one starts
+    assert finished == [True]
+    assert shut_down == ["STOPPING=1"]
+    assert daemon.notifier.messages.count("STATUS=Running cycle") == 1
+
+
+def test_sigterm_cancels_a_cycle_past_the_grace_period(make_daemon):
+    cancelled = []
+
+    async def cycle():
+        os.kill(os.getpid(), signal.SIGTERM)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(asyncio.get_running_loop().time() - started)
+            raise
+
+    async def run():
+        nonlocal started
+        started = asyncio.get_running_loop().time()
+        await daemon.run()
+
+    started = 0.0
+    daemon = make_daemon(cycle)
+    asyncio.run(asyncio.wait_for(run(), 2))
+    assert len(cancelled) == 1 and 0.2 <= cancelled[0] < 1
+    assert daemon.notifier.messages[-1] == "STOPPING=1"
+
+
+def test_trigger_burst_runs_one_cycle(make_daemon):
+    cycles = []
+
+    async def cycle():
+        cycles.append(asyncio.get_running_loop().time())
+
+    async def run():
+        task = asyncio.create_task(daemon.run())
+        await asyncio.sleep(0.05)
+        assert len(cycles) == 1
+        triggered = asyncio.get_running_loop().time()
+        for _ in range(5):
+            daemon.trigger()
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.2)
+        daemon.stop()
+        await task
+        return triggered
+
+    daemon = make_daemon(cycle)
+    triggered = asyncio.run(run())
+    # One cycle for the burst, after the debounce window, none for the interval
+    assert len(cycles) == 2
+    assert cycles[1] - triggered >= 0.1
@@ -0,0 +1,73 @@
+import json
+import multiprocessing
+
+from lib.heathub.flagstore import FlagStore
+
+WRITES_PER_PROCESS = 50
+
+
+def write_flags(path, name):
+    store = FlagStore(path)
+    for index in range(WRITES_PER_PROCESS):
+        store.update({name: index, f"{name}-{index}": True})
+
+
+def test_second_store_sees_commits(tmp_path):
+    path = str(tmp_path / "flags.json")
+    first, second = FlagStore(path), FlagStore(path)
+    assert second.get_all() == {}
+
+    first.update({"a": 1})
+    assert second.get("a") == 1
+    second.update({"b": 2})
+    # Each writer merges into the other's latest commit, nothing is lost
+    assert first.get_all() == {"a": 1, "b": 2}
+    assert first.version == second.version == 2
+
+
+def test_interleaved_writes(tmp_path):
+    path = str(tmp_path / "flags.json")
+    first, second = FlagStore(path), FlagStore(path)
+    for index in range(20):
+        first.update({"first": index})
+        second.update({"second": index})
+    assert FlagStore(path).get_all() == {"first": 19, "second": 19}
+    assert FlagStore(path).version == 40
+
+
+def test_concurrent_processes(tmp_path):
+    path = str(tmp_path / "flags.json")
+    context = multiprocessing.get_context("fork")
+    names = [f"process-{index}" for index in range(4)]
+    processes = [context.Process(target=write_flags, args=(path, name)) for name in names]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    flags = FlagStore(path).get_all()
+    assert FlagStore(path).version == len(names) * WRITES_PER_PROCESS
+    for name in names:
+        assert flags[name] == WRITES_PER_PROCESS - 1
+        assert all(flags[f"{name}-{index}"] for index in range(WRITES_PER_PROCESS))
+    # Every commit was a complete file, the temp file is gone
+    with open(path) as stream:
+        assert json.load(stream)["flags"] == flags
+    assert not (tmp_path / "flags.json.tmp").exists()
+
+
+def test_reader_keeps_its_snapshot_until_the_file_changes(tmp_path, monkeypatch):
+    path = str(tmp_path / "flags.json")
+    writer, reader = FlagStore(path), FlagStore(path)
+    writer.update({"a": 1})
+    assert reader.get("a") == 1
+
+    loads = []
+    original = json.load
+    monkeypatch.setattr(json, "load", lambda stream: loads.append(1) or original(stream))
+    assert reader.get("a") == 1 and reader.get_all() == {"a": 1}
+    assert loads == []
+    writer.update({"a": 2})
+    assert reader.get("a") == 2
+    assert loads == [1]
@@ -0,0 +1,153 @@
+import asyncio
+import datetime
+import os
+import random
+
+import pytest
+
+pytest.importorskip("Crypto")
+pytest.importorskip("slixmpp")
+
+from bench.fakes import Behaviour, FakeWaveEndpoint  # noqa: E402
+from lib.heathub.gasusage import HEADER, RECORD, GasUsageStore, sync_gas_usage  # noqa: E402
+from lib.wave.GasUsage import ENTRIES_PER_PAGE  # noqa: E402
+from lib.wave.WaveThermo import WaveThermo  # noqa: E402
+
+FIRST_DAY = datetime.date(2024, 1, 1)
+
+
+def add_days(endpoint, count):
+    for _ in range(count):
+        index = len(endpoint.gas_usage)
+        endpoint.add_gas_usage_day(FIRST_DAY + datetime.timedelta(days=index), index, 1.5, 4.2)
+
+
+def run_sync(scenario):
+    async def run():
+        wave = WaveThermo(serial_number="123456789", access_code="abcdefghijklmnop", password="test")
+        wave.session.request_timeout = 0.5
+        endpoint = FakeWaveEndpoint(Behaviour(), random.Random(1))
+        endpoint.attach(wave.session)
+        batches = []
+        read = wave.reader.read
+
+        async def counted_read(paths):
+            batches.append(len(paths))
+            return await read(paths)
+
+        wave.reader.read = counted_read
+        try:
+            await scenario(wave.reader, endpoint, batches)
+        finally:
+            endpoint.detach()
+            await wave.close()
+
+    asyncio.run(run())
+
+
+def stored_days(store):
+    return [(day.day, day.central_heating) for day in store.days()]
+
+
+def expected_days(count):
+    return [(FIRST_DAY + datetime.timedelta(days=index), float(index)) for index in range(count)]
+
+
+def test_backfill_pages_by_window(tmp_path):
+    store = GasUsageStore(str(tmp_path / "wave.bin"))
+
+    async def scenario(reader, endpoint, batches):
+        add_days(endpoint, 100)
+        result = await sync_gas_usage(reader, store, window=3, now=1.0)
+        assert result.pointer == 101 and result.pages == [1, 2, 3, 4] and result.failed == []
+        assert result.requests == 5
+        # The pointer, then the four pages three at a time
+        assert batches == [1, 3, 1]
+        assert stored_days(store) == expected_days(100)
+        assert store.state() == (101, 4, 1.0)
+
+    run_sync(scenario)
+    store.close()
+
+
+def test_later_sync_rereads_the_current_page_only(tmp_path):
+    store = GasUsageStore(str(tmp_path / "wave.bin"))
+
+    async def scenario(reader, endpoint, batches):
+        add_days(endpoint, 100)
+        await sync_gas_usage(reader, store, window=4)
+        endpoint.requests.clear()
+
+        # Today's entry grew and a new day started, both on page 4
+        endpoint.gas_usage[-1]["ch"] = 500.0
+        add_days(endpoint, 1)
+        result = await sync_gas_usage(reader, store, window=4)
+        assert result.pages == [4] and result.requests == 2
+        assert endpoint.requests["/ecus/rrc/recordings/gasusage"] == 1
+        assert stored_days(store)[99] == (FIRST_DAY + datetime.timedelta(days=99), 500.0)
+
+        # Crossing into page 5 reads the end of page 4 and the new page
+        add_days(endpoint, 28)
+        assert (await sync_gas_usage(reader, store, window=4)).pages == [4, 5]
+
+    run_sync(scenario)
+    days = [day for day, _ in stored_days(store)]
+    # Pages are written in place, re-reading one adds no records
+    assert days == sorted(set(days)) and len(days) == 129
+    assert os.path.getsize(store.path) == HEADER.size + 5 * ENTRIES_PER_PAGE * RECORD.size
+    store.close()
+
+
+def test_failed_page_is_read_again(tmp_path):
+    store = GasUsageStore(str(tmp_path / "wave.bin"))
+
+    async def scenario(reader, endpoint, batches):
+        add_days(endpoint, 100)
+        reply = endpoint.reply
+        endpoint.reply = lambda mbody: (
+            "HTTP/1.0 404 Not Found\n\n" if "page=2" in mbody else reply(mbody))
+        result = await sync_gas_usage(reader, store, window=1)
+        assert result.failed == [2] and store.state().page == 2
+
+        endpoint.reply = reply
+        result = await sync_gas_usage(reader, store, window=1)
+        assert result.pages == [2, 3, 4] and result.failed == []
+        assert stored_days(store) == expected_days(100)
+
+    run_sync(scenario)
+    store.close()
+
+
+def test_corrupt_and_truncated_files(tmp_path):
+    path = tmp_path / "wave.bin"
+    path.write_bytes(b"")
+    # Left empty by an interrupted creation
+    store = GasUsageStore(str(path))
+    assert store.state() == (0, 0, 0.0)
+    store.close()
+
+    path.write_bytes(b"HGU1\x00")
+    with pytest.raises(ValueError, match="Not a gas usage file"):
+        GasUsageStore(str(path))
+    path.write_bytes(b"JUNK" + bytes(HEADER.size))
+    with pytest.raises(ValueError, match="Not a gas usage file"):
+        GasUsageStore(str(path))
+
+    path.unlink()
+    store = GasUsageStore(str(path))
+
+    async def scenario(reader, endpoint, batches):
+        add_days(endpoint, 100)
+        await sync_gas_usage(reader, store, window=4)
+        store.close()
+        # Records cut off in the middle of page 2, the state still covers pages 1 to 3
+        with open(path, "r+b") as stream:
+            stream.truncate(HEADER.size + 40 * RECORD.size + 7)
+        truncated = GasUsageStore(str(path))
+        assert truncated.state().pointer == 0 and list(truncated.days()) == []
+        result = await sync_gas_usage(reader, truncated, window=4)
+        assert result.pages == [1, 2, 3, 4]
+        assert stored_days(truncated) == expected_days(100)
+        truncated.close()
+
+    run_sync(scenario)
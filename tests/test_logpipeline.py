@@ -0,0 +1,35 @@
+import logging
+
+from lib.heathub.logpipeline import LogPipeline
+from lib.heathub.logstore import SegmentedLogStore
+
+
+def test_flush_writes_queued_records(tmp_path):
+    store = SegmentedLogStore(str(tmp_path))
+    pipeline = LogPipeline(store)
+    pipeline.log(logging.INFO, "first", device="app", log_type="info")
+    pipeline.log(logging.ERROR, "second", device="wave", log_type="error")
+    pipeline.flush()
+
+    records = store.all()
+    assert [(r["message"], r["device"], r["type"]) for r in records] == [
+        ("first", "app", "info"),
+        ("second", "wave", "error"),
+    ]
+    pipeline.close()
+
+
+def test_writer_failure_is_logged(tmp_path, caplog):
+    store = SegmentedLogStore(str(tmp_path))
+
+    def fail(lines):
+        raise OSError("disk full")
+
+    store.append_lines = fail
+    pipeline = LogPipeline(store)
+    with caplog.at_level(logging.ERROR, logger="lib.heathub.logpipeline"):
+        pipeline.log(logging.INFO, "lost", device="app", log_type="info")
+        pipeline.flush()
+
+    assert "Failed to save 1 log entries: disk full" in caplog.text
+    pipeline.close()
@@ -0,0 +1,54 @@
+from lib.heathub import logstore
+from lib.heathub.logstore import SegmentedLogStore
+
+
+def record(day, hour, device="app", log_type="info", message=""):
+    return {"date": f"2026-01-{day:02d} {hour:02d}:00:00", "device": device,
+            "type": log_type, "message": message or f"{day}-{hour}"}
+
+
+def fill(store, days=3):
+    for day in range(1, days + 1):
+        for hour in range(24):
+            store.append(record(day, hour, device="wave" if hour % 2 else "app",
+                                log_type="error" if hour == 12 else "info"))
+
+
+def test_pages_walk_back_across_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(logstore, "SEGMENT_MAX_BYTES", 1024)
+    store = SegmentedLogStore(str(tmp_path))
+    fill(store)
+    assert len(store.segment_seqs()) > 3
+
+    messages, cursor = [], None
+    while True:
+        page, cursor = store.page(10, cursor)
+        assert len(page) <= 10
+        messages += [entry["message"] for entry in page]
+        if cursor is None:
+            break
+    expected = [f"{day}-{hour}" for day in range(1, 4) for hour in range(24)]
+    assert messages == expected[::-1]
+    assert [entry["message"] for entry in store.all()] == expected
+
+
+def test_filters(tmp_path, monkeypatch):
+    monkeypatch.setattr(logstore, "SEGMENT_MAX_BYTES", 1024)
+    store = SegmentedLogStore(str(tmp_path))
+    fill(store)
+
+    errors, cursor = store.page(50, log_type="error")
+    assert [entry["message"] for entry in errors] == ["3-12", "2-12", "1-12"]
+    assert cursor is None
+
+    day, _ = store.page(50, start="2026-01-02 00:00:00", end="2026-01-02 23:59:59", device="app")
+    assert [entry["message"] for entry in day] == [f"2-{hour}" for hour in range(22, -1, -2)]
+    assert list(store.query(start="2026-01-03 23:00:00")) == [record(3, 23, device="wave")]
+
+
+def test_partial_last_line_is_skipped(tmp_path):
+    store = SegmentedLogStore(str(tmp_path))
+    store.append(record(1, 0))
+    with open(store._segment_path(store.segment_seqs()[-1]), "a") as stream:
+        stream.write('{"date": "2026-01-01 01:00')
+    assert store.all() == [record(1, 0)]
@@ -0,0 +1,54 @@
+import math
+
+from lib.heathub.metrics import Metrics
+
+
+def test_render_counters_gauges_and_special_values(tmp_path):
+    metrics = Metrics(str(tmp_path / "metrics.json"))
+    metrics.inc("heathub_requests_total", source="wave")
+    metrics.inc("heathub_requests_total", 2, source="wave")
+    metrics.set("heathub_temperature", 20.5, device='living "room"\\\nA')
+    metrics.set("heathub_supply", math.nan)
+    metrics.set("heathub_upper", math.inf)
+    metrics.set("heathub_lower", -math.inf)
+    metrics.flush()
+
+    assert metrics.render().splitlines() == [
+        "# TYPE heathub_requests_total counter",
+        'heathub_requests_total{source="wave"} 3',
+        "# TYPE heathub_lower gauge",
+        "heathub_lower -Inf",
+        "# TYPE heathub_supply gauge",
+        "heathub_supply NaN",
+        "# TYPE heathub_temperature gauge",
+        'heathub_temperature{device="living \\"room\\"\\\\\\nA"} 20.5',
+        "# TYPE heathub_upper gauge",
+        "heathub_upper +Inf",
+    ]
+
+
+def test_render_histogram(tmp_path):
+    metrics = Metrics(str(tmp_path / "metrics.json"))
+    for value in (0.004, 0.02, 0.02, 0.3, 60.0):
+        metrics.observe("heathub_stage_seconds", value, stage="wave")
+    metrics.flush()
+    lines = metrics.render().splitlines()
+
+    assert lines[0] == "# TYPE heathub_stage_seconds histogram"
+    buckets = {}
+    for line in lines[1:-2]:
+        labels, count = line.split(" ")
+        assert labels.startswith('heathub_stage_seconds_bucket{stage="wave",le="')
+        buckets[labels.split('le="')[1][:-2]] = int(count)
+    # Cumulative counts per upper bound, +Inf last and equal to the count
+    assert list(buckets)[-1] == "+Inf"
+    assert buckets["0.005"] == 1 and buckets["0.025"] == 3 and buckets["0.25"] == 3
+    assert buckets["0.5"] == 4 and buckets["30.0"] == 4 and buckets["+Inf"] == 5
+    assert list(buckets.values()) == sorted(buckets.values())
+    assert lines[-2] == 'heathub_stage_seconds_sum{stage="wave"} %r' % (0.004 + 0.02 + 0.02 + 0.3 + 60.0)
+    assert lines[-1] == 'heathub_stage_seconds_count{stage="wave"} 5'
+
+    # A second flush adds to the totals
+    metrics.observe("heathub_stage_seconds", 1.0, stage="wave")
+    metrics.flush()
+    assert metrics.render().splitlines()[-1] == 'heathub_stage_seconds_count{stage="wave"} 6'
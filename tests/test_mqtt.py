@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from bench.fakes import FakeMqttBroker
+from lib.heathub.bathroom.mqtt import MqttError, MqttWebSocketClient, encode_length
+
+TOPIC = "$aws/things/button/shadow/update/documents"
+
+
+def test_encode_length():
+    assert encode_length(0) == b"\x00"
+    assert encode_length(127) == b"\x7f"
+    assert encode_length(128) == b"\x80\x01"
+    assert encode_length(16383) == b"\xff\x7f"
+    assert encode_length(2097152) == b"\x80\x80\x80\x01"
+
+
+def run_with_broker(scenario):
+    async def run():
+        broker = FakeMqttBroker()
+        await broker.start()
+        try:
+            await asyncio.wait_for(scenario(broker), 5)
+        finally:
+            await broker.stop()
+
+    asyncio.run(run())
+
+
+def test_subscribe_and_receive():
+    async def scenario(broker):
+        client = MqttWebSocketClient(broker.ws_url, "client-1")
+        await client.connect()
+        await client.subscribe(TOPIC)
+        assert broker.client_ids == ["client-1"]
+
+        assert await broker.publish(TOPIC, b'{"n": 1}') == 1
+        assert await broker.publish(TOPIC, b"x" * 300, qos=0) == 1
+        assert await broker.publish("other/topic", b"ignored") == 0
+        messages = client.messages()
+        assert await messages.__anext__() == (TOPIC, b'{"n": 1}')
+        assert await messages.__anext__() == (TOPIC, b"x" * 300)
+        await client.close()
+        # The QoS 1 message was acknowledged, the QoS 0 one needs no PUBACK
+        assert broker.acked == [1]
+
+    run_with_broker(scenario)
+
+
+def test_refused_subscription():
+    async def scenario(broker):
+        broker.refused_topics.add(TOPIC)
+        client = MqttWebSocketClient(broker.ws_url, "client-1")
+        await client.connect()
+        with pytest.raises(MqttError):
+            await client.subscribe(TOPIC)
+        await client.close()
+
+    run_with_broker(scenario)
+
+
+def test_keepalive_and_dropped_connection():
+    async def scenario(broker):
+        client = MqttWebSocketClient(broker.ws_url, "client-1", keepalive=1)
+        await client.connect()
+        await client.subscribe(TOPIC)
+
+        async def consume():
+            async for _ in client.messages():
+                pass
+
+        # PINGRESPs are read along with the messages
+        reader = asyncio.ensure_future(consume())
+        await asyncio.sleep(1.2)
+        assert broker.pings >= 2
+        assert client.is_alive()
+
+        await broker.drop()
+        with pytest.raises(ConnectionError):
+            await reader
+        await client.close()
+
+    run_with_broker(scenario)
+
+
+def test_unanswered_keepalive_closes_the_connection():
+    async def scenario(broker):
+        client = MqttWebSocketClient(broker.ws_url, "client-1", keepalive=1)
+        await client.connect()
+        await client.subscribe(TOPIC)
+        assert client.is_alive()
+
+        # Half-open: the connection stays up but nothing comes back
+        broker.silent = True
+        with pytest.raises(ConnectionError):
+            async for _ in client.messages():
+                pass
+        assert not client.is_alive()
+        await client.close()
+
+    run_with_broker(scenario)
+
+
+def test_handshake_timeouts():
+    async def scenario(broker):
+        broker.silent = True
+        client = MqttWebSocketClient(broker.ws_url, "client-1", response_timeout=0.1)
+        with pytest.raises(MqttError, match="CONNACK"):
+            await client.connect()
+        await client.close()
+
+        broker.silent = False
+        client = MqttWebSocketClient(broker.ws_url, "client-2", response_timeout=0.1)
+        await client.connect()
+        broker.silent = True
+        with pytest.raises(MqttError, match="SUBACK"):
+            await client.subscribe(TOPIC)
+        await client.close()
+
+    run_with_broker(scenario)
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("slixmpp")
+
+from lib.heathub.reconciler import (  # noqa: E402
+    CONFIRMATION_GRACE_SECONDS,
+    STATE_COMMANDED,
+    STATE_CONFIRMED,
+    STATE_CONFIRMED_AT,
+    WaveReconciler,
+)
+
+
+class FakeWave:
+    def __init__(self, set_point, reject=False):
+        self.status = SimpleNamespace(set_point=set_point)
+        self.reject = reject
+        self.writes = []
+
+    async def set_temperature(self, set_point):
+        self.writes.append(set_point)
+        if self.reject:
+            raise ValueError("rejected")
+
+
+def test_matching_set_point_is_not_written():
+    wave = FakeWave(21.0)
+    reconciler = WaveReconciler(wave, {})
+    reconciler.request(21.0)
+    assert asyncio.run(reconciler.reconcile(1.0)) is None
+    assert wave.writes == []
+
+
+def test_last_request_is_written_once():
+    wave = FakeWave(18.0)
+    reconciler = WaveReconciler(wave, {})
+    reconciler.request(20.0)
+    reconciler.request(21.0)
+    assert asyncio.run(reconciler.reconcile(1.0)) == 21.0
+    assert wave.writes == [21.0]
+    assert wave.status.set_point == 21.0
+    assert reconciler.state[STATE_COMMANDED] == reconciler.state[STATE_CONFIRMED] == 21.0
+    assert not reconciler.needs_write()
+
+
+def test_recent_confirmation_covers_a_stale_status():
+    state = {STATE_CONFIRMED: 21.0, STATE_CONFIRMED_AT: time.time()}
+    reconciler = WaveReconciler(FakeWave(18.0), state)
+    reconciler.request(21.0)
+    assert not reconciler.needs_write()
+    assert reconciler.needs_write(now=time.time() + CONFIRMATION_GRACE_SECONDS)
+
+
+def test_rejected_write_is_not_confirmed():
+    wave = FakeWave(18.0, reject=True)
+    reconciler = WaveReconciler(wave, {})
+    reconciler.request(21.0)
+    with pytest.raises(ValueError):
+        asyncio.run(reconciler.reconcile(1.0))
+    assert reconciler.state[STATE_COMMANDED] == 21.0
+    assert reconciler.state[STATE_CONFIRMED] is None
+    assert wave.status.set_point == 18.0
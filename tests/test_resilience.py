@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from lib.heathub.resilience import (
+    BREAKER_RESET_TIMEOUT_MAX,
+    CircuitBreaker,
+    RetryPolicy,
+    TransientError,
+    call_with_retries,
+)
+
+FAST = RetryPolicy(attempts=3, retry_on=(TransientError,), backoff_base=0.01, backoff_cap=0.01)
+
+
+def flaky(failures, error=TransientError):
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise error("down")
+        return "value"
+
+    return fetch, calls
+
+
+def test_retries_until_success():
+    fetch, calls = flaky(2)
+    retried = []
+    result = asyncio.run(call_with_retries(fetch, 1.0, FAST, lambda n, e: retried.append(n)))
+    assert result == ("value", 3)
+    assert retried == [1, 2]
+
+
+def test_gives_up_after_the_last_attempt():
+    fetch, calls = flaky(5)
+    with pytest.raises(TransientError):
+        asyncio.run(call_with_retries(fetch, 1.0, FAST))
+    assert len(calls) == 3
+
+
+def test_other_errors_are_not_retried():
+    fetch, calls = flaky(1, error=ValueError)
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_retries(fetch, 1.0, FAST))
+    assert len(calls) == 1
+
+
+def test_hung_attempt_leaves_time_for_another():
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+        return "value"
+
+    assert asyncio.run(call_with_retries(fetch, 0.6, FAST)) == ("value", 2)
+
+
+def test_deadline():
+    async def fetch():
+        await asyncio.sleep(10)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(call_with_retries(fetch, 0.1, FAST))
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=60)
+    assert breaker.record_failure(now=0) is False
+    assert breaker.record_failure(now=1) is False
+    assert breaker.record_failure(now=2) is True
+    assert not breaker.allow(now=61)
+    assert breaker.allow(now=62)
+
+
+def test_failed_probe_doubles_the_timeout():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=600)
+    breaker.record_failure(now=0)
+    # Failed probe, the breaker stays open but was not opened by it
+    assert breaker.record_failure(now=600) is False
+    assert breaker.reset_timeout == BREAKER_RESET_TIMEOUT_MAX
+    assert not breaker.allow(now=600 + BREAKER_RESET_TIMEOUT_MAX - 1)
+
+    breaker.record_success()
+    assert breaker.state == {"failures": 0, "opened_at": None, "reset_timeout": 600}
+
+
+def test_state_round_trip():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+    breaker.record_failure(now=0)
+    breaker.record_failure(now=10)
+    restored = CircuitBreaker(breaker.state, threshold=2, reset_timeout=60)
+    assert restored.is_open(now=20)
+    assert restored.failures == 2
@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+from bench.fakes import FakeMqttBroker
+from lib.heathub.bathroom import subscription
+from lib.heathub.bathroom.salus import SmartButton
+from lib.heathub.bathroom.subscription import ShadowSubscription
+from lib.heathub.config import SalusConfig
+
+THING = "button"
+
+
+def shadow(up, down, reported=None):
+    return {
+        "state": {"reported": {"11": {"properties": reported or {}}}},
+        "metadata": {"reported": {"11": {"properties": {
+            "ep2:sButtonS:ButtonPressed": {"timestamp": up},
+            "ep3:sButtonS:ButtonPressed": {"timestamp": down},
+        }}}},
+    }
+
+
+async def until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def make_button(broker, seeds, triggers):
+    button = SmartButton(SalusConfig(
+        account_device_button_bathroom_id=THING,
+        account_iot_mqtt_url=broker.ws_url,
+        account_username="user",
+        account_identity_id="identity",
+    ))
+
+    async def fetch_shadow():
+        return seeds.pop(0)
+
+    button.fetch_shadow = fetch_shadow
+    button.start_subscription(on_change=lambda: triggers.append(button.presses))
+    return button
+
+
+def test_cycle_runs_only_on_new_presses():
+    async def scenario():
+        broker = FakeMqttBroker()
+        await broker.start()
+        triggers = []
+        button = make_button(broker, [shadow(100, 50)], triggers)
+        try:
+            await asyncio.wait_for(until(button.subscription.is_live), 5)
+            topic = button.subscription.topic
+
+            # A reported property changes, the presses stay the same
+            document = shadow(100, 50, {"ep1:sBasicS:Battery": 80})
+            await broker.publish(topic, json.dumps({"current": document}).encode())
+            await asyncio.wait_for(until(lambda: button.subscription.document == document), 5)
+            assert triggers == []
+
+            await broker.publish(topic, json.dumps({"current": shadow(200, 50)}).encode())
+            await asyncio.wait_for(until(lambda: triggers), 5)
+            assert triggers == [(200, 50)]
+        finally:
+            await button.close()
+            await broker.stop()
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_drops_and_reseeds_the_shadow(monkeypatch):
+    monkeypatch.setattr(subscription, "RECONNECT_DELAY_MIN", 0.01)
+
+    async def scenario():
+        broker = FakeMqttBroker()
+        await broker.start()
+        triggers = []
+        # The button was pressed while the connection was down
+        button = make_button(broker, [shadow(100, 50), shadow(300, 50)], triggers)
+        try:
+            await asyncio.wait_for(until(button.subscription.is_live), 5)
+            await broker.drop()
+            await asyncio.wait_for(until(lambda: not button.subscription.is_live()), 5)
+            assert button.subscription.document is None
+
+            await asyncio.wait_for(until(button.subscription.is_live), 5)
+            assert len(broker.client_ids) == 2
+            assert triggers == [(300, 50)]
+        finally:
+            await button.close()
+            await broker.stop()
+
+    asyncio.run(scenario())
+
+
+def test_subscription_without_seed():
+    async def scenario():
+        broker = FakeMqttBroker()
+        await broker.start()
+        updates = []
+
+        async def get_url():
+            return broker.ws_url
+
+        sub = ShadowSubscription(THING, get_url, updates.append)
+        sub.start()
+        try:
+            await asyncio.wait_for(broker.subscribed.wait(), 5)
+            await asyncio.wait_for(until(lambda: sub.connected), 5)
+            assert not sub.is_live()
+            await broker.publish(sub.topic, json.dumps({"current": shadow(1, 2)}).encode())
+            await asyncio.wait_for(until(sub.is_live), 5)
+            assert updates == [shadow(1, 2)]
+        finally:
+            await sub.stop()
+            await broker.stop()
+
+    asyncio.run(scenario())
+
+
+def test_silent_broker_ends_the_live_shadow():
+    async def scenario():
+        broker = FakeMqttBroker()
+        await broker.start()
+
+        async def get_url():
+            return broker.ws_url
+
+        async def get_document():
+            return shadow(1, 2)
+
+        sub = ShadowSubscription(THING, get_url, get_document=get_document, keepalive=1)
+        sub.start()
+        try:
+            await asyncio.wait_for(until(sub.is_live), 5)
+            # A half-open connection: no error, but no PINGRESP either
+            broker.silent = True
+            await asyncio.wait_for(until(lambda: not sub.is_live()), 3)
+            # The connection is given up and the shadow dropped with it
+            await asyncio.wait_for(until(lambda: not sub.connected), 3)
+            assert sub.document is None
+        finally:
+            await sub.stop()
+            await broker.stop()
+
+    asyncio.run(scenario())
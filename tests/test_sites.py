@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("slixmpp")
+pytest.importorskip("pyit600")
+
+import cron  # noqa: E402
+from lib.heathub.config import Config  # noqa: E402
+from lib.heathub.timeseries import TimeSeriesStore  # noqa: E402
+from lib.heathub.utils import FlagManager, LogManager  # noqa: E402
+
+DEVICE = {
+    "salus": {"gateway_host": "127.0.0.1", "gateway_euid": "0000000000000000"},
+    "wave": {"serial_number": "123456789", "access_code": "abcdefghijklmnop", "password": "test"},
+}
+
+
+def sites_config(names, **app):
+    return Config.from_dict({"app": app, "sites": [dict(DEVICE, name=name) for name in names]})
+
+
+class FakePool:
+    def __init__(self, config):
+        self.sites = {site.name: SimpleNamespace(site=site) for site in config.get_sites()}
+
+    async def apply_config(self):
+        pass
+
+    def get(self, name):
+        return self.sites[name]
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    # Flags, logs and series of the cycle go to tmp_path
+    monkeypatch.setattr(cron, "flag_manager", FlagManager(str(tmp_path / "flags.json")))
+    monkeypatch.setattr(cron, "log_manager", LogManager(str(tmp_path / "logs")))
+    monkeypatch.setattr(cron, "timeseries_store", TimeSeriesStore(str(tmp_path / "timeseries")))
+    monkeypatch.setattr(cron.metrics, "flush", lambda: None)
+    return cron
+
+
+def run_main(monkeypatch, config, run_cycle):
+    monkeypatch.setattr(cron.config_store, "get", lambda: config)
+    monkeypatch.setattr(cron, "run_cycle", run_cycle)
+    asyncio.run(cron.main(FakePool(config)))
+
+
+def test_sites_run_concurrently_up_to_the_limit(stores, monkeypatch):
+    running, peak, done = set(), [0], []
+
+    async def run_cycle(resources, config, flags):
+        running.add(resources.site.name)
+        peak[0] = max(peak[0], len(running))
+        await asyncio.sleep(0.05)
+        running.discard(resources.site.name)
+        done.append(resources.site.name)
+
+    names = [f"site{index}" for index in range(5)]
+    run_main(monkeypatch, sites_config(names, max_concurrent_sites=2), run_cycle)
+    assert sorted(done) == names
+    assert peak[0] == 2
+
+
+def test_failing_site_leaves_the_others_alone(stores, monkeypatch):
+    async def run_cycle(resources, config, flags):
+        flags["last_date_heat_on"] = resources.site.name
+        if resources.site.name == "cabin":
+            raise RuntimeError("gateway unreachable")
+
+    run_main(monkeypatch, sites_config(["home", "cabin"]), run_cycle)
+    flags = stores.flag_manager.get_flags()
+    assert flags["home.last_date_heat_on"] == "home"
+    # Flags set before the failure are still committed under the site's prefix
+    assert flags["cabin.last_date_heat_on"] == "cabin"
+    errors = [log for log in stores.log_manager.get_logs() if log["type"] == "error"]
+    assert [(log["device"], log["message"]) for log in errors] == [
+        ("cabin.app", "Site cabin cycle failed: gateway unreachable")
+    ]
+
+
+def test_single_site_failure_fails_the_cycle(stores, monkeypatch):
+    async def run_cycle(resources, config, flags):
+        raise RuntimeError("gateway unreachable")
+
+    with pytest.raises(RuntimeError):
+        run_main(monkeypatch, sites_config(["home"]), run_cycle)
+
+
+def test_flags_are_scoped_per_site(stores, monkeypatch):
+    async def run_cycle(resources, config, flags):
+        flags["last_date_heat_on"] = resources.site.name
+
+    run_main(monkeypatch, sites_config(["home", "cabin"]), run_cycle)
+    run_main(monkeypatch, Config.from_dict(DEVICE), run_cycle)
+    flags = stores.flag_manager.get_flags()
+    assert {key: value for key, value in flags.items() if key != "last_date_app_run"} == {
+        "home.last_date_heat_on": "home",
+        "cabin.last_date_heat_on": "cabin",
+        "last_date_heat_on": "default",
+    }
+    _, cabin = sites_config(["home", "cabin"]).get_sites()
+    assert cron.get_site_flags(cabin) == {"last_date_heat_on": "cabin"}
+
+
+def test_series_are_scoped_per_site(stores):
+    async def update():
+        pass
+
+    status = SimpleNamespace(current_temp=20.5, set_point=21.0, boiler_on=1, update=update)
+    wave = SimpleNamespace(session=SimpleNamespace(), status=status)
+    for site in sites_config(["home", "cabin"]).get_sites():
+        resources = SimpleNamespace(site=site, get_wave=lambda: wave)
+        assert asyncio.run(cron.fetch_wave(resources, 5.0)) is wave
+        assert wave.session.attempt_budget == 5.0
+
+    assert stores.timeseries_store.devices() == ["cabin.wave", "home.wave"]
+    _, [sample] = stores.timeseries_store.query("cabin.wave", 0, 2 ** 31, resolution=0)
+    assert (sample.current, sample.target, sample.active) == (20.5, 21.0, 1.0)
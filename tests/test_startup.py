@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from bench.startup import cron_import_time, fastest, lazy_modules_loaded
+
+# Cumulative `import cron` time of a cold start; HEATHUB_IMPORT_BUDGET
+# overrides it on slow machines
+IMPORT_BUDGET_SECONDS = float(os.environ.get("HEATHUB_IMPORT_BUDGET", 1.0))
+
+
+@pytest.fixture(scope="module")
+def cron_imports():
+    pytest.importorskip("slixmpp")
+    pytest.importorskip("pyit600")
+    return fastest("cron", runs=3)
+
+
+def test_aws_sdks_stay_lazy(cron_imports):
+    # Only the smart button needs them, and only once it is used
+    assert lazy_modules_loaded(cron_imports) == []
+
+
+def test_cron_import_budget(cron_imports):
+    assert cron_import_time(cron_imports, "cron") <= IMPORT_BUDGET_SECONDS
@@ -0,0 +1,68 @@
+import math
+import os
+
+from lib.heathub.timeseries import RingSeries, Sample, TimeSeriesStore
+
+RESOLUTIONS = [(0, 100), (900, 20), (3600, 20)]
+
+
+def test_ring_keeps_the_newest_samples(tmp_path):
+    series = RingSeries(str(tmp_path / "ring.bin"), 4)
+    for timestamp in range(10):
+        series.append(Sample(timestamp, float(timestamp), 0.0, 0.0))
+    assert len(series) == 4
+    assert [sample.timestamp for sample in series.range(0, 100)] == [6, 7, 8, 9]
+    assert [sample.timestamp for sample in series.range(7, 9)] == [7, 8]
+    assert series.last().timestamp == 9
+    series.close()
+
+    # Reopening keeps the samples
+    assert [s.timestamp for s in RingSeries(str(tmp_path / "ring.bin"), 4).range(0, 100)] == [6, 7, 8, 9]
+
+
+def test_rollups(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), RESOLUTIONS)
+    # Two 15 min buckets of samples every 90 s, heating in the first one only
+    for index in range(21):
+        timestamp = index * 90
+        store.record("wave", timestamp, 20.0 + (timestamp >= 900), 21.0, timestamp < 900)
+    # Out of order samples are dropped
+    store.record("wave", 0, 30.0, 30.0, False)
+
+    resolution, samples = store.query("wave", 0, 3600, resolution=900)
+    assert resolution == 900
+    assert samples == [Sample(0, 20.0, 21.0, 1.0), Sample(900, 21.0, 21.0, 0.0)]
+    assert store.query("wave", 0, 3600, resolution=0)[1][0] == Sample(0, 20.0, 21.0, 1.0)
+    assert store.devices() == ["wave"]
+
+
+def test_missing_values_are_nan(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), RESOLUTIONS)
+    store.record("salus-zone 1", 100, None, 21.0, None)
+    _, [sample] = store.query("salus-zone 1", 0, 200, resolution=0)
+    assert math.isnan(sample.current) and math.isnan(sample.active)
+    assert store.devices() == ["salus-zone_1"]
+
+
+def test_pick_resolution(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), RESOLUTIONS)
+    now = 1_000_000
+    assert store.pick_resolution(now - 100 * 90, now) == 0
+    assert store.pick_resolution(now - 11 * 900, now) == 900
+    assert store.pick_resolution(now - 21 * 900, now) == 3600
+    assert store.pick_resolution(0, now) == 3600
+
+
+def test_queries_only_read(tmp_path):
+    writer = TimeSeriesStore(str(tmp_path), RESOLUTIONS)
+    writer.record("wave", 0, 20.0, 21.0, True)
+    # Queries run in another process, e.g. the dashboard
+    reader = TimeSeriesStore(str(tmp_path), RESOLUTIONS)
+    assert reader.query("wave", 0, 3600, resolution=3600) == (3600, [])
+    assert sorted(os.listdir(tmp_path / "wave")) == ["0.bin"]
+    assert reader.query("wave", 0, 3600, resolution=0)[1] == [Sample(0, 20.0, 21.0, 1.0)]
+
+    # Samples appended later are seen through the open series
+    writer.record("wave", 90, 20.5, 21.0, False)
+    writer.flush()
+    assert [sample.timestamp for sample in reader.query("wave", 0, 3600, resolution=0)[1]] == [0, 90]
@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import json
+
+import pytest
+
+pytest.importorskip("Crypto")
+
+from Crypto.Cipher import AES
+
+from lib.wave.codec import BLOCK_SIZE, STATUS_PATH, WaveCodec
+from lib.wave.utils import secret
+
+ACCESS_CODE = "abcdefghijklmnop"
+PASSWORD = "secretpassword"
+# Key and ciphertexts for ACCESS_CODE and PASSWORD
+KEY = bytes.fromhex("440bbcf8cbc27a10baa2e6cc2a36586673e53997dbba50fc2a04c82892f3dcf7")
+VECTORS = [
+    (b'{"value":21.5}', b"ly6K1Nb6OzfxJD/7+DrvSA=="),
+    # A block-aligned payload gets no padding block
+    (b"0123456789abcdef", b"sfg7D+kdOTs7xbE/552CsA=="),
+]
+STATUS_VALUE = {
+    "TSP": "21.0", "IHT": "20.5", "DHW": "on", "UMD": "clock", "TOD": "0",
+    "CSP": "21.0", "TOR": "off", "HMD": "off", "DAS": "off", "TAS": "off",
+    "BAI": "CH",
+}
+
+
+@pytest.fixture
+def codec():
+    return WaveCodec(ACCESS_CODE, PASSWORD)
+
+
+def reply(codec, document):
+    # Frame a reply the way the thermostat does.
+    payload = codec.encrypt(json.dumps(document).encode()).decode("ascii")
+    return "HTTP/1.0 200 OK\nContent-Type: application/json\n\n%s\n\n" % payload
+
+
+def test_key_derivation(codec):
+    expected = (hashlib.md5(ACCESS_CODE.encode() + secret).digest()
+                + hashlib.md5(secret + PASSWORD.encode()).digest())
+    assert codec.key == expected == KEY
+
+
+@pytest.mark.parametrize("plain, encrypted", VECTORS)
+def test_known_vectors(codec, plain, encrypted):
+    assert codec.encrypt(plain) == encrypted
+    assert codec.decrypt(encrypted) == plain
+    assert codec.decrypt(encrypted.decode("ascii")) == plain
+
+
+def test_matches_plain_aes(codec):
+    # Zero padded ECB, as every Wave client does it
+    data = b'{"value":"clock"}'
+    padded = data + b"\x00" * (-len(data) % BLOCK_SIZE)
+    assert codec.encrypt(data) == base64.b64encode(AES.new(KEY, AES.MODE_ECB).encrypt(padded))
+
+
+@pytest.mark.parametrize("length", range(0, 3 * BLOCK_SIZE + 1))
+def test_round_trip(codec, length):
+    data = b"x" * length
+    encrypted = codec.encrypt(data)
+    assert len(base64.b64decode(encrypted)) == -(-length // BLOCK_SIZE) * BLOCK_SIZE
+    assert codec.decrypt(encrypted) == data
+
+
+@pytest.mark.parametrize("value", [21.5, 17, "on", "clock", True])
+def test_build_put(codec, value):
+    msg = codec.build_put("/heatingCircuits/hc1/temperatureRoomManual", value)
+    assert codec.parse_request_line(msg) == ("PUT", "/heatingCircuits/hc1/temperatureRoomManual")
+    payload = msg.rstrip("\n").rsplit("\n", 1)[1]
+    assert "Content-Length: %d\n" % len(payload) in msg
+    assert json.loads(codec.decrypt(payload)) == {"value": value}
+
+
+def test_build_get(codec):
+    assert codec.parse_request_line(codec.build_get()) == ("GET", STATUS_PATH)
+    assert codec.parse_request_line("") == (None, None)
+
+
+def test_parse_reply(codec):
+    document = {"id": STATUS_PATH, "value": STATUS_VALUE}
+    assert codec.parse_reply(reply(codec, document)) == document
+    assert codec.parse_reply("HTTP/1.0 204 No Content\n\n") is None
+    assert codec.parse_reply("HTTP/1.0 400 Bad Request") is None
+    assert codec.parse_reply("HTTP/1.0 200 OK\n\nnot base64!\n\n") is None
+    assert codec.is_no_content("HTTP/1.0 204 No Content\n\n")
+    assert codec.is_bad_request("HTTP/1.0 400 Bad Request")
@@ -0,0 +1,120 @@
+import asyncio
+import random
+
+import pytest
+
+pytest.importorskip("Crypto")
+pytest.importorskip("slixmpp")
+
+from bench.fakes import Behaviour, FakeWaveEndpoint  # noqa: E402
+from lib.wave.ReadBot import (  # noqa: E402
+    ACTIVE_PROGRAM_PATH,
+    OUTDOOR_TEMP_PATH,
+    SUPPLY_TEMP_PATH,
+    SYSTEM_PRESSURE_PATH,
+)
+from lib.wave.WaveThermo import WaveThermo  # noqa: E402
+
+MISSING_PATH = "/does/not/exist"
+
+
+def run_with_endpoint(scenario, latency=0.01):
+    async def run():
+        wave = WaveThermo(serial_number="123456789", access_code="abcdefghijklmnop", password="test")
+        wave.session.request_timeout = 0.5
+        endpoint = FakeWaveEndpoint(Behaviour(latency, 0.5, 0.0), random.Random(1))
+        endpoint.attach(wave.session)
+        try:
+            await scenario(wave, endpoint)
+        finally:
+            endpoint.detach()
+            await wave.close()
+
+    asyncio.run(run())
+
+
+def hold_replies(wave, endpoint):
+    # Keep the replies instead of delivering them, the test hands them over.
+    held = []
+    wave.session.send_message = lambda mto, mbody, mtype: held.append(
+        (endpoint.session.codec.parse_request_line(mbody)[1], endpoint.reply(mbody)))
+    return held
+
+
+async def until_held(held, count):
+    while len(held) < count:
+        await asyncio.sleep(0)
+
+
+def test_diagnostics_in_one_batch():
+    async def scenario(wave, endpoint):
+        snapshot = await wave.diagnostics()
+        assert snapshot.current_temp == 20.5 and snapshot.set_point == 20.0
+        assert snapshot.boiler_on == 0 and snapshot.program_mode == "clock"
+        assert (snapshot.outdoor_temp, snapshot.supply_temp, snapshot.system_pressure) == (8.5, 46.0, 1.6)
+        assert snapshot.active_program == 1
+        assert wave.status.current_temp == 20.5
+        assert all(count == 1 for count in endpoint.requests.values())
+
+    run_with_endpoint(scenario)
+
+
+def test_missing_and_rejected_resources():
+    async def scenario(wave, endpoint):
+        readings = await wave.read([MISSING_PATH, SUPPLY_TEMP_PATH])
+        assert not readings[MISSING_PATH].ok and readings[MISSING_PATH].value is None
+        assert readings[SUPPLY_TEMP_PATH].ok and readings[SUPPLY_TEMP_PATH].unit == "C"
+
+        # A rejected read and a value that is no number
+        reply = endpoint.reply
+        endpoint.reply = lambda mbody: (
+            "HTTP/1.0 400 Bad Request\n\n" if OUTDOOR_TEMP_PATH in mbody else reply(mbody))
+        endpoint.resources[SYSTEM_PRESSURE_PATH] = ("n/a", "bar", "floatValue")
+        snapshot = await wave.diagnostics()
+        assert snapshot.outdoor_temp is None and snapshot.system_pressure is None
+        assert snapshot.supply_temp == 46.0 and snapshot.current_temp == 20.5
+
+    run_with_endpoint(scenario)
+
+
+def test_lost_reply_only_fails_its_resource():
+    async def scenario(wave, endpoint):
+        send = wave.session.send_message
+        wave.session.send_message = lambda mto, mbody, mtype: (
+            None if SUPPLY_TEMP_PATH in mbody else send(mto, mbody, mtype))
+        readings = await wave.read([OUTDOOR_TEMP_PATH, SUPPLY_TEMP_PATH, SYSTEM_PRESSURE_PATH])
+        assert [readings[path].ok for path in readings] == [True, False, True]
+
+    run_with_endpoint(scenario)
+
+
+def test_replies_out_of_order():
+    async def scenario(wave, endpoint):
+        held = hold_replies(wave, endpoint)
+        paths = [OUTDOOR_TEMP_PATH, SUPPLY_TEMP_PATH, SYSTEM_PRESSURE_PATH, ACTIVE_PROGRAM_PATH]
+        read = asyncio.ensure_future(wave.read(paths))
+        await until_held(held, len(paths))
+        for _, body in reversed(held):
+            wave.session.message({"body": body})
+        readings = await read
+        assert {path: reading.value for path, reading in readings.items()} == {
+            OUTDOOR_TEMP_PATH: 8.5, SUPPLY_TEMP_PATH: 46.0,
+            SYSTEM_PRESSURE_PATH: 1.6, ACTIVE_PROGRAM_PATH: 1.0,
+        }
+
+    run_with_endpoint(scenario)
+
+
+def test_out_of_order_not_found_never_gives_a_wrong_value():
+    async def scenario(wave, endpoint):
+        held = hold_replies(wave, endpoint)
+        read = asyncio.ensure_future(wave.read([OUTDOOR_TEMP_PATH, MISSING_PATH, SUPPLY_TEMP_PATH]))
+        await until_held(held, 3)
+        # The payloadless 404 overtakes the first reply and is taken for it
+        for index in (1, 0, 2):
+            wave.session.message({"body": held[index][1]})
+        readings = await read
+        assert not readings[OUTDOOR_TEMP_PATH].ok and not readings[MISSING_PATH].ok
+        assert readings[SUPPLY_TEMP_PATH].value == 46.0
+
+    run_with_endpoint(scenario)
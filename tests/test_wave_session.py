@@ -0,0 +1,153 @@
+import asyncio
+import gc
+import json
+
+import pytest
+
+pytest.importorskip("Crypto")
+pytest.importorskip("slixmpp")
+
+from lib.heathub.resilience import RetryPolicy, call_with_retries
+from lib.wave.StatusBot import StatusBot
+from lib.wave.WaveSession import WaveSession
+from lib.wave.codec import STATUS_PATH
+
+SERIAL = "123456789"
+ACCESS_CODE = "abcdefghijklmnop"
+PASSWORD = "test"
+STATUS = {"TSP": "20.0", "IHT": "19.5", "DHW": "on", "UMD": "clock", "TOD": "0", "CSP": "20.0",
+          "TOR": "off", "HMD": "off", "DAS": "off", "TAS": "off", "BAI": "CH"}
+
+
+def reply(session, document):
+    payload = session.codec.encrypt(json.dumps(document).encode()).decode("ascii")
+    return {"body": "HTTP/1.0 200 OK\nContent-Type: application/json\n\n%s" % payload}
+
+
+def connected_session():
+    session = WaveSession(SERIAL, ACCESS_CODE, PASSWORD)
+    session.request_timeout = 0.05
+    session.sent = []
+    session.send_message = lambda mto, mbody, mtype: session.sent.append(mbody)
+    session._ready.set()
+    return session
+
+
+async def until_sent(session, count):
+    while len(session.sent) < count:
+        await asyncio.sleep(0)
+
+
+def test_late_reply_of_abandoned_put_is_dropped():
+    async def scenario():
+        session = connected_session()
+        with pytest.raises(asyncio.TimeoutError):
+            await session.request(session.codec.build_put("/a", 1))
+
+        second = asyncio.ensure_future(session.request(session.codec.build_put("/b", 2)))
+        await until_sent(session, 2)
+        # The late answer to the first PUT must not resolve the second one
+        session.message({"body": "HTTP/1.0 400 Bad Request\n\n"})
+        await asyncio.sleep(0)
+        assert not second.done()
+        session.message({"body": "HTTP/1.0 204 No Content\n\n"})
+        assert "No Content" in await second
+
+    asyncio.run(scenario())
+
+
+def test_unmatched_reply_is_dropped():
+    async def scenario():
+        session = connected_session()
+        request = asyncio.ensure_future(session.request(session.codec.build_get(STATUS_PATH)))
+        await until_sent(session, 1)
+        session.message(reply(session, {"id": "/system/appliance/systemPressure", "value": 1.5}))
+        await asyncio.sleep(0)
+        assert not request.done()
+        session.message(reply(session, {"id": STATUS_PATH, "value": STATUS}))
+        assert STATUS_PATH in json.dumps(session.codec.parse_reply(await request))
+
+    asyncio.run(scenario())
+
+
+def test_status_update_rejects_bad_request():
+    async def scenario():
+        session = connected_session()
+        status = StatusBot(session, session.codec)
+
+        update = asyncio.ensure_future(status.update())
+        await until_sent(session, 1)
+        session.message(reply(session, {"id": STATUS_PATH, "value": STATUS}))
+        await update
+        assert status.current_temp == 19.5
+
+        update = asyncio.ensure_future(status.update())
+        await until_sent(session, 2)
+        session.message({"body": "HTTP/1.0 400 Bad Request\n\n"})
+        with pytest.raises(ValueError):
+            await update
+
+    asyncio.run(scenario())
+
+
+def test_session_is_the_only_xmpp_client():
+    import slixmpp
+
+    from lib.wave.WaveThermo import WaveThermo
+
+    async def scenario():
+        wave = WaveThermo(SERIAL, ACCESS_CODE, PASSWORD)
+        assert isinstance(wave.session, slixmpp.ClientXMPP)
+        for bot in (wave.status, wave.setter, wave.reader):
+            assert not isinstance(bot, slixmpp.ClientXMPP)
+            assert bot.session is wave.session and bot.codec is wave.session.codec
+
+    asyncio.run(scenario())
+
+
+def collect_unretrieved(loop):
+    # Exception handler calls for futures whose exception nobody retrieved
+    reports = []
+    loop.set_exception_handler(lambda loop, context: reports.append(context["message"]))
+    return reports
+
+
+def test_cancelled_request_leaves_no_unretrieved_exception():
+    async def scenario():
+        reports = collect_unretrieved(asyncio.get_running_loop())
+        session = connected_session()
+        session.request_timeout = 1
+        with pytest.raises(asyncio.TimeoutError):
+            # The caller gives up before the session's own timeout
+            await asyncio.wait_for(session.request(session.codec.build_get(STATUS_PATH)), 0.01)
+        session._fail_pending(ConnectionError("Wave session disconnected"))
+
+        request = asyncio.ensure_future(session.request_many(
+            [session.codec.build_get(STATUS_PATH), session.codec.build_put("/a", 1)]))
+        await until_sent(session, 3)
+        session._fail_pending(ConnectionError("Wave session disconnected"))
+        with pytest.raises(ConnectionError):
+            await request
+        del request
+        gc.collect()
+        await asyncio.sleep(0)
+        assert reports == []
+
+    asyncio.run(scenario())
+
+
+def test_session_times_out_within_the_attempt_budget():
+    retry = RetryPolicy(attempts=3, retry_on=(OSError,), backoff_base=0.01, backoff_cap=0.01)
+
+    async def scenario():
+        session = connected_session()
+        session.request_timeout = 10
+        session.attempt_budget = retry.attempt_budget(0.3)
+        errors = []
+        with pytest.raises(asyncio.TimeoutError):
+            await call_with_retries(lambda: session.request(session.codec.build_get(STATUS_PATH)),
+                                    0.3, retry, lambda attempt, e: errors.append(e))
+        # Every attempt ended on the session's own timeout, not a cancellation
+        assert len(session.sent) == 3 and len(errors) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+import asyncio
+import random
+
+import pytest
+
+pytest.importorskip("Crypto")
+pytest.importorskip("slixmpp")
+
+from bench.fakes import Behaviour, FakeWaveEndpoint  # noqa: E402
+from lib.wave.WaveThermo import WaveThermo  # noqa: E402
+
+ROOM_MANUAL_PATH = "/heatingCircuits/hc1/temperatureRoomManual"
+OVERRIDE_STATUS_PATH = "/heatingCircuits/hc1/manualTempOverride/status"
+OVERRIDE_TEMP_PATH = "/heatingCircuits/hc1/manualTempOverride/temperature"
+
+
+def run_with_endpoint(scenario):
+    async def run():
+        wave = WaveThermo(serial_number="123456789", access_code="abcdefghijklmnop", password="test")
+        wave.session.request_timeout = 0.5
+        endpoint = FakeWaveEndpoint(Behaviour(0.01, 0.5, 0.0), random.Random(1))
+        endpoint.attach(wave.session)
+        try:
+            await scenario(wave, endpoint)
+        finally:
+            endpoint.detach()
+            await wave.close()
+
+    asyncio.run(run())
+
+
+def reject(endpoint, rejected_path):
+    # Answer PUTs to rejected_path with a Bad Request, the rest as usual.
+    reply = endpoint.reply
+    sent = []
+
+    def rejecting_reply(mbody):
+        path = endpoint.session.codec.parse_request_line(mbody)[1]
+        sent.append(path)
+        if path == rejected_path:
+            return "HTTP/1.0 400 Bad Request\n\n"
+        return reply(mbody)
+
+    endpoint.reply = rejecting_reply
+    return sent
+
+
+def test_clock_mode_writes_are_pipelined():
+    async def scenario(wave, endpoint):
+        await wave.status.update()
+        sent = reject(endpoint, None)
+        # Requests sent by the time each reply arrives
+        sent_at_reply = []
+        message = wave.session.message
+        wave.session.message = lambda msg: (sent_at_reply.append(len(sent)), message(msg))
+        results = await wave.set_temperature(21.5)
+        assert sent_at_reply == [3, 3, 3]
+        assert results == {ROOM_MANUAL_PATH: True, OVERRIDE_STATUS_PATH: True, OVERRIDE_TEMP_PATH: True}
+        assert sent == [ROOM_MANUAL_PATH, OVERRIDE_STATUS_PATH, OVERRIDE_TEMP_PATH]
+        assert endpoint.set_point == 21.5
+
+    run_with_endpoint(scenario)
+
+
+def test_one_rejected_write_of_three():
+    async def scenario(wave, endpoint):
+        await wave.status.update()
+        sent = reject(endpoint, OVERRIDE_STATUS_PATH)
+        values = [
+            (ROOM_MANUAL_PATH, 21.5),
+            (OVERRIDE_STATUS_PATH, "on"),
+            (OVERRIDE_TEMP_PATH, 21.5),
+        ]
+        results = await wave.setter.post_messages(values)
+        # The rejection is reported for its own path, the other writes went through
+        assert results == {ROOM_MANUAL_PATH: True, OVERRIDE_STATUS_PATH: False, OVERRIDE_TEMP_PATH: True}
+        assert endpoint.set_point == 21.5
+
+        sent.clear()
+        with pytest.raises(ValueError, match="manualTempOverride/status"):
+            await wave.set_temperature(19.0)
+        # All three were sent, the rejection does not cut the batch short
+        assert sent == [ROOM_MANUAL_PATH, OVERRIDE_STATUS_PATH, OVERRIDE_TEMP_PATH]
+
+    run_with_endpoint(scenario)
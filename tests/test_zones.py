@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+from lib.heathub.zones import ZoneWatcher
+
+
+class FakeGateway:
+    """Gateway whose polls take a while and must never overlap."""
+
+    def __init__(self):
+        self.devices = {"zone-1": SimpleNamespace(name="Zone 1", hvac_action="idle")}
+        self.callbacks = []
+        self.active = 0
+        self.overlaps = 0
+
+    async def add_climate_update_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def get_climate_device(self, device_id):
+        return self.devices.get(device_id)
+
+    async def poll_status(self, send_callback=False):
+        self.active += 1
+        self.overlaps += self.active > 1
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if send_callback:
+            for callback in self.callbacks:
+                for device_id in self.devices:
+                    await callback(device_id)
+
+
+def test_poll_reports_hvac_changes():
+    async def scenario():
+        gateway = FakeGateway()
+
+        async def get_gateway():
+            return gateway
+
+        watcher = ZoneWatcher(get_gateway, lambda: None, lambda: None)
+        assert not await watcher.poll()
+        assert not await watcher.poll()
+        gateway.devices["zone-1"].hvac_action = "heating"
+        assert await watcher.poll()
+        assert len(gateway.callbacks) == 1
+
+    asyncio.run(scenario())
+
+
+def test_watcher_and_cycle_take_turns_on_the_gateway():
+    async def scenario():
+        gateway = FakeGateway()
+        lock = asyncio.Lock()
+
+        async def get_gateway():
+            return gateway
+
+        async def cycle_poll():
+            async with lock:
+                await gateway.poll_status(send_callback=False)
+
+        watcher = ZoneWatcher(get_gateway, lambda: None, lambda: None, lock=lock)
+        await asyncio.gather(*[watcher.poll() for _ in range(5)],
+                             *[cycle_poll() for _ in range(5)])
+        assert gateway.overlaps == 0
+
+    asyncio.run(scenario())